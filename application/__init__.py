@@ -1,13 +1,17 @@
 import base64
 from typing import Dict
 from flask import Flask, render_template, request, jsonify, send_file
-import os
+import threading
 from io import BytesIO
 import json
 import zipfile
 
 from parser.generic_flowchart import FlowchartCreator
 from parser.generic_parser import Parser
+from parser.limits import TraceLimitError
+from parser.cache import TraceCache
+from parser.compilation import CompilationUnit
+from parser.pool import ParserPool
 from imagecreator.image_generator import ImageGenerator
 
 import parser.python.parser as python_parser
@@ -19,7 +23,8 @@ import imagecreator.c_generator as c_image_gen
 
 from builder.builder import Builder
 from builder.extra_tags import quiz
-from typing import List, Dict
+from typing import Iterable, List, Dict, Optional, Tuple
+from parser.parser_types import Statement
 import parser.multiplier as template_generator
 import constants as c
 import imagecreator.c_generator as c_gen
@@ -31,7 +36,14 @@ import parser.python.flowchart as py_flowchart
 from collections import namedtuple
 
 app = Flask(__name__)
-Config = namedtuple('Config', 'language qtype format name category only reduced constants')
+app.config.setdefault("MAX_TRACE_STEPS", c.MAX_TRACE_STEPS)
+app.config.setdefault("MAX_SNAPSHOT_BYTES", c.MAX_SNAPSHOT_BYTES)
+app.config.setdefault("MAX_SHOWN_ITEMS", c.MAX_SHOWN_ITEMS)
+app.config.setdefault("FOLD_CONSTANTS_ABOVE", c.FOLD_CONSTANTS_ABOVE)
+app.config.setdefault("TRACE_CACHE_DIR", "cache")
+trace_cache: TraceCache = None
+trace_cache_lock = threading.Lock()
+Config = namedtuple('Config', 'language qtype format name category only reduced constants distractors', defaults=(c.MAX_DISTRACTORS,))
 preface = ""
 
 @app.route('/quiz/', methods=['GET'])
@@ -44,7 +56,7 @@ def trace_form():
 
 @app.route('/quiz/advanced/', methods=['GET'])
 def advanced_trace_form():
-    return render_template('advanced-form.html', preface=preface)
+    return render_template('advanced-form.html', preface=preface, distractors=c.MAX_DISTRACTORS)
 
 @app.route('/quiz/examples/', methods=['GET'])
 def quiz_examples():
@@ -52,7 +64,6 @@ def quiz_examples():
 
 @app.route('/quiz/create/', methods=['POST'])
 def process_quiz_post(): 
-    os.makedirs("temp", exist_ok=True)
     if request.method == 'POST':
         language = request.form['language']
         frmat = request.form['format']
@@ -72,7 +83,10 @@ def process_quiz_post():
         reduced_questions = 'reduced' in request.form
         display_constants = 'cons' in request.form
         cfg = Config(language, question_type, frmat, question_name, category_name, only_lines, reduced_questions, display_constants)
-        quiz_str = process(cfg, files)
+        try:
+            quiz_str = process(cfg, files)
+        except TraceLimitError as e:
+            return jsonify({"error": str(e)}), 400
         buffer = BytesIO()
         buffer.write(quiz_str.encode("utf-8"))
         buffer.seek(0)
@@ -87,7 +101,6 @@ def process_quiz_post():
 
 @app.route('/quiz/advanced/', methods=['POST'])
 def process_advanced_quiz_post(): 
-    os.makedirs("temp", exist_ok=True)
     if request.method == 'POST':
         language = request.form['language']
         frmat = request.form['format']
@@ -110,8 +123,14 @@ def process_advanced_quiz_post():
         only_lines = request.form['only']
         reduced_questions = 'reduced' in request.form
         display_constants = 'cons' in request.form
-        cfg = Config(language, question_type, frmat, question_name, category_name, only_lines, reduced_questions, display_constants)
-        quiz_str = process(cfg, files)
+        distractors = read_distractors(request.form.get('distractors'))
+        if distractors is None:
+            return jsonify({"error": "The number of wrong options must be a whole number, 0 or more"}), 400
+        cfg = Config(language, question_type, frmat, question_name, category_name, only_lines, reduced_questions, display_constants, distractors)
+        try:
+            quiz_str = process(cfg, files)
+        except TraceLimitError as e:
+            return jsonify({"error": str(e)}), 400
         buffer = BytesIO()
         buffer.write(quiz_str.encode("utf-8"))
         buffer.seek(0)
@@ -136,7 +155,6 @@ def image_examples():
 
 @app.route('/images/create/', methods=['POST'])
 def process_image_post(): 
-    os.makedirs("temp", exist_ok=True)
     if request.method == 'POST':
         language = request.form['language']
         content = request.form['content']
@@ -150,32 +168,65 @@ def process_image_post():
         code = file.stream.read().decode("utf-8")
         
         if language == 'python':
-            parser = py_parser.PythonParser()
+            pool = parser_pools['python']
             img_gen = py_gen.PythonImageGenerator(py_flowchart.PythonFlowCreator())
         else:
-            parser = c_parser.CParser()
+            pool = parser_pools['c']
             img_gen = c_gen.CImageGenerator(c_flowchart.CFlowCreator())
+        img_gen.set_elision(app.config["MAX_SHOWN_ITEMS"])
+        with pool.parser() as parser:
+            unit = CompilationUnit(parser, code)
 
-        if content == "flowchart":
-            return_image = img_gen.get_flowchart_image(code)
-            return return_single_image(return_image)
-        elif content == "code":
-            return_image = img_gen.get_code_image(code)
-            return return_single_image(return_image)
-        elif content == "both":
-            code_list, line_numbers = parser.parse_source(code)
-            if frmat and frmat == "svg":
-                return_image = img_gen.get_all_animation(code_list, code)
+            if content == "flowchart":
+                return_image = img_gen.get_flowchart_image(unit)
+                return return_single_image(return_image)
+            elif content == "code":
+                return_image = img_gen.get_code_image(unit)
                 return return_single_image(return_image)
-            elif frmat and frmat == "html":
-                images = img_gen.get_all_animation_list(code_list, code)
-                div_tag = img_gen.wrap_animation_list_html(images)
-                return return_html_page(str(div_tag))
-            elif frmat and frmat == "zip":
-                return_images = img_gen.get_all_animation_list(code_list, code)
-                return return_zip_file(return_images)
+            elif content == "both":
+                try:
+                    code_list, line_numbers = unit.trace()
+                except TraceLimitError as e:
+                    return jsonify({"error": str(e)}), 400
+                if frmat and frmat == "svg":
+                    return_image = img_gen.get_all_animation(code_list, unit)
+                    return return_single_image(return_image)
+                elif frmat and frmat == "html":
+                    images = img_gen.get_all_animation_list(code_list, unit)
+                    div_tag = img_gen.wrap_animation_list_html(images)
+                    return return_html_page(str(div_tag))
+                elif frmat and frmat == "zip":
+                    return_images = img_gen.get_all_animation_list(code_list, unit)
+                    return return_zip_file(return_images)
     return jsonify("{ 'error' : 'An error has occurred'}")
 
+def read_distractors(field: Optional[str]) -> Optional[int]:
+    """ The number of wrong options per drop down given in a form, a blank field is the default. None if the field is
+        not a whole number of 0 or more. """
+    field = (field or "").strip()
+    if not field:
+        return c.MAX_DISTRACTORS
+    if not field.isdecimal():
+        return None
+    return int(field)
+
+def configure_parser(parser: Parser) -> Parser:
+    global trace_cache
+    with trace_cache_lock:
+        if trace_cache is None:
+            trace_cache = TraceCache(app.config["TRACE_CACHE_DIR"])
+    parser.set_limits(app.config["MAX_TRACE_STEPS"], app.config["MAX_SNAPSHOT_BYTES"])
+    parser.set_elision(app.config["MAX_SHOWN_ITEMS"])
+    parser.set_folding(app.config["FOLD_CONSTANTS_ABOVE"])
+    parser.set_cache(trace_cache)
+    return parser
+
+""" Parsers are reused from one request to the next, each request takes one from the pool for its language """
+parser_pools: Dict[str, ParserPool] = {
+    'python': ParserPool(lambda: configure_parser(python_parser.PythonParser())),
+    'c': ParserPool(lambda: configure_parser(c_parser.CParser()))
+}
+
 def return_single_image(val: str) -> send_file:
     buffer = BytesIO()
     buffer.write(val.encode("utf-8"))
@@ -213,6 +264,16 @@ def return_zip_file(image_list: Dict[int, str]) -> send_file:
         mimetype='application/zip'
     )
 
+def trace_for_builder(parser: Parser, flowchart_parser: FlowchartCreator, image_generator: ImageGenerator, config: Config,
+                      unit: CompilationUnit) -> Tuple[Iterable[Statement], Builder]:
+    """ Line questions each need no more than their own statement, so when they are the only questions the trace is
+        streamed once for the options of the drop downs and again for the questions instead of being kept """
+    if config.qtype == 'individual':
+        builder = Builder(parser, flowchart_parser, image_generator, config, unit.stream())
+        return unit.stream(), builder
+    code_list, line_numbers = unit.trace()
+    return code_list, Builder(parser, flowchart_parser, image_generator, config, code_list)
+
 def generate_templated_code_question(
                 q_root: quiz, 
                 parser: Parser, 
@@ -220,19 +281,19 @@ def generate_templated_code_question(
                 image_generator: ImageGenerator, 
                 config: Config, 
                 files: Dict[str, str]):
-    templated_codes = template_generator.generate_from_template(files['code'], files['param'], config.name)
+    templated_codes = template_generator.generate_trees_from_template(parser, files['code'], files['param'], config.name)
     input_dict = {}
     if 'input' in files and files['input'] != '':
         json.loads(files['input'])
     num = 0
-    for name, source_code in templated_codes:
+    for name, source_code, tree in templated_codes:
         std_in = []
         if input_dict and str(num) in input_dict:
             std_in = input_dict[str(num)].split("\n")
-            parser.set_input(std_in)
-        code_list, line_numbers = parser.parse_source(source_code)
-        builder = Builder(parser, flowchart_parser, image_generator, config, code_list)
-        image = image_generator.get_code_image(source_code)
+        parser.set_input(std_in)
+        unit = CompilationUnit(parser, source_code, tree)
+        code_list, builder = trace_for_builder(parser, flowchart_parser, image_generator, config, unit)
+        image = image_generator.get_code_image(unit)
         img_tag = image_generator.encode_image(image)
 
         if config.qtype == 'individual' or config.qtype == 'both':
@@ -243,9 +304,8 @@ def generate_templated_code_question(
             for q in questions:
                 q_root.add(q)
         if config.qtype == 'all' or config.qtype == 'both':
-            explanations: List[str] = Parser.get_explanations_code(code_list)
-            tags = list(set([c.get_tag(x) for x in explanations]))
-            questions = builder.build_file_question(code_list, name, source_code, tags, std_in)
+            tags = Parser.get_tags_code(code_list)
+            questions = builder.build_file_question(code_list, name, unit, tags, std_in)
             for q in questions:
                 q_root.add(q)
         num = num + 1
@@ -263,40 +323,38 @@ def generate_code_question(q_root: quiz,
     only_line_numbers: List[int] = []
     if config.only:
         only_line_numbers = [int(x) for x in config.only.split(",")]
-    code_list, line_numbers = parser.parse_source(source_code)
-    builder = Builder(parser, flowchart_parser, image_generator, config, code_list)
-    image = image_generator.get_code_image(source_code)
+    unit = CompilationUnit(parser, source_code)
+    code_list, builder = trace_for_builder(parser, flowchart_parser, image_generator, config, unit)
+    image = image_generator.get_code_image(unit)
     img_tag = image_generator.encode_image(image)
     if config.qtype == 'individual' or config.qtype == 'both':
         questions = builder.build_line_questions(code_list, img_tag, config.name, only_line_numbers, std_in)
         for q in questions:
             q_root.add(q)
     if config.qtype == 'all' or config.qtype == 'both':
-        explanations: List[str] = Parser.get_explanations_code(code_list)
-        tags = list(set([c.get_tag(x) for x in explanations]))
-        questions = builder.build_file_question(code_list, config.name, source_code, tags, std_in)
+        tags = Parser.get_tags_code(code_list)
+        questions = builder.build_file_question(code_list, config.name, unit, tags, std_in)
         for q in questions:
             q_root.add(q)
 
 def process(con : Config, files: Dict[str, str]):
-    code_parser: Parser = None
     flow_parser: FlowchartCreator = None
     image_gen: ImageGenerator = None
     if con.language == 'python':
-        code_parser = python_parser.PythonParser()
         flow_parser = python_flow_parser.PythonFlowCreator()
         image_gen = python_image_gen.PythonImageGenerator(flow_parser)
     elif con.language == "c":
-        code_parser = c_parser.CParser()
         flow_parser = c_flow_parser.CFlowCreator()
         image_gen = c_image_gen.CImageGenerator(flow_parser)
     else:
         raise Exception("This language has not been implemented yet")
+    image_gen.set_elision(app.config["MAX_SHOWN_ITEMS"])
     quiz_root = Builder.create_quiz(con.category)
     print(files)
-    if 'param' in files:
-        generate_templated_code_question(quiz_root, code_parser, flow_parser, image_gen, con, files)
-    else:
-        generate_code_question(quiz_root, code_parser, flow_parser, image_gen, con, files)
+    with parser_pools[con.language].parser() as code_parser:
+        if 'param' in files:
+            generate_templated_code_question(quiz_root, code_parser, flow_parser, image_gen, con, files)
+        else:
+            generate_code_question(quiz_root, code_parser, flow_parser, image_gen, con, files)
 
     return str(quiz_root)
\ No newline at end of file
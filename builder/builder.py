@@ -1,4 +1,4 @@
-from typing import List, Set, Dict, Any
+from typing import List, Set, Dict, Any, Iterable
 from dominate.tags import tr, td, table, th, div, h1, p, img, span, strong, br
 
 from parser.parser_types import Statement, Calculation
@@ -6,6 +6,7 @@ import constants as c
 from parser.generic_flowchart import FlowchartCreator
 from parser.generic_parser import Parser
 from imagecreator.image_generator import ImageGenerator
+from parser.compilation import CompilationUnit
 
 from parser.parser_types import Edge
 from builder.variables import VarInfoBuilder
@@ -15,17 +16,18 @@ from builder.calculations import CalculationBuilder
 from icecream import ic
 from collections import namedtuple
 
-Config = namedtuple('Config', 'language qtype format name category only reduced constants')
+Config = namedtuple('Config', 'language qtype format name category only reduced constants distractors', defaults=(c.MAX_DISTRACTORS,))
 
 
 class Builder(object):
-    def __init__(self, parser: Parser, flow_parser: FlowchartCreator, image_gen: ImageGenerator, config: Config, code_list: List[Statement]) -> None:
+    def __init__(self, parser: Parser, flow_parser: FlowchartCreator, image_gen: ImageGenerator, config: Config, code_list: Iterable[Statement]) -> None:
+        """ code_list is only read once, for the options of the drop downs """
         super().__init__()
         self.parser = parser
         self.image_gen = image_gen
         self.flow_parse = flow_parser
         self.v = VarInfoBuilder(parser)
-        self.calc = CalculationBuilder(parser, config.reduced, config.constants, code_list, self.v)
+        self.calc = CalculationBuilder(parser, config.reduced, config.constants, code_list, self.v, config.distractors)
         self.fback = FeedbackBuilder(image_gen, config)
 
     def build_question(self, question_name: str, question_text: questiontext, tags: List[str]) -> question:
@@ -47,11 +49,10 @@ class Builder(object):
         line_table = table(width="100%")
         next_line = code["next_line"]
 
-        wrong_lines = self.calc.get_lines() - set((next_line,))
         line_table.add(tr(td("Current Line:", style="border: 1px solid black"),
                           td(code["current_line"], style="border: 1px solid black"),
                           td("Next Line:", style="border: 1px solid black"),
-                          td('{1:MCS:=' + next_line + "~" + "~".join(wrong_lines) + "}"), style="border: 1px solid black"))
+                          td(self.calc.line_choices.choice(next_line)), style="border: 1px solid black"))
         line_div.add(line_table)
         return line_div
 
@@ -106,13 +107,13 @@ class Builder(object):
         question_text.add(actual_text)
         return question_text
 
-    def build_line_questions(self, code_list: List[Statement], image: img, question_name: str, only_line_numbers: List[int], input_std: List[str]) -> List[question]:
+    def build_line_questions(self, code_list: Iterable[Statement], image: img, question_name: str, only_line_numbers: List[int], input_std: List[str]) -> List[question]:
         questions = []
-        for i, statement in enumerate(code_list):
+        for position, statement in enumerate(code_list):
+            i = self.parser.get_step(statement, position)
             if int(statement["current_line"]) in only_line_numbers or len(only_line_numbers) == 0:
                 feedback = self.fback.build_feedback_line(statement)
-                explanations = self.parser.get_all_explanations_statement(statement)
-                tags = list(set([c.get_tag(x) for x in explanations]))
+                tags = list(self.parser.get_index(statement).tags)
                 tags.append("line " + str(statement["current_line"]))
                 tags.append("Nodes " + str(self.count_statement_nodes(statement)))
                 question_text = self.build_question_text_line(statement, image, input_std)
@@ -121,11 +122,11 @@ class Builder(object):
                 questions.append(qest)
         return questions
 
-    def build_file_question(self, code_list: List[Statement], file_name: str, source_code: str, tags: List[str], std_in: str) -> List[question]:
-        image = self.image_gen.get_code_image(source_code)
+    def build_file_question(self, code_list: List[Statement], file_name: str, unit: CompilationUnit, tags: List[str], std_in: str) -> List[question]:
+        image = self.image_gen.get_code_image(unit)
         img_tag = self.image_gen.encode_image(image)
         questions = []
-        feedback = self.fback.build_feedback_file(code_list, source_code)
+        feedback = self.fback.build_feedback_file(code_list, unit)
         question_text = self.build_question_text_file(code_list, img_tag, std_in)
         qest = self.build_question("{}".format(file_name.split("/")[-1]), question_text, tags)
         qest.add(feedback)
@@ -140,7 +141,4 @@ class Builder(object):
         return quiz_root
 
     def count_statement_nodes(self, code: Statement) -> int:
-        return 1 + sum([self.count_calculation_nodes(sc) for sc in code["calculation"]["subcalculations"]])
-
-    def count_calculation_nodes(self, code: Calculation) -> int:
-        return 1 + sum([self.count_calculation_nodes(sc) for sc in code["subcalculations"]])
+        return self.parser.get_index(code).nodes
@@ -1,14 +1,16 @@
-from builder.variables import VarInfoBuilder
+from builder.variables import VarInfoBuilder, ValueMatrix
+from builder.distractors import Distractors
 from dominate.tags import tr, td, table, th, div, h1, p
-from typing import List, Set, Tuple, Dict
-from parser.parser_types import Statement, Calculation
+from typing import Iterable, List, Set, Tuple, Dict, Optional
+from parser.parser_types import Statement, Calculation, Memory
 from parser.generic_parser import Parser
 import constants as c
 from parser.python.parser import PythonParser
 
 
 class CalculationBuilder(object):
-    def __init__(self, parser: Parser, reduced_fields: bool, literal_as_question: bool, code_list: List[Statement], var_builder: VarInfoBuilder) -> None:
+    def __init__(self, parser: Parser, reduced_fields: bool, literal_as_question: bool, code_list: Iterable[Statement], var_builder: VarInfoBuilder,
+                 distractors: int = c.MAX_DISTRACTORS) -> None:
         super().__init__()
         self.parser = parser
         self.reduced_fields = reduced_fields
@@ -18,6 +20,12 @@ class CalculationBuilder(object):
         self.all_explanations = all_exp
         self.lines = lines
         self.var_info_builder = var_builder
+        self.distractors = distractors
+        self.code_choices = Distractors((self.sanitise_code(code) for code in all_code), distractors)
+        self.explanation_choices = Distractors(all_exp, distractors)
+        self.line_choices = Distractors(lines, distractors)
+        self.wrong_types: Dict[str, str] = dict()
+        self.calc_cells: Dict[int, Tuple[Calculation, Tuple[str, ...]]] = dict()
 
     def get_lines(self) -> Set[str]:
         return self.lines
@@ -35,209 +43,132 @@ class CalculationBuilder(object):
             function results in one row being added to the table. """
         for ch in [x for x in calculation["subcalculations"] if x is not None]:
             depth = self.get_calc_line(ch, depth, calc_table)
-        if isinstance(calculation["result"], float):
-            res = "{{1:NM:={:06.2f}:0.1~{}}}".format(calculation["result"], c.WRONG_NUM)
-        else:
-            res = "{1:SAC:=" + str(calculation["result_show"]) + "~#" + c.WRONG + "}"
-        wrong_code = set(self.sanitise_code(code) for code in self.all_code) - { self.sanitise_code(calculation["code"]) }
-        wrong_explanations = self.all_explanations - {calculation["explanation"]}
-        if self.reduced_fields:
-            if calculation["explanation"] == c.M_CONST and not self.literal_as_question:
-                calc_table.add(tr(
-                    td(str(depth), style="border: 1px solid black"),
-                    td(self.sanitise_code(calculation["code"]), style="border: 1px solid black"),
-                    td(str(calculation["result_show"]), style="border: 1px solid black"),
-                    td(calculation["type"], style="border: 1px solid black"),
-                    style="border: 1px solid black"
-                ))
-            else:
-                calc_table.add(tr(
-                    td(str(depth), style="border: 1px solid black"),
-                    td('{1:MCS:=' + self.sanitise_code(calculation["code"]) + "~" + "~".join(wrong_code) + "}", style="border: 1px solid black"),
-                    td(res, style="border: 1px solid black"),
-                    td('{1:MCS:=' + calculation["type"] + "~" + "~".join(self.parser.get_types().getWrongTypes(calculation["type"])) + "}", style="border: 1px solid black"),
-                    style="border: 1px solid black"
-                ))
-        else:
-            if calculation["explanation"] == c.M_CONST and not self.literal_as_question:
-                calc_table.add(tr(
-                    td(str(depth), style="border: 1px solid black"),
-                    td(calculation["explanation"], style="border: 1px solid black"),
-                    td(self.sanitise_code(calculation["code"]), style="border: 1px solid black"),
-                    td(str(calculation["result_show"]), style="border: 1px solid black"),
-                    td(calculation["type"], style="border: 1px solid black"),
-                    style="border: 1px solid black"
-                ))
-            else:
-                calc_table.add(tr(
-                    td(str(depth), style="border: 1px solid black"),
-                    td('{1:MCS:=' + calculation["explanation"] + "~" + "~".join(wrong_explanations) + "}", style="border: 1px solid black"),
-                    td('{1:MCS:=' + self.sanitise_code(calculation["code"]) + "~" + "~".join(wrong_code) + "}", style="border: 1px solid black"),
-                    td(res, style="border: 1px solid black"),
-                    td('{1:MCS:=' + calculation["type"] + "~" + "~".join(self.parser.get_types().getWrongTypes(calculation["type"])) + "}", style="border: 1px solid black"),
-                    style="border: 1px solid black"
-                ))
+        calc_table.add(tr(
+            td(str(depth), style="border: 1px solid black"),
+            *[td(cell, style="border: 1px solid black") for cell in self.get_calc_cells(calculation)],
+            style="border: 1px solid black"
+        ))
         return depth + 1
 
-    def get_calc_file(self, code: List[Statement], calc_table: table) -> None:
+    def get_calc_cells(self, calculation: Calculation) -> Tuple[str, ...]:
+        """ The text of the cells of the row of a calculation that follow its order. The statements of a loop share the
+            calculations that do not change between iterations, so the text of each calculation is only worked out
+            once however many questions it appears in. The calculation is kept with its text so its id is not reused. """
+        cached = self.calc_cells.get(id(calculation))
+        if cached is not None:
+            return cached[1]
+        code = self.sanitise_code(calculation["code"])
+        cells: Tuple[str, ...]
+        if calculation["explanation"] == c.M_CONST and not self.literal_as_question:
+            cells = (code, str(self.parser.elision.show_result(calculation)), calculation["type"])
+            if not self.reduced_fields:
+                cells = (calculation["explanation"],) + cells
+        else:
+            cells = (self.code_choices.choice(code), self.get_result_question(calculation), self.get_type_question(calculation["type"]))
+            if not self.reduced_fields:
+                cells = (self.explanation_choices.choice(calculation["explanation"]),) + cells
+        self.calc_cells[id(calculation)] = (calculation, cells)
+        return cells
+
+    def get_result_question(self, calculation: Calculation) -> str:
+        """ Results too long to be written in full are shown shortened rather than asked for """
+        if isinstance(calculation["result"], float):
+            return "{{1:NM:={:06.2f}:0.1~{}}}".format(calculation["result"], c.WRONG_NUM)
+        if not self.parser.elision.fits(calculation["result"]):
+            return self.parser.elision.show(calculation["result"])
+        return "{1:SAC:=" + str(calculation["result_show"]) + "~#" + c.WRONG + "}"
+
+    def get_wrong_types(self, typ: str) -> str:
+        """ The types other than typ joined for a drop down, there are only a handful of types so each is joined once """
+        wrong = self.wrong_types.get(typ)
+        if wrong is None:
+            wrong = "~".join(self.parser.get_types().getWrongTypes(typ))
+            self.wrong_types[typ] = wrong
+        return wrong
+
+    def get_type_question(self, typ: str) -> str:
+        return '{1:MCS:=' + typ + "~" + self.get_wrong_types(typ) + "}"
+
+    def get_calc_file(self, code: List[Statement], calc_table: table, variables: Optional[Dict[str, Tuple[str, int, int]]] = None) -> None:
         for c_i in range(len(code)):
             code[c_i]["calculation"]["subcalculations"] = []
         #names = self.var_info_builder.get_all_variables_and_addresses(code)  # This if for C TODO add flag
-        variables: Dict[str,Tuple[str,int,int]] = self.var_info_builder.get_all_variables(code)
+        if variables is None:
+            variables = self.var_info_builder.get_all_variables(code)
+        values = ValueMatrix(code, variables, isinstance(self.parser, PythonParser))
         lines, all_code, all_exp = self.get_detractors_file(self.parser, code)
-        for statement in code:
+        code_choices = Distractors((self.sanitise_code(code) for code in all_code), self.distractors)
+        for i, statement in enumerate(code):
             calculation = statement["calculation"]
-            if isinstance(calculation["result"], float):
-                res = "{{1:NM:={:06.2f}:0.1~{}}}".format(calculation["result"], c.WRONG_NUM)
-            else:
-                res = "{1:SAC:=" + str(calculation["result_show"]) + "~#" + c.WRONG + "}"
-            wrong_code = set(self.sanitise_code(code) for code in all_code) - { self.sanitise_code(calculation["code"]) }
-            # wrong_code = self.all_code - {self.sanitise_code(calculation["code"])}
-            wrong_explanations = self.all_explanations - {calculation["explanation"]}
-            line = set()
-            line.add(statement["current_line"])
-            wrong_lines = self.lines - line
+            code_question = code_choices.choice(self.sanitise_code(calculation["code"]))
             row: tr
             if self.reduced_fields:
+                current_line = statement["current_line"]
+                why_line = statement["why_line"]
+                wrong_lines = [wl + "#" + why_line for wl in self.line_choices.wrong(current_line)]
                 row = tr(
-                    td('{2:MCS:=' + statement["current_line"]+"#"+statement["why_line"] + "~" + "~".join([ wl +"#"+statement["why_line"] for wl in wrong_lines]) + "}", style="border: 1px solid black"),
-                    td('{1:MCS:=' + self.sanitise_code(calculation["code"]) + "~" + "~".join(wrong_code) + "}", style="border: 1px solid black"),
+                    td('{2:MCS:=' + current_line + "#" + why_line + "~" + "~".join(wrong_lines) + "}", style="border: 1px solid black"),
+                    td(code_question, style="border: 1px solid black"),
                     style="border: 1px solid black"
                 )
             else:
                 row = tr(
-                    td('{2:MCS:=' + statement["current_line"] + "~" + "~".join(wrong_lines) + "}", style="border: 1px solid black"),
-                    td('{1:MCS:=' + calculation["explanation"] + "~" + "~".join(wrong_explanations) + "}", style="border: 1px solid black"),
-                    td('{1:MCS:=' + self.sanitise_code(calculation["code"]) + "~" + "~".join(wrong_code) + "}", style="border: 1px solid black"),
-                    td(res, style="border: 1px solid black"),
-                    td('{1:MCS:=' + calculation["type"] + "~" + "~".join(self.parser.get_types().getWrongTypes(calculation["type"])) + "}", style="border: 1px solid black"),
+                    td(self.line_choices.choice(statement["current_line"], 2), style="border: 1px solid black"),
+                    td(self.explanation_choices.choice(calculation["explanation"]), style="border: 1px solid black"),
+                    td(code_question, style="border: 1px solid black"),
+                    td(self.get_result_question(calculation), style="border: 1px solid black"),
+                    td(self.get_type_question(calculation["type"]), style="border: 1px solid black"),
                     style="border: 1px solid black"
                 )
-            for v in variables:
-                name, address, size = variables[v]
-                if size == 1:
-                    q = self.get_var_question(statement, name,3)
-                    row.add(td(q, style="border: 1px solid black"))
-                else:
-                    if isinstance(self.parser, PythonParser):
-                        for index in range(size):
-                            q = self.get_list_var_question(statement, name, index,3)
-                            row.add(td(q, style="border: 1px solid black"))
-                    else:
-                        for index in range(size):
-                            q = self.get_array_var_question(statement, name, index,3)
-                            row.add(td(q, style="border: 1px solid black"))
+            for (_, index), cell, changed in zip(values.columns, values.cells[i], values.changed[i]):
+                row.add(td(self.get_value_question(cell, index, 3 if changed else 0), style="border: 1px solid black"))
             calc_table.add(row)
-        self.add_fake_calc_file(code[-1], calc_table, variables)
+        self.add_fake_calc_file(code[-1], calc_table, values)
 
-    def add_fake_calc_file(self, last_statement: Statement, calc_table: table, variables) -> None:
+    def add_fake_calc_file(self, last_statement: Statement, calc_table: table, values: ValueMatrix) -> None:
         import random
         fake_rows = random.randint(0,3)
         for i in range(fake_rows):
             calculation = last_statement["calculation"]
             res = "{0:SAC:=program finished" + "~#" + c.WRONG + "}"
-            wrong_code = set(self.sanitise_code(code) for code in self.all_code)
-            wrong_explanations = self.all_explanations
-            line = set()
-            line.add(c.M_FIN)
-            wrong_lines = self.lines - line
             row: tr
             if self.reduced_fields:
                 row = tr(
-                    td('{0:MCS:=' +  c.M_FIN + "~" + "~".join([ wl for wl in wrong_lines]) + "}", style="border: 1px solid black"),
-                    td('{0:MCS:=' +  c.M_FIN + "~" + "~".join(wrong_code) + "}", style="border: 1px solid black"),
+                    td(self.line_choices.choice(c.M_FIN, 0), style="border: 1px solid black"),
+                    td('{0:MCS:=' +  c.M_FIN + "~" + self.code_choices.without(c.M_FIN) + "}", style="border: 1px solid black"),
                     style="border: 1px solid black"
                 )
             else:
                 row = tr(
-                    td('{0:MCS:=' + c.M_FIN + "~" + "~".join(wrong_lines) + "}", style="border: 1px solid black"),
-                    td('{0:MCS:=' + c.M_FIN + "~" + "~".join(wrong_explanations) + "}", style="border: 1px solid black"),
-                    td('{0:MCS:=' + c.M_FIN + "~" + "~".join(wrong_code) + "}", style="border: 1px solid black"),
+                    td(self.line_choices.choice(c.M_FIN, 0), style="border: 1px solid black"),
+                    td('{0:MCS:=' + c.M_FIN + "~" + self.explanation_choices.without(c.M_FIN) + "}", style="border: 1px solid black"),
+                    td('{0:MCS:=' + c.M_FIN + "~" + self.code_choices.without(c.M_FIN) + "}", style="border: 1px solid black"),
                     td(res, style="border: 1px solid black"),
-                    td('{0:MCS:=' + c.M_FIN + "~" + "~".join(self.parser.get_types().getWrongTypes(calculation["type"])) + "}", style="border: 1px solid black"),
+                    td('{0:MCS:=' + c.M_FIN + "~" + self.get_wrong_types(calculation["type"]) + "}", style="border: 1px solid black"),
                     style="border: 1px solid black"
                 )
-            for v in variables:
-                name, address, size = variables[v]
-                if size == 1:
-                    q = self.get_var_question(last_statement, name, 0)
-                    row.add(td(q, style="border: 1px solid black"))
-                else:
-                    if isinstance(self.parser, PythonParser):
-                        for index in range(size):
-                            q = self.get_list_var_question(last_statement, name, index,3)
-                            row.add(td(q, style="border: 1px solid black"))
-                    else:
-                        for index in range(size):
-                            q = self.get_array_var_question(last_statement, name, index,3)
-                            row.add(td(q, style="border: 1px solid black"))            
+            for (_, index), cell, changed in zip(values.columns, values.cells[-1], values.changed[-1]):
+                row.add(td(self.get_value_question(cell, index, 3 if changed and index >= 0 else 0), style="border: 1px solid black"))
             calc_table.add(row)
 
 
-    @staticmethod
-    def get_var_question(statement: Statement, name: str, score: int) -> str:
-        var_aft = statement["variables_after"]
-        mem_aft = statement["memory_after"]
-        var_bef = statement["variables_before"]
-        mem_bef = statement["memory_before"]
-        if name in var_aft:
-            var_address = var_aft[name][1]
-            var = mem_aft[var_address]
-            if name in var_bef:
-                bef_add = var_bef[name][1]
-                bef_var = mem_bef[bef_add]
-                if bef_var["value"] == var["value"]:
-                    score = 0
-            if isinstance(var["value"], float):
-                res = "{{{}:NM:={:06.2f}:0.1~{}}}".format(score,var["value"], c.WRONG_NUM)
-            else:
-                res = "{{{}:SAC:=".format(score) + str(var["value_show"]) + "~#" + c.WRONG + "}"
-        else:
-            res = "?"
-        return res
+    def get_value_question(self, cell: Optional[Memory], index: int, score: int) -> str:
+        """ The question for one entry of a ValueMatrix, index is the item of a list or array or -1 for a variable.
+            Values too long to be written in full are shown shortened rather than asked for. """
+        if cell is None:
+            return "?"
+        value = cell["value"]
+        if isinstance(value, float):
+            return "{{{}:NM:={:06.2f}:0.1~{}}}".format(score, value, c.WRONG_NUM)
+        elision = self.parser.elision
+        item = index >= 0 and isinstance(self.parser, PythonParser)
+        if item:
+            value = value[index]
+        if not elision.fits(value):
+            return elision.show(value)
+        shown = elision.show(value) if item else str(cell["value_show"])
+        return "{{{}:SAC:=".format(score) + shown + "~#" + c.WRONG + "}"
 
-    @staticmethod
-    def get_array_var_question(statement: Statement, name: str, index: int, score: int) -> str:
-        var_aft = statement["variables_after"]
-        mem_aft = statement["memory_after"]
-        var_bef = statement["variables_before"]
-        mem_bef = statement["memory_before"]
-        if name in var_aft:
-            var_address = var_aft[name][1]
-            var = mem_aft[var_address + index]
-            if name in var_bef:
-                bef_add = var_bef[name][1]
-                bef_var = mem_bef[bef_add+index]
-                if bef_var["value"] == var["value"]:
-                    score = 0
-            if isinstance(var["value"], float):
-                res = "{{{}:NM:={:06.2f}:0.1~{}}}".format(score, var["value"], c.WRONG_NUM)
-            else:
-                res = "{{{}:SAC:=".format(score) + str(var["value_show"]) + "~#" + c.WRONG + "}"
-        else:
-            res = "?"
-        return res
-    @staticmethod
-    def get_list_var_question(statement: Statement, name: str, index: int, score: int) -> str:
-        var_aft = statement["variables_after"]
-        mem_aft = statement["memory_after"]
-        var_bef = statement["variables_before"]
-        mem_bef = statement["memory_before"]
-        if name in var_aft:
-            var_address = var_aft[name][1]
-            var = mem_aft[var_address]
-            if name in var_bef:
-                bef_add = var_bef[name][1]
-                bef_var = mem_bef[bef_add]
-                if bef_var["value"] == var["value"]:
-                    score = 0
-            if isinstance(var["value"], float):
-                res = "{{{}:NM:={:06.2f}:0.1~{}}}".format(score, var["value"][index], c.WRONG_NUM)
-            else:
-                res = "{{{}:SAC:=".format(score) + Parser.get_result_string(var["value"][index]) + "~#" + c.WRONG + "}"
-        else:
-            res = "?"
-        return res
     def build_calc_div_line(self, code: Calculation) -> div:
         calc_div = div(style="display: flex; flex-direction: column; min-height: 200px; width:100%; float:left; padding: 10px")
         calc_div.add(div(h1("Calculations")))
@@ -287,19 +218,25 @@ class CalculationBuilder(object):
                     row.add(td(head, style="border: 1px solid black"))
 
         tb.add(row)
-        self.get_calc_file(code, tb)
+        self.get_calc_file(code, tb, variables)
         return calc_div
 
     @staticmethod
-    def get_detractors(code_parser: Parser, code_list: List[Statement]) -> Tuple[Set[str], Set[str], Set[str]]:
-        """ These lines of code build the detractors for the explanations and code portions of the questions"""
-        ls = [x["current_line"] for x in code_list]
+    def get_detractors(code_parser: Parser, code_list: Iterable[Statement]) -> Tuple[Set[str], Set[str], Set[str]]:
+        """ These lines of code build the detractors for the explanations and code portions of the questions. The
+            statements are only read once, so they can be streamed from the tracer without being kept. The next lines
+            are added as well, for statements that were rebuilt on their own without the statements after them. """
         lines: Set[str] = set()
-        for l in ls:
-            lines.add(str(l))
+        all_code: Set[str] = set()
+        all_explanations: Set[str] = set()
+        for st in code_list:
+            lines.add(str(st["current_line"]))
+            if st["next_line"] != c.FINISHED:
+                lines.add(str(st["next_line"]))
+            index = code_parser.get_index(st)
+            all_code.update(index.code)
+            all_explanations.update(index.explanations)
         lines.add(c.M_FIN)
-        all_code = set(code_parser.get_all_code(code_list))
-        all_explanations = set(code_parser.get_explanations_code(code_list))
         return lines, all_code, all_explanations
 
     @staticmethod
@@ -312,6 +249,6 @@ class CalculationBuilder(object):
         lines.add(c.M_FIN)
         all_code = set(code_parser.get_all_code_file(code_list))
         all_code.add(c.M_FIN)
-        all_explanations = set(code_parser.get_explanations_code(code_list))
+        all_explanations = set(x["calculation"]["explanation"] for x in code_list)
         all_explanations.add(c.M_FIN)
         return lines, all_code, all_explanations
\ No newline at end of file
@@ -0,0 +1,76 @@
+import re
+import zlib
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+""" Names, numbers and single characters of code, the parts that two options are compared by """
+TOKENS = re.compile(r"\w+|[^\w\s]")
+
+
+class Distractors(object):
+    """ The options of one drop down of a cloze question. The options are joined once when the pool is made, and each
+        answer leaves itself out of the joined options, instead of the options being gathered, sanitised and joined
+        again for every row of every question.
+
+        A pool with a limit only offers that many wrong options, chosen by how alike they are to the answer, so a
+        large program does not put hundreds of options in every drop down. """
+
+    def __init__(self, options: Iterable[str], limit: int = 0) -> None:
+        super().__init__()
+        self.options: List[str] = list(dict.fromkeys(options))
+        self.limit = limit
+        self.tokens: Optional[List[FrozenSet[str]]] = None
+        self.chosen: Dict[str, List[str]] = dict()
+        self.joined: str = "~".join(self.options)
+        self.starts: Dict[str, int] = dict()
+        start = 0
+        for option in self.options:
+            self.starts[option] = start
+            start = start + len(option) + 1
+
+    def limited(self) -> bool:
+        return 0 < self.limit < len(self.options)
+
+    def wrong(self, answer: Optional[str]) -> List[str]:
+        """ The options offered as wrong answers when answer is the right one """
+        if not self.limited():
+            return [option for option in self.options if option != answer]
+        key = answer if answer is not None else ""
+        chosen = self.chosen.get(key)
+        if chosen is None:
+            chosen = self.nearest(key)
+            self.chosen[key] = chosen
+        return chosen
+
+    def nearest(self, answer: str) -> List[str]:
+        """ The options that share the most tokens with answer for their size. Ties are broken by a checksum of the
+            option seeded with the answer, so the same program always gets the same options whatever order the pool
+            was made in. """
+        if self.tokens is None:
+            self.tokens = [frozenset(TOKENS.findall(option)) for option in self.options]
+        target = frozenset(TOKENS.findall(answer))
+        seed = zlib.crc32(answer.encode("utf-8"))
+        ranked: List[Tuple[float, int, str]] = []
+        for option, tokens in zip(self.options, self.tokens):
+            if option != answer:
+                union = len(tokens | target)
+                likeness = len(tokens & target) / union if union else 0.0
+                ranked.append((-likeness, zlib.crc32(option.encode("utf-8"), seed), option))
+        ranked.sort()
+        return [option for _, _, option in ranked[:self.limit]]
+
+    def without(self, answer: Optional[str]) -> str:
+        """ Every option other than answer, or those chosen for it when the pool has a limit, joined as they are
+            written in a cloze question """
+        if self.limited():
+            return "~".join(self.wrong(answer))
+        start = self.starts.get(answer) if answer is not None else None
+        if start is None:
+            return self.joined
+        end = start + len(answer)
+        if end == len(self.joined):
+            return self.joined[:max(start - 1, 0)]
+        return self.joined[:start] + self.joined[end + 1:]
+
+    def choice(self, answer: str, score: int = 1) -> str:
+        """ A multiple choice question whose right answer is answer and whose wrong answers are the other options """
+        return "{" + str(score) + ":MCS:=" + answer + "~" + self.without(answer) + "}"
@@ -1,11 +1,13 @@
 from typing import List, Dict
 from imagecreator.image_generator import ImageGenerator
+from parser.compilation import CompilationUnit
 from parser.parser_types import Statement, Calculation, Edge
 from builder.extra_tags import generalfeedback, questiontextT
 from dominate.tags import div, p, ul, img, li, ul
 from collections import namedtuple
+import constants as c
 
-Config = namedtuple('Config', 'language qtype format name category only reduced constants')
+Config = namedtuple('Config', 'language qtype format name category only reduced constants distractors', defaults=(c.MAX_DISTRACTORS,))
 
 
 class FeedbackBuilder(object):
@@ -37,21 +39,21 @@ class FeedbackBuilder(object):
         feedback.add(feedbackText)
         return feedback
 
-    def build_feedback_file(self, code: List[Statement], source_code: str) -> generalfeedback:
+    def build_feedback_file(self, code: List[Statement], unit: CompilationUnit) -> generalfeedback:
         feedback = generalfeedback(format="html")
         feedbackText = questiontextT()
         divHolder = div(style="width:100%")
         feedbackText.add(divHolder)
         d = div(style="width:100%")
         if self.config.format == 'svg':
-            image = self.image_gen.get_all_animation(code, source_code)
+            image = self.image_gen.get_all_animation(code, unit)
             img_tag = self.image_gen.encode_image(image)
             divHolder.add(img_tag)
             para = p(
                 "The diagram above shows an animation of the overall program flow. On the left, the flowchart shows the control flow of the program and on the right the code is being shown. The line of code and the corresponding part of the flowchart are highlighted step by step to show the execution of the program. The table below the code shows the currently executing line of code as well as the current value of each of the variables.")
             d.add(para)
         elif self.config.format == 'html':
-            frames: Dict[int,str] = self.image_gen.get_all_animation_list(code, source_code)
+            frames: Dict[int,str] = self.image_gen.get_all_animation_list(code, unit)
             image_div = self.image_gen.wrap_animation_list_html(frames)
             # image_tag = self.image_gen.encode_image(image)
             divHolder.add(image_div)
@@ -59,7 +61,7 @@ class FeedbackBuilder(object):
                 "The diagram above shows an animation of the overall program flow. On the left, the flowchart shows the control flow of the program and on the right the code is being shown. The line of code and the corresponding part of the flowchart are highlighted step by step to show the execution of the program. The table below the code shows the currently executing line of code as well as the current value of each of the variables.")
             d.add(para)
         else:
-            image = self.image_gen.get_flowchart_image(source_code)
+            image = self.image_gen.get_flowchart_image(unit)
             img_tag = self.image_gen.encode_image(image)
             divHolder.add(img_tag)
             para = p(
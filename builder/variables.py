@@ -1,6 +1,7 @@
 from dominate.tags import tr, td, table, th, div, h1
-from typing import List, Dict, Tuple, Any
-from parser.parser_types import Statement
+from typing import List, Dict, Tuple, Any, Sequence, Optional
+from parser.parser_types import Statement, Memory, Variables
+from parser.memory import MemorySnapshot, MemoryCursor
 from parser.generic_parser import Parser
 import constants as c
 
@@ -14,7 +15,7 @@ class VarInfoBuilder(object):
     def build_var_row(self, var_name: str, var_value: Tuple[int, Any, str, str], show_value: bool) -> tr:
         """ This function creates a single row of the table for displaying variables in the question.
             The value of a variable will be shown if showValue is True and replaced with a short answer
-            question type when the value is False. """
+            question type when the value is False. Values too long to be written in full are always shown shortened. """
         # print(var_value)
         row = tr(td(var_value[0], style="border: 1px solid black"), td(var_name, style="border: 1px solid black"), style="border: 1px solid black")
         if show_value:
@@ -23,7 +24,10 @@ class VarInfoBuilder(object):
             cell = td("{1:MCS:=" + var_value[2] + "~" + "~".join(self.types.getWrongTypes(var_value[2])) + "}",
                       style="border: 1px solid black")
         row.add(cell)
-        if show_value:
+        elision = self.parser.elision
+        if not elision.fits(var_value[1]):
+            cell = td(elision.show(var_value[1]), style="border: 1px solid black")
+        elif show_value:
             cell = td(var_value[3], style="border: 1px solid black")
         else:
             if var_value[2] == 'float':
@@ -72,7 +76,11 @@ class VarInfoBuilder(object):
 
     def get_all_variables(self, code: List[Statement]) -> Dict[str, Tuple[str, int, int]]:
         var_names = dict()
+        last = None
         for line in code:
+            if line["variables_after"] is last:
+                continue
+            last = line["variables_after"]
             for var_name in line["variables_after"]:
                 if var_name in var_names:
                     address = line["variables_after"][var_name][1]
@@ -94,52 +102,19 @@ class VarInfoBuilder(object):
 
     def get_symbol_tables(self, code: Statement) -> Tuple[Dict[str, Tuple[int, Any, str, str]], Dict[str, Tuple[int, Any, str, str]]]:
         """This  function assumes that memory is not being shown and only returns the values of the variables"""
-        print(code)
-        memory_before: Dict[int, Tuple[int, Any, str, str]] = dict()
-        memory_after: Dict[int, Tuple[int, Any, str, str]] = dict()
         var_before: Dict[str, Tuple[int, Any, str, str]] = dict()
         var_after: Dict[str, Tuple[int, Any, str, str]] = dict()
         var_changes: Dict[str, Tuple[int, Any, str, str]] = dict()
-        for mem_loc in code["memory_after"]:
-            memory_after[mem_loc["address"]] = (mem_loc["address"], mem_loc["value"], mem_loc["type"], mem_loc["value_show"])
-        for mem_loc in code["memory_before"]:
-            memory_before[mem_loc["address"]] = (mem_loc["address"], mem_loc["value"], mem_loc["type"], mem_loc["value_show"])
-            print(memory_before[mem_loc["address"]])
-        for var in code["variables_before"]:
-            if 'char[]' in code["variables_before"][var][0]:
-                add = code["variables_before"][var][1]
-                array_start_address = code["variables_before"][var][1]
-                memory_contents = [m[1] for m in memory_before.values()]
-                string_contents = []
-                for ind in range(array_start_address, len(memory_contents)):
-                    if memory_contents[ind] != 0:
-                        string_contents.append(memory_contents[ind])
-                    else:
-                        break
-                val = "".join([chr(i) for i in string_contents])
-                var_before[var] = (memory_before[add][1], val, 'char[]', self.parser.get_result_string(val))
+        for var, info in code["variables_before"].items():
+            if 'char[]' in info[0]:
+                var_before[var] = self.get_string_entry(code["memory_before"], info)
             else:
-                print(code["variables_after"], code["variables_before"])
-                add = code["variables_after"][var][1]
-                print("looking for address",add)
-                var_before[var] = memory_after[add] # TODO find out why I used memory_before here
-            add = code["variables_before"][var][1]
-        for var in code["variables_after"]:
-            if 'char[]' in code["variables_after"][var][0]:
-                add = code["variables_after"][var][1]
-                array_start_address = code["variables_after"][var][1]
-                memory_contents = [m[1] for m in memory_after.values()]
-                string_contents = []
-                for ind in range(array_start_address, len(memory_contents)):
-                    if memory_contents[ind] != 0:
-                        string_contents.append(memory_contents[ind])
-                    else:
-                        break
-                val = "".join([chr(i) for i in string_contents])
-                var_after[var] = (memory_after[add][1], val, 'char[]', self.parser.get_result_string(val))
+                var_before[var] = self.get_entry(code["memory_after"], code["variables_after"][var][1]) # TODO find out why I used memory_before here
+        for var, info in code["variables_after"].items():
+            if 'char[]' in info[0]:
+                var_after[var] = self.get_string_entry(code["memory_after"], info)
             else:
-                add = code["variables_after"][var][1]
-                var_after[var] = memory_after[add]
+                var_after[var] = self.get_entry(code["memory_after"], info[1])
 
         for k in var_after:
             if k not in var_before:
@@ -148,3 +123,69 @@ class VarInfoBuilder(object):
                 var_changes[k] = var_after[k]
 
         return var_before, var_changes
+
+    @staticmethod
+    def get_entry(memory: Sequence[Memory], address: int) -> Tuple[int, Any, str, str]:
+        cell = memory[address]
+        return cell["address"], cell["value"], cell["type"], cell["value_show"]
+
+    def get_string_entry(self, memory: Sequence[Memory], info: Tuple[str, int, int]) -> Tuple[int, Any, str, str]:
+        """ A string runs from the start of its array up to the first 0 in memory. Usually that is inside the array,
+            so only its values are read unless it is not terminated. """
+        _, start, size = info
+        values = memory_values(memory, start, start + size)
+        if 0 not in values:
+            values += memory_values(memory, start + size, len(memory))
+        string_contents = []
+        for value in values:
+            if value != 0:
+                string_contents.append(value)
+            else:
+                break
+        val = "".join([chr(i) for i in string_contents])
+        return memory[start]["value"], val, 'char[]', self.parser.get_result_string(val)
+
+
+class ValueMatrix(object):
+    """ The values of the variables after each statement of a trace, for the table of a file question. There is a row
+        for each statement and a column for each variable, or for each item of a variable that is a list or an array.
+        Each entry is the cell the column is read from, or None if the variable does not exist yet, and is flagged as
+        changed unless the variable held the same value before the statement. The whole matrix is read in one pass over
+        the trace with a MemoryCursor. The items of a list are read from the cell of the whole list, so they are all
+        flagged as changed whenever the list is. """
+
+    def __init__(self, code: List[Statement], variables: Dict[str, Tuple[str, int, int]], lists: bool) -> None:
+        super().__init__()
+        self.lists = lists
+        self.columns: List[Tuple[str, int]] = []
+        for name, _, size in variables.values():
+            if size == 1:
+                self.columns.append((name, -1))
+            else:
+                self.columns.extend((name, index) for index in range(size))
+        self.cells: List[List[Optional[Memory]]] = []
+        self.changed: List[List[bool]] = []
+        cursor = MemoryCursor()
+        for statement in code:
+            before = self.read(cursor.at(statement["memory_before"]), statement["variables_before"])
+            after = self.read(cursor.at(statement["memory_after"]), statement["variables_after"])
+            self.cells.append(after)
+            self.changed.append([b is None or a is None or b["value"] != a["value"] for b, a in zip(before, after)])
+
+    def read(self, memory: Sequence[Memory], variables: Variables) -> List[Optional[Memory]]:
+        row: List[Optional[Memory]] = []
+        for name, index in self.columns:
+            info = variables.get(name)
+            if info is None:
+                row.append(None)
+            elif index < 0 or self.lists:
+                row.append(memory[info[1]])
+            else:
+                row.append(memory[info[1] + index])
+        return row
+
+
+def memory_values(memory: Sequence[Memory], start: int, stop: int) -> List[Any]:
+    if isinstance(memory, MemorySnapshot):
+        return memory.values(start, stop)
+    return [cell["value"] for cell in memory[start:stop]]
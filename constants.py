@@ -5,6 +5,22 @@ WRONG = "13 characters"
 V_WRONG = "1cters"
 WRONG_NUM = "123456678:0.1"
 
+""" These are the default limits on how much work the tracers will record for a single program """
+MAX_TRACE_STEPS = 10000
+MAX_SNAPSHOT_BYTES = 64 * 1024 * 1024
+
+""" The most items of a list written out in the variable tables and calculations before the rest are left out """
+MAX_SHOWN_ITEMS = 20
+
+""" The next line of the last statement of a trace """
+FINISHED = "Finished"
+
+""" Literals made up of more nodes than this are shown as a single node in the calculations of a statement """
+FOLD_CONSTANTS_ABOVE = 10
+
+""" The most wrong options offered in each drop down of a question, the options most like the answer are offered """
+MAX_DISTRACTORS = 10
+
 """ These constants are for remembering the names of the operations in the language shown in the explanation box """
 M_ASS = "Assignment"
 M_FUN = "Function used"
@@ -14,6 +14,7 @@ from builder.extra_tags import CDATA
 from dominate.svg import svg, text, g, tspan, defs, rect
 from dominate.util import raw
 from parser.generic_flowchart import FlowchartCreator
+from parser.compilation import CompilationUnit, Token
 from imagecreator.image_generator import ImageGenerator
 
 
@@ -44,17 +45,16 @@ class CImageGenerator(ImageGenerator):
         else:
             raise Exception("token not supported {} - {}".format(token, token_type))
 
-    def _add_code_text(self, text_group: g, source: str) -> int:
-        cl = CLexer()
-        code_tokens: List[Tuple[int, Any, str]] = list(cl.get_tokens_unprocessed(source))
+    def lex(self, source: str) -> List[Token]:
+        return list(CLexer().get_tokens_unprocessed(source))
+
+    def _add_code_text(self, text_group: g, code_tokens: List[Token]) -> int:
         h = self.STARTING_HEIGHT
         line_number = 1
         new_line = True
         line = None
         
-        while len(code_tokens) > 0:
-            position, token_type, token = code_tokens[0]
-            code_tokens = code_tokens[1:]
+        for position, token_type, token in code_tokens:
             if new_line:
                 line = text(str(line_number), tspan(raw("&#160;" * 2)), font_size='12px', fill=self.LINE_COLOUR, x=self.LINE_NUMBER_START_DISTANCE, y=h + self.ADJUSTMENT)
                 text_group.add(line)
@@ -71,8 +71,8 @@ class CImageGenerator(ImageGenerator):
             
         return h
 
-    def get_all_animation(self, code: List[Statement], source_code: str) -> str:
-        nodes, edges = self.flow.parse_source(source_code)
+    def get_all_animation(self, code: List[Statement], unit: CompilationUnit) -> str:
+        nodes, edges = unit.flowchart(self.flow)
         flowchart_svg_string = self.dot_to_svg_string(self._generate_flowchart_dot_string(nodes, edges))
         flowchart_svg_xml = self.remove_xml_comments(parseString(flowchart_svg_string))
         flowchart_svg_tag = flowchart_svg_xml.getElementsByTagName("svg")[0]
@@ -82,7 +82,7 @@ class CImageGenerator(ImageGenerator):
         svg_style_tag.setAttribute("type", "text/css")
         flowchart_svg_tag.appendChild(svg_defs_tag)
         svg_defs_tag.appendChild(svg_style_tag)
-        w, gr = self.generate_code_table_animation_svg_string(source_code, code)
+        w, gr = self.generate_code_table_animation_svg_string(unit, code)
         key = self._generate_animation_css(code, self.NODE_NORMAL_COLOUR, self.HIGHLIGHT_COLOUR)
         cdata = flowchart_svg_xml.createCDATASection(key)
         svg_style_tag.appendChild(cdata)
@@ -111,10 +111,10 @@ class CImageGenerator(ImageGenerator):
         # byte_array = base64.b64encode(pretty.encode('utf8'))
         # return img(alt="", _class="img-responsive atto_image_button_text-bottom", style="object-fit:contain", width="100%", src="data:image/svg+xml;base64," + str(byte_array)[2:-1])
 
-    def generate_code_table_animation_svg_string(self, source: str, code_list: List[Statement]) -> Tuple[float, str]:
+    def generate_code_table_animation_svg_string(self, unit: CompilationUnit, code_list: List[Statement]) -> Tuple[float, str]:
         variables :List[str] = code_list[-1]["variables_after"].keys()
         code_list_copy: List[Statement] = [empty_statement(0)] + deepcopy(code_list) + [empty_statement(-1)]
-        lines = source.splitlines()
+        lines = unit.source_code.splitlines()
         frames = len(lines) + 2
         exe_code_len = [len(stat["calculation"]["code"]) * (self.CHAR_WIDTH + 2) + 90 for stat in code_list_copy]
         height = frames * self.LINE_SEPARATION + self.LINE_SEPARATION * (len(variables) + 1)
@@ -130,7 +130,7 @@ class CImageGenerator(ImageGenerator):
         code_svg += defs(style(CDATA(self.STYLESHEET.format(animation_string)), type="text/css"))
         text_group = g(_class="normal")
         alt_svg += text_group
-        h = self._add_code_text(text_group, source)
+        h = self._add_code_text(text_group, unit.tokens(self.lex))
         table = g()
         h = h + self.LINE_SEPARATION
         table += rect(fill=self.NODE_NORMAL_COLOUR, height=self.LINE_SEPARATION * (len(variables) + 1), width=width, x=0, y=h, stroke=self.BACKGROUND_COLOUR)
@@ -163,12 +163,11 @@ class CImageGenerator(ImageGenerator):
                     cl = CLexer()
                     code_tokens: List[Tuple[int, Any, str]] = []
                     if size == 1:
-                        code_tokens = list(cl.get_tokens_unprocessed(stat["memory_after"][add]["value_show"]))
+                        code_tokens = list(cl.get_tokens_unprocessed(self.elision.show_cell(stat["memory_after"][add])))
                     else:
-                        values = []
-                        for index in range(size):
-                            values.append(stat["memory_after"][add+index]["value_show"])
-                        code_tokens.extend(list(cl.get_tokens_unprocessed("{ "+", ".join(values)+" }")))
+                        memory = stat["memory_after"]
+                        values = self.elision.join(lambda index: memory[add + index]["value_show"], size)
+                        code_tokens.extend(list(cl.get_tokens_unprocessed("{ " + values + " }")))
                     while len(code_tokens) > 0:
                         position, token_type, token = code_tokens[0]
                         code_tokens = code_tokens[1:]
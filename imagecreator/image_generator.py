@@ -4,11 +4,13 @@ from dominate.tags import img, style,  button, span, br, div
 from builder.extra_tags import CDATA, scrpt
 from dominate.svg import svg, text, g, tspan, defs, rect
 from copy import deepcopy
-from typing import Dict, List
+from typing import Dict, List, Optional
 from parser.parser_types import Edge, Statement, Tuple, Calculation, empty_statement
 from graphviz import Source
 from xml.dom.minidom import Element, parseString, Comment
 from parser.generic_flowchart import FlowchartCreator
+from parser.display import Elision
+from parser.compilation import CompilationUnit, Token
 
 NO_COPY = "svg text {{ -webkit-user-select: none; -moz-user-select: none; -ms-user-select: none; user-select: none; }} svg text::selection {{ background: none; }}"
 NORMAL_STYLE = ' .normal {{ font-family: "Courier"; font-size: 18; }}'
@@ -79,29 +81,41 @@ class ImageGenerator(object):
         self.HIGHLIGHT_COLOUR = "#AEF359"
         self.STYLESHEET = NO_COPY + NORMAL_STYLE + " {}"
         self.last_code_highlight: int = -1
+        self.elision: Elision = Elision()
+
+    def set_elision(self, max_items: Optional[int]) -> None:
+        """ The most items of a list written out in the variable tables """
+        self.elision = Elision(max_items)
 
     def encode_image(self, image_str: str) -> img:
         print(image_str)
         byte_array = base64.b64encode(image_str.encode('utf-8'))
         return img(alt="", _class="img-responsive atto_image_button_text-bottom", style="object-fit:contain", width="100%", src="data:image/svg+xml;base64," + str(byte_array)[2:-1])
 
-    def get_code_image(self, source: str) -> str:
-        height, width = self._get_image_sizes(source)
+    def get_code_image(self, unit: CompilationUnit) -> str:
+        """ The image only depends on the source code, so it is drawn once for each unit """
+        if unit.code_image is not None:
+            return unit.code_image
+        height, width = self._get_image_sizes(unit.source_code)
         svg_tag: svg = svg(id="svg", width=width, height=height, viewBox="0.00 0.00 {} {}".format(width, height), xmlns="http://www.w3.org/2000/svg")
         svg_tag += defs(style(CDATA(self.STYLESHEET.format("")), type="text/css"))
         svg_tag += rect(fill=self.BACKGROUND_COLOUR, height=height, width=width, x=0, y=0)
         text_group = g(_class="normal", __pretty=False)
         svg_tag += text_group
-        self._add_code_text(text_group, source)
-        return svg_tag.render(pretty=False, xhtml=True)
+        self._add_code_text(text_group, unit.tokens(self.lex))
+        unit.code_image = svg_tag.render(pretty=False, xhtml=True)
+        return unit.code_image
         # byte_array = base64.b64encode(svg_tag.render(pretty=False, xhtml=True).encode('ascii'))
         # return str(byte_array)[2:-1]
 
-    def _add_code_text(self, text_group: g, source: str) -> int:
+    def lex(self, source: str) -> List[Token]:
+        raise Exception("This functionality has not yet been implemented")
+
+    def _add_code_text(self, text_group: g, code_tokens: List[Token]) -> int:
         raise Exception("This functionality has not yet been implemented")
 
-    def get_flowchart_image(self, source: str) -> str:
-        nodes, edges = self.flow.parse_source(source)
+    def get_flowchart_image(self, unit: CompilationUnit) -> str:
+        nodes, edges = unit.flowchart(self.flow)
         return self.dot_to_svg_string(self._generate_flowchart_dot_string(nodes, edges))
         # byte_array = base64.b64encode(self.dot_to_svg_string(self._generate_flowchart_dot_string(nodes, edges)).encode('ascii'))
         # return str(byte_array)[2:-1]
@@ -208,10 +222,10 @@ class ImageGenerator(object):
         # byte_array = base64.b64encode(pretty.encode('ascii'))
         # return img(alt="", _class="img-responsive atto_image_button_text-bottom", style="object-fit:contain", width="100%", src="data:image/svg+xml;base64," + str(byte_array)[2:-1])
 
-    def get_all_animation(self, code: List[Statement], source_code: str) -> img:
+    def get_all_animation(self, code: List[Statement], unit: CompilationUnit) -> img:
         raise Exception("This functionality has not yet been implemented")
 
-    def get_all_animation_list(self, code: List[Statement], source_code: str) -> List[str]:
+    def get_all_animation_list(self, code: List[Statement], unit: CompilationUnit) -> List[str]:
         raise Exception("This functionality has not yet been implemented")
 
     def wrap_animation_list_html(self, svg_frames: Dict[int, str]):
@@ -234,25 +248,24 @@ class ImageGenerator(object):
     def get_labels_statement(self, e: Statement, labels: List[Tuple[str, str]], edges: List[Tuple[str, str, str]]) -> None:
         label_string = '[shape="box", style="filled", label="{}\\n{}", class="node{}"]'
         edge_string = '[color ="{0}", dir="both", arrowhead="none", arrowtail="normal", label="{1}", fontcolor="{0}", class="edge{2}{3}"]'
-        for s in e["calculation"]["subcalculations"]:
-            self.get_labels_calculation(s, labels, edges)
+        sub_labels = [self.get_labels_calculation(s, labels, edges) for s in e["calculation"]["subcalculations"]]
         lab = self.get_letter(len(labels))
-        e["calculation"]['fb_label'] = lab
         labels.append((lab, label_string.format(e["calculation"]["explanation"], e["calculation"]["code"].replace('"', '\\"'), lab)))
-        for s in e["calculation"]["subcalculations"]:
-            edges.append((lab, s['fb_label'], edge_string.format(self.EDGE_COLOUR, s["result_show"].replace('"', '\\"'), s['fb_label'], lab)))
+        for s, sub_lab in zip(e["calculation"]["subcalculations"], sub_labels):
+            edges.append((lab, sub_lab, edge_string.format(self.EDGE_COLOUR, self.elision.show_result(s).replace('"', '\\"'), sub_lab, lab)))
 
-    def get_labels_calculation(self, e: Calculation, labels: List[Tuple[str, str]], edges: List[Tuple[str, str, str]]) -> None:
+    def get_labels_calculation(self, e: Calculation, labels: List[Tuple[str, str]], edges: List[Tuple[str, str, str]]) -> str:
+        """ Returns the label of the node drawn for e. Subcalculations can be shared, even within one statement, so
+            the label is not stored in the calculation. """
         label_string = '[shape="box", style="filled", label="{}\\n{} => {}", class="node{}"]'
         edge_string = '[color ="{0}", dir="both", arrowhead="none", arrowtail="normal", label="{1}", fontcolor="{0}", class="edge{2}{3}"]'
-        for s in e["subcalculations"]:
-            self.get_labels_calculation(s, labels, edges)
+        sub_labels = [self.get_labels_calculation(s, labels, edges) for s in e["subcalculations"]]
 
         lab = self.get_letter(len(labels))
-        e['fb_label'] = lab
-        labels.append((lab, label_string.format(e["explanation"], e["code"].replace('"', '\\"'), e["result_show"].replace('"', '\\"'), lab)))
-        for s in e["subcalculations"]:
-            edges.append((lab, s['fb_label'], edge_string.format(self.EDGE_COLOUR, s["result_show"].replace('"', '\\"'), s['fb_label'], lab)))
+        labels.append((lab, label_string.format(e["explanation"], e["code"].replace('"', '\\"'), self.elision.show_result(e).replace('"', '\\"'), lab)))
+        for s, sub_lab in zip(e["subcalculations"], sub_labels):
+            edges.append((lab, sub_lab, edge_string.format(self.EDGE_COLOUR, self.elision.show_result(s).replace('"', '\\"'), sub_lab, lab)))
+        return lab
 
     @staticmethod
     def get_letter(i: int) -> str:
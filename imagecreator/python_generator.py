@@ -15,6 +15,7 @@ from dominate.util import raw
 from dominate.svg import svg, text, g, tspan, defs, rect
 from pygments.token import Text, Operator, Keyword, Name, String, Number, Punctuation
 from parser.generic_flowchart import FlowchartCreator
+from parser.compilation import CompilationUnit, Token
 
 
 class PythonImageGenerator(ImageGenerator):
@@ -42,16 +43,15 @@ class PythonImageGenerator(ImageGenerator):
         else:
             raise Exception("token not supported {} {}".format(token, token_type))
 
-    def _add_code_text(self, text_group: g, source: str) -> int:
-        pl = PythonLexer()
-        code_tokens: List[Tuple[int, Any, str]] = list(pl.get_tokens_unprocessed(source))
+    def lex(self, source: str) -> List[Token]:
+        return list(PythonLexer().get_tokens_unprocessed(source))
+
+    def _add_code_text(self, text_group: g, code_tokens: List[Token]) -> int:
         h = self.STARTING_HEIGHT
         line_number = 1
         new_line = True
         line = None
-        while len(code_tokens) > 0:
-            position, token_type, token = code_tokens[0]
-            code_tokens = code_tokens[1:]
+        for position, token_type, token in code_tokens:
             if new_line:
                 line = text(str(line_number), tspan(raw("&#160;" * 2)), font_size='12px', fill=self.LINE_COLOUR, x=self.LINE_NUMBER_START_DISTANCE, y=h + self.ADJUSTMENT)
                 text_group.add(line)
@@ -67,14 +67,14 @@ class PythonImageGenerator(ImageGenerator):
             line.add(token_tspan)
         return h
 
-    def get_all_animation_list(self, code: List[Statement], source_code: str) -> div:
-        nodes, edges = self.flow.parse_source(source_code)
+    def get_all_animation_list(self, code: List[Statement], unit: CompilationUnit) -> div:
+        nodes, edges = unit.flowchart(self.flow)
         flowchart_svg_string = self.dot_to_svg_string(self._generate_flowchart_dot_string(nodes, edges))
         flowchart_svg_xml = self.remove_xml_comments(parseString(flowchart_svg_string))
         frame_css_dict : Dict[int, str] = self._generate_animation_css_list(code, self.NODE_NORMAL_COLOUR, self.HIGHLIGHT_COLOUR)
         flowchart_svg_tag = flowchart_svg_xml.getElementsByTagName("svg")[0]
         graph_g = flowchart_svg_xml.getElementsByTagName("g")[0]
-        w, gr = self.generate_code_table_animation_svg_string(source_code, code)
+        w, gr = self.generate_code_table_animation_svg_string(unit, code)
         code_table_svg_tag = self.remove_xml_comments(parseString(gr))
         code_table_g_tag = code_table_svg_tag.getElementsByTagName("g")[0]
         impl = getDOMImplementation()
@@ -101,14 +101,14 @@ class PythonImageGenerator(ImageGenerator):
         return svg_frames
     
 
-    def get_all_animation(self, code: List[Statement], source_code: str) -> str:
-        nodes, edges = self.flow.parse_source(source_code)
+    def get_all_animation(self, code: List[Statement], unit: CompilationUnit) -> str:
+        nodes, edges = unit.flowchart(self.flow)
         flowchart_svg_string = self.dot_to_svg_string(self._generate_flowchart_dot_string(nodes, edges))
         flowchart_svg_xml = self.remove_xml_comments(parseString(flowchart_svg_string))
         css_anim_string = self._generate_animation_css(code, self.NODE_NORMAL_COLOUR, self.HIGHLIGHT_COLOUR)
         flowchart_svg_tag = flowchart_svg_xml.getElementsByTagName("svg")[0]
         graph_g = flowchart_svg_xml.getElementsByTagName("g")[0]
-        w, gr = self.generate_code_table_animation_svg_string(source_code, code)
+        w, gr = self.generate_code_table_animation_svg_string(unit, code)
         code_table_svg_tag = self.remove_xml_comments(parseString(gr))
         code_table_g_tag = code_table_svg_tag.getElementsByTagName("g")[0]
         impl = getDOMImplementation()
@@ -136,10 +136,10 @@ class PythonImageGenerator(ImageGenerator):
         # return str(byte_array)[2:-1]
 
 
-    def generate_code_table_animation_svg_string(self, source: str, code_list: List[Statement]) -> Tuple[float, str]:
+    def generate_code_table_animation_svg_string(self, unit: CompilationUnit, code_list: List[Statement]) -> Tuple[float, str]:
         variables = code_list[-1]["variables_after"].keys()
         code_list_copy: List[Statement] = [empty_statement(0)] + deepcopy(code_list) + [empty_statement(int(code_list[-1]["current_line"]) + 1)]
-        lines = source.splitlines()
+        lines = unit.source_code.splitlines()
         frames = len(lines) + 2
         exe_code_len = [len(stat["calculation"]["code"]) * (self.CHAR_WIDTH + 2) + 90 for stat in code_list_copy]
         height = frames * self.LINE_SEPARATION + self.LINE_SEPARATION * (len(variables) + 1)
@@ -156,7 +156,7 @@ class PythonImageGenerator(ImageGenerator):
                             visibility="hidden", opacity=0.5, _class="codeline{}".format(i))
         text_group = g(_class="normal")
         alt_svg += text_group
-        h = self._add_code_text(text_group, source)
+        h = self._add_code_text(text_group, unit.tokens(self.lex))
         table = g()
         h = h + self.LINE_SEPARATION
         table += rect(fill=self.NODE_NORMAL_COLOUR, height=self.LINE_SEPARATION * (len(variables) + 1), width=width, x=0, y=h, stroke=self.BACKGROUND_COLOUR)
@@ -188,7 +188,7 @@ class PythonImageGenerator(ImageGenerator):
                 if v in stat["variables_after"]:
                     text_tag = text(font_size='18px', fill=self.BACKGROUND_COLOUR, x=len(" Code:   ") * self.CHAR_WIDTH, y=h + self.ADJUSTMENT, _class="alternate var_display{}_{}".format(vn, i), visibility="hidden")
                     pl = PythonLexer()
-                    code_tokens: List[Tuple[int, Any, str]] = list(pl.get_tokens_unprocessed(stat["memory_after"][stat["variables_after"][v][1]]["value_show"]))
+                    code_tokens: List[Tuple[int, Any, str]] = list(pl.get_tokens_unprocessed(self.elision.show_cell(stat["memory_after"][stat["variables_after"][v][1]])))
                     while len(code_tokens) > 0:
                         position, token_type, token = code_tokens[0]
                         code_tokens = code_tokens[1:]
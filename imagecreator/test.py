@@ -4,13 +4,14 @@ from imagecreator.c_generator import CImageGenerator
 from parser.python.flowchart import PythonFlowCreator
 from parser.python.parser import PythonParser
 from parser.c.parser import CParser
+from parser.compilation import CompilationUnit
 
 if __name__ == "__main__":
     p = True
     if p:
         source = 'd = [1,2,3]\nv = 0\nwhile v < 3:\n    d[v] = d[v] *3\n    v = v + 1'
         gen = PythonImageGenerator(PythonFlowCreator())
-        img1 = gen.get_code_image(source)
+        img1 = gen.get_code_image(CompilationUnit(PythonParser(), source))
         print(img1)
         # img2 = gen.get_flowchart_image(source)
         # print(img2)
@@ -46,5 +47,5 @@ if __name__ == "__main__":
         # img4 = gen.get_ast_animation(code_list[1])
         # print(img4)
 
-        img5 = gen.get_all_animation(code_list, source)
+        img5 = gen.get_all_animation(code_list, CompilationUnit(cp, source))
         print(img5)
@@ -1,88 +1,106 @@
 import argparse
 import os
-import glob
 import json
 
 from parser.generic_flowchart import FlowchartCreator
 from parser.generic_parser import Parser
+from parser.limits import TraceLimitError
+from parser.cache import TraceCache
+from parser.compilation import CompilationUnit
+from parser.trace_file import TracedProgram, TraceFileError, read_trace_file, write_trace_file
 from imagecreator.image_generator import ImageGenerator
 
 import parser.python.parser as python_parser
+import parser.python.native as native
 import parser.python.flowchart as python_flow_parser
 import imagecreator.python_generator as python_image_gen
 import parser.c.parser as c_parser
 import parser.c.flowchart as c_flow_parser
 import imagecreator.c_generator as c_image_gen
 
-from builder.builder import Builder
+from builder.builder import Builder, Config
 from builder.extra_tags import quiz
-from typing import List, Dict
+from typing import Iterable, Iterator, List, Dict, Tuple
 import parser.multiplier as template_generator
 import constants as c
 
 
-def delete_temp() -> None:
-    files = glob.glob('temp/*.*')
-
-    for file_name in files:
-        try:
-            os.remove(file_name)
-        except OSError as e:
-            print("Error: %s : %s" % (file_name, e.strerror))
-
-
-def generate_templated_code_question(q_root: quiz, parser: Parser, flowchart_parser: FlowchartCreator, code_file: str, parameter_file: str, question_name: str, image_generator: ImageGenerator, generate_file_questions: bool,
-                                     generate_line_questions: bool, omit_ert: bool, animate_fb: bool, display_const: bool, only_line_numbers: List[int], input_dict: Dict[str, str]):
-    templated_codes = template_generator.generate_from_template(code_file, parameter_file, question_name)
+def trace_templated_code(parser: Parser, code_file: str, parameter_file: str, question_name: str, input_dict: Dict[str, str], stream: bool) -> Iterator[TracedProgram]:
+    """ The variants share one syntax tree, which is bound to the parameters of the next variant when it is asked for,
+        so everything that is built from a variant has to be built before the next one is asked for. When stream is
+        True the programs are not traced here, their code_list is None and they are streamed from their unit instead. """
+    templated_codes = template_generator.generate_trees_from_template(parser, open(code_file).read(), open(parameter_file).read(), question_name)
     num = 0
-    for name, source_code in templated_codes:
+    for name, source_code, tree in templated_codes:
         std_in = []
         if input_dict and str(num) in input_dict:
             std_in = input_dict[str(num)].split("\n")
-            parser.set_input(std_in)
-        code_list, line_numbers = parser.parse_source(source_code)
-        builder = Builder(parser, flowchart_parser, image_generator, omit_ert, display_const, animate_fb, code_list)
-        image = image_generator.get_code_image(source_code)
-
-        if generate_line_questions:
-            questions = builder.build_line_questions(code_list, image, name, only_line_numbers, std_in)
-            for q in questions:
-                q_root.add(q)
-
-        if generate_file_questions:
-            explanations: List[str] = Parser.get_explanations_code(code_list)
-            tags = list(set([c.get_tag(x) for x in explanations]))
-            questions = builder.build_file_question(code_list, name, source_code, tags, std_in)
-            for q in questions:
-                q_root.add(q)
+        parser.set_input(std_in)
+        unit = CompilationUnit(parser, source_code, tree)
+        code_list, line_numbers = unit.trace() if not stream else (None, None)
+        yield TracedProgram(name, parser.language, source_code, std_in, code_list, line_numbers, unit)
         num = num + 1
 
 
-def generate_code_question(q_root: quiz, parser: Parser, flowchart_parser: FlowchartCreator, code_file: str, question_name: str, image_generator: ImageGenerator, generate_file_questions: bool, generate_line_questions: bool,
-                           omit_ert: bool, animate_fb: bool, display_const: bool, only_line_numbers: List[int], input_dict: Dict[str, str]):
+def trace_code(parser: Parser, code_file: str, question_name: str, input_dict: Dict[str, str], stream: bool) -> Iterator[TracedProgram]:
+    """ The program is only traced when it is asked for, like the variants of a template """
     source_code = open(code_file).read()
     std_in = []
     if input_dict and "0" in input_dict:
         std_in = input_dict[str("0")].split("\n")
         parser.set_input(std_in)
-    code_list, line_numbers = parser.parse_source(source_code)
-    builder = Builder(parser, flowchart_parser, image_generator, omit_ert, display_const, animate_fb, code_list)
-    image = image_generator.get_code_image(source_code)
+    unit = CompilationUnit(parser, source_code)
+    code_list, line_numbers = unit.trace() if not stream else (None, None)
+    yield TracedProgram(question_name, parser.language, source_code, std_in, code_list, line_numbers, unit)
+
+
+def rename_programs(programs: List[TracedProgram], question_name: str) -> List[TracedProgram]:
+    """ Names the programs read from a trace file as they would have been named if they were traced with question_name,
+        the variants of a template each get the same suffix as when the template is traced """
+    if len(programs) == 1:
+        return [programs[0]._replace(name=question_name)]
+    return [program._replace(name=question_name + "-" + template_generator.generated_name(i, len(programs))) for i, program in enumerate(programs)]
+
+
+def build_questions(q_root: quiz, parser: Parser, flowchart_parser: FlowchartCreator, image_generator: ImageGenerator, config: Config, program: TracedProgram, generate_file_questions: bool,
+                    generate_line_questions: bool, only_line_numbers: List[int]):
+    unit = program.unit or CompilationUnit(parser, program.source_code)
+    code_list = program.code_list
+    if code_list is None:
+        # Only line questions are being built, the trace is streamed twice, for the drop downs and for the questions
+        builder = Builder(parser, flowchart_parser, image_generator, config, unit.stream())
+        code_list = unit.stream()
+    else:
+        builder = Builder(parser, flowchart_parser, image_generator, config, code_list)
+    image = image_generator.get_code_image(unit)
+    img_tag = image_generator.encode_image(image)
+
     if generate_line_questions:
-        questions = builder.build_line_questions(code_list, image, question_name, only_line_numbers, std_in)
+        questions = builder.build_line_questions(code_list, img_tag, program.name, only_line_numbers, program.input_lines)
         for q in questions:
             q_root.add(q)
+
     if generate_file_questions:
-        explanations: List[str] = Parser.get_explanations_code(code_list)
-        tags = list(set([c.get_tag(x) for x in explanations]))
-        questions = builder.build_file_question(code_list, question_name, source_code, tags, std_in)
+        tags = Parser.get_tags_code(program.code_list)
+        questions = builder.build_file_question(program.code_list, program.name, unit, tags, program.input_lines)
         for q in questions:
             q_root.add(q)
 
 
+def create_language(language: str) -> Tuple[Parser, FlowchartCreator, ImageGenerator]:
+    if language.lower() == "python":
+        flow_parser = python_flow_parser.PythonFlowCreator()
+        return python_parser.PythonParser(), flow_parser, python_image_gen.PythonImageGenerator(flow_parser)
+    elif language.lower() == "c":
+        flow_parser = c_flow_parser.CFlowCreator()
+        return c_parser.CParser(), flow_parser, c_image_gen.CImageGenerator(flow_parser)
+    else:
+        raise Exception("This language has not been implemented yet")
+
+
 if __name__ == "__main__":
     arg_parser = argparse.ArgumentParser(description='Generating code tracing quiz questions for moodle')
-    arg_parser.add_argument("codefile", help="This is the Python code file you want to generate a tracing quiz for",
+    arg_parser.add_argument("codefile", nargs="?", help="This is the Python code file you want to generate a tracing quiz for, it can be left out when --from-trace is used",
                             type=str)
     arg_parser.add_argument("-n", "--name", help="the base name for the question, if ignored the file name will be used",
                             type=str)
@@ -112,6 +130,26 @@ if __name__ == "__main__":
                             help="This creates animated versions of the feedback displayed. This option takes longer to complete and adds greatly to the size of the generated quiz file.")
     arg_parser.add_argument("-d", '--display', dest='display', default=False, action='store_true',
                             help="This allows the literal value lines of individual line quesitons to be asked as questions instead of displayed as text in the calculation table.")
+    arg_parser.add_argument("-m", '--max-steps', dest='max_steps', default=c.MAX_TRACE_STEPS,
+                            help="The most statements a traced program may execute before it is stopped (default is %(default)s)", type=int)
+    arg_parser.add_argument('--max-memory', dest='max_memory', default=c.MAX_SNAPSHOT_BYTES // (1024 * 1024),
+                            help="The most memory in megabytes the trace of a program may use before it is stopped (default is %(default)s)", type=int)
+    arg_parser.add_argument('--show-items', dest='show_items', default=c.MAX_SHOWN_ITEMS,
+                            help="The most items of a list written out in the variable tables and calculations, longer lists are shown rather than asked for, 0 writes every item (default is %(default)s)", type=int)
+    arg_parser.add_argument('--fold-above', dest='fold_above', default=c.FOLD_CONSTANTS_ABOVE,
+                            help="Literals made up of more than this many nodes are shown as one node in the calculations, 0 shows every node (default is %(default)s)", type=int)
+    arg_parser.add_argument('--distractors', dest='distractors', default=c.MAX_DISTRACTORS,
+                            help="The most wrong options offered in each drop down of a question, 0 offers every option (default is %(default)s)", type=int)
+    arg_parser.add_argument('--native', dest='native', default=native.OFF, choices=native.MODES,
+                            help="Run Python programs natively: on only traces the statements on the lines given by -o when only line questions are built, validate traces the whole program and checks it against the native run (default is %(default)s)", type=str)
+    arg_parser.add_argument('--cache', dest='cache', default="cache",
+                            help="The directory traces of programs are cached in, so building the same program with different options does not trace it again (default is %(default)s)", type=str)
+    arg_parser.add_argument('--no-cache', dest='no_cache', default=False, action='store_true',
+                            help="Use this option to always trace the program, without reading or writing the cache.")
+    arg_parser.add_argument('--dump-trace', dest='dump_trace',
+                            help="Trace the program and write the trace to this file instead of building questions", type=str)
+    arg_parser.add_argument('--from-trace', dest='from_trace',
+                            help="Build the questions from a file written by --dump-trace instead of tracing the program, -n renames the programs in the file", type=str)
     arguments = arg_parser.parse_args()
 
     arg_reduced: bool = False
@@ -128,7 +166,13 @@ if __name__ == "__main__":
     arg_input_dict: Dict[str, str] = {"0": ""}
 
     arg_code_file = arguments.codefile
-    if not os.path.exists(arg_code_file):
+    if arguments.from_trace:
+        if not os.path.exists(arguments.from_trace):
+            print("from-trace must point to a readable file")
+            quit()
+        if not arg_code_file:
+            arg_code_file = arguments.from_trace
+    elif not arg_code_file or not os.path.exists(arg_code_file):
         print("codefile must point to a readable file")
         quit()
 
@@ -150,7 +194,6 @@ if __name__ == "__main__":
     if arguments.only:
         arg_line_numbers = [int(x) for x in arguments.only.split(",")]
 
-    image_file_name = "temp/" + arg_code_file.split("/")[-1].split(".")[0] + ".png"
     quiz_file_name = "quizzes/" + arg_code_file.split("/")[-1].split(".")[0] + ".xml"
     arg_question_name = arg_code_file.split("/")[-1].split(".")[0]
     if arguments.name:
@@ -182,30 +225,60 @@ if __name__ == "__main__":
         arg_parameters_file = arguments.parameter
         arg_parameters_bool = True
 
-    code_parser: Parser = None
-    flow_parser: FlowchartCreator = None
-    image_gen: ImageGenerator = None
-    if arguments.lang:
-        if arguments.lang.lower() == "python":
-            code_parser = python_parser.PythonParser()
-            flow_parser = python_flow_parser.PythonFlowCreator()
-            image_gen = python_image_gen.PythonImageGenerator(flow_parser)
-
-        elif arguments.lang.lower() == "c":
-            code_parser = c_parser.CParser()
-            flow_parser = c_flow_parser.CFlowCreator()
-            image_gen = c_image_gen.CImageGenerator(flow_parser)
+    arg_language: str = arguments.lang
+    arg_programs: Iterable[TracedProgram] = []
+    if arguments.from_trace:
+        try:
+            traced_programs = read_trace_file(arguments.from_trace)
+        except TraceFileError as e:
+            print("The trace file could not be read: " + str(e))
+            quit(1)
+        if arguments.name:
+            traced_programs = rename_programs(traced_programs, arguments.name)
+        arg_programs = traced_programs
+        arg_language = traced_programs[0].language
+
+    code_parser: Parser
+    flow_parser: FlowchartCreator
+    image_gen: ImageGenerator
+    code_parser, flow_parser, image_gen = create_language(arg_language)
+    code_parser.set_elision(arguments.show_items or None)
+    image_gen.set_elision(arguments.show_items or None)
+
+    if not arguments.from_trace:
+        code_parser.set_limits(arguments.max_steps, arguments.max_memory * 1024 * 1024)
+        code_parser.set_folding(arguments.fold_above or None)
+        arg_stream = arg_line_questions and not arg_file_questions and not arguments.dump_trace
+        if isinstance(code_parser, python_parser.PythonParser):
+            code_parser.set_native(arguments.native, arg_line_numbers if arg_stream else [])
+        if not arguments.no_cache:
+            code_parser.set_cache(TraceCache(arguments.cache))
+        if arg_parameters_bool:
+            arg_programs = trace_templated_code(code_parser, arg_code_file, arg_parameters_file, arg_question_name, arg_input_dict, arg_stream)
         else:
-            raise Exception("This language has not been implemented yet")
+            arg_programs = trace_code(code_parser, arg_code_file, arg_question_name, arg_input_dict, arg_stream)
 
-    if arg_parameters_bool:
-        generate_templated_code_question(quiz_root, code_parser, flow_parser, arg_code_file, arg_parameters_file, arg_question_name, image_gen, arg_file_questions, arg_line_questions, arg_reduced, arg_feedback_animations,
-                                         arg_display_constants, arg_line_numbers, arg_input_dict)
+    if arg_file_questions and arg_line_questions:
+        arg_question_type = "both"
+    elif arg_line_questions:
+        arg_question_type = "individual"
     else:
-        generate_code_question(quiz_root, code_parser, flow_parser, arg_code_file, arg_question_name, image_gen, arg_file_questions, arg_line_questions, arg_reduced, arg_feedback_animations, arg_display_constants, arg_line_numbers,
-                               arg_input_dict)
+        arg_question_type = "all"
+    arg_config = Config(arg_language, arg_question_type, "svg" if arg_feedback_animations else "static", arg_question_name, category_name, arguments.only or "", arg_reduced, arg_display_constants, arguments.distractors)
+    # Templated variants are traced as they are asked for, so each one is written or built before the next is traced
+    try:
+        if arguments.dump_trace:
+            write_trace_file(arguments.dump_trace, arg_programs)
+            quit()
+        for program in arg_programs:
+            build_questions(quiz_root, code_parser, flow_parser, image_gen, arg_config, program, arg_file_questions, arg_line_questions, arg_line_numbers)
+    except TraceLimitError as e:
+        print("The program could not be traced: " + str(e))
+        quit()
+    except native.NativeMismatchError as e:
+        print("The trace does not match the program: " + str(e))
+        quit()
 
     f = open(quiz_file_name, "w")
     f.write(str(quiz_root))
     f.close()
-    delete_temp()
@@ -1,6 +1,7 @@
 from parser.generic_flowchart import FlowchartCreator
 from parser.parser_types import Edge, LineNumber
-from pycparser import c_ast, parse_file
+from parser.c.front_end import parse_c
+from pycparser import c_ast
 from typing import Dict, Tuple, Any, List, Set
 
 class CFlowCreator(FlowchartCreator):
@@ -11,13 +12,13 @@ class CFlowCreator(FlowchartCreator):
       self.compound_depth : int = 0
 
   def parse_source(self, source_code : str) -> Tuple[Dict[int, str], Dict[Edge, str]]:
-    f = open("temp/t.c","w")
-    f.write(source_code)
-    f.close()
-    return self.parse_file("temp/t.c")
+    return self.parse_tree(parse_c(source_code))
 
   def parse_file(self, file_name : str) -> Tuple[Dict[int, str], Dict[Edge, str]]:
-    root = parse_file(file_name)
+    with open(file_name) as f:
+      return self.parse_tree(parse_c(f.read(), file_name))
+
+  def parse_tree(self, root : c_ast.FileAST) -> Tuple[Dict[int, str], Dict[Edge, str]]:
     # print(root)
     self.flow_edges.clear()
     self.flow_nodes.clear()
@@ -87,7 +88,6 @@ class Tracer(c_ast.NodeVisitor):
     self.creator.flow_nodes[line] = "If"
     ret: LineNumber = {"start" :line, "last" : []}
     self.creator.exit_stack.append({ "start" : line, "last" : [ (line, "True" ) ] })
-    global compound_depth
     self.creator.compound_depth += 1
     curr : LineNumber = self.visit(n.iftrue)
     ret["last"].extend( ([ (x[0],x[1] +"<br/> and end of if ({}) body".format(line)) if "End" in x[1] else (x[0], " End of if ({}) body".format(line)) for x in curr["last"]] ) )
@@ -106,7 +106,6 @@ class Tracer(c_ast.NodeVisitor):
     self.creator.flow_nodes[line] = "While"
     ret: LineNumber = {"start" :line, "last" : []}
     self.creator.exit_stack.append({ "start" : line, "last" : [ (line, "True" ) ] })
-    global compound_depth
     self.creator.compound_depth += 1
     curr : LineNumber = self.visit(n.stmt)
     ret["last"].extend( ([ (x[0],x[1] +"<br/> and end of while ({}) body".format(line)) if "End" in x[1] else (x[0], " End of while ({}) body".format(line)) for x in curr["last"]] ) )
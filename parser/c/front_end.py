@@ -0,0 +1,23 @@
+import threading
+from pycparser import c_ast, c_parser
+
+""" Building a pycparser parser loads its lexer and LALR tables, so each thread keeps one parser and reuses it for every
+    program. The tables are read from the lextab and yacctab modules generated when pycparser was installed, they are
+    never rebuilt while the program is running. """
+_local = threading.local()
+
+
+def get_parser() -> c_parser.CParser:
+    parser = getattr(_local, "parser", None)
+    if parser is None:
+        parser = c_parser.CParser(lex_optimize=True, yacc_optimize=True)
+        _local.parser = parser
+    return parser
+
+
+def parse_c(source_code: str, file_name: str = "<source>") -> c_ast.FileAST:
+    """ Parses C source code that has already been preprocessed, straight from the string """
+    return get_parser().parse(source_code, file_name)
+
+
+get_parser()
@@ -0,0 +1,52 @@
+from typing import Any, Callable, Dict, Tuple
+from parser.parser_types import Calculation
+import constants as c
+import parser.c.types as t
+
+""" Works out the explanation, calculation explanation, result and type of an operation from its operands """
+Apply = Callable[[Calculation, Calculation], Tuple[str, str, Any, str]]
+
+
+def arithmetic(explanation: str, calculation_explanation: str, function: Callable[[Any, Any], Any]) -> Apply:
+    def apply(l: Calculation, r: Calculation) -> Tuple[str, str, Any, str]:
+        return explanation, calculation_explanation, function(l.result, r.result), t.get_largest_type(l.type, r.type)
+    return apply
+
+
+def divide(l: Calculation, r: Calculation) -> Tuple[str, str, Any, str]:
+    """ Dividing two integers gives an integer """
+    if t.is_integer(l.type) and t.is_integer(r.type):
+        result = l.result // r.result
+    else:
+        result = l.result / r.result
+    return c.M_DIV, c.EXP_DIV, result, t.get_largest_type(l.type, r.type)
+
+
+def comparison(explanation: str, calculation_explanation: str, function: Callable[[Any, Any], bool], numbers: bool) -> Apply:
+    """ Comparisons give 1 or 0, those that order their operands only work on numbers """
+    def apply(l: Calculation, r: Calculation) -> Tuple[str, str, Any, str]:
+        if numbers and not (t.is_number(l.type) and t.is_number(r.type)):
+            raise Exception()
+        return explanation, calculation_explanation, 1 if function(l.result, r.result) else 0, t.INT
+    return apply
+
+
+""" The text written between the operands and how the operation is applied """
+BINARY_OPERATORS: Dict[str, Tuple[str, Apply]] = {
+    "+": (" + ", arithmetic(c.M_ADD, c.EXP_ADD, lambda a, b: a + b)),
+    "-": (" - ", arithmetic(c.M_SUB, c.EXP_SUB, lambda a, b: a - b)),
+    "*": (" * ", arithmetic(c.M_MUL, c.EXP_MULT, lambda a, b: a * b)),
+    "%": (" % ", arithmetic(c.M_MOD, c.EXP_MOD, lambda a, b: a % b)),
+    "/": (" / ", divide),
+    "==": (" == ", comparison(c.M_EQC, c.EXP_EQ, lambda a, b: a == b, False)),
+    "!=": (" != ", comparison(c.M_NEC, c.EXP_NEQ, lambda a, b: a != b, False)),
+    "<": (" < ", comparison(c.M_LTC, c.EXP_LT, lambda a, b: a < b, True)),
+    "<=": (" <= ", comparison(c.M_LTE, c.EXP_LTE, lambda a, b: a <= b, True)),
+    ">": (" > ", comparison(c.M_GTC, c.EXP_GT, lambda a, b: a > b, True)),
+    ">=": (" >= ", comparison(c.M_GTE, c.EXP_GTE, lambda a, b: a >= b, True)),
+    "&&": (" && ", comparison(c.M_AND, c.EXP_AND, lambda a, b: a != 0 and b != 0, False)),
+    "||": (" || ", comparison(c.M_OR, c.EXP_OR, lambda a, b: a != 0 or b != 0, False))
+}
+
+COMPARISONS = ("==", "!=", "<", "<=", ">", ">=")
+BOOLEAN_OPERATORS = ("&&", "||")
@@ -1,42 +1,53 @@
-from typing import List, Tuple, Dict, Any, Mapping
-from parser.generic_parser import Parser
+from typing import List, Tuple, Dict, Any, Iterator, Optional, Callable
+from parser.generic_parser import Parser, Site
 from parser.parser_types import Statement, Calculation, Memory
-from pycparser import c_ast, parse_file
+from parser.evaluation import Evaluator, Evaluate
+from pycparser import c_ast
+from parser.c.front_end import parse_c
+from parser.memory import TypedMemoryJournal
 import constants as c
-import json
+import sys
+import re
 import parser.c.types as t
 import parser.c.prepared_functions as p
-from icecream import ic
+import parser.c.operations as o
 
-top_level: bool = True
 
+def holds(result: Any) -> bool:
+    return result == 1
+
+
+def fails(result: Any) -> bool:
+    return result == 0
+
+
+class CTracer(Evaluator, c_ast.NodeVisitor):
+    """ Lowers C's syntax tree to the closures of the Evaluator. Declarations are still visited each time they run. """
 
-class CTracer(c_ast.NodeVisitor):
     def __init__(self, parser: "CParser") -> None:
-        super().__init__()
-        self.parser = parser
+        super().__init__(parser)
 
     def create_variable_declaration(self, node: c_ast.Decl) -> Tuple[Statement, Dict[str, str]]:
         line: str = str(node.coord.line)
-        calc: Calculation = {
-            "explanation": c.M_DEC,
-            "code": "",
-            "result": None,
-            "result_show": self.parser.get_result_string(None),
-            "type": "",
-            "subcalculations": [],
-            "calculation_explanation": c.EXP_VAR_DECL,
-            "fb_label": ""
-        }
-        dic: Statement = {
-            "variables_before": self.parser.get_var_now(),
-            "memory_before": self.parser.get_mem_now(),
-            "current_line": line,
-            "calculation": calc,
-            "memory_after": [],
-            "variables_after": {},
-            "next_line": ""
-        }
+        calc: Calculation = Calculation(
+            explanation=c.M_DEC,
+            code="",
+            result=None,
+            result_show=self.parser.get_result_string(None),
+            type="",
+            subcalculations=[],
+            calculation_explanation=c.EXP_VAR_DECL,
+            fb_label=""
+        )
+        dic: Statement = Statement(
+            variables_before=self.parser.get_var_now(),
+            memory_before=self.parser.get_mem_now(),
+            current_line=line,
+            calculation=calc,
+            memory_after=[],
+            variables_after={},
+            next_line=""
+        )
         type_decl = self.visit(node.type)
         dic["calculation"]["code"] = type_decl["type"] + " " + type_decl["name"]
         dic["calculation"]["type"] = type_decl["type"]
@@ -44,25 +55,25 @@ class CTracer(c_ast.NodeVisitor):
 
     def create_array_declaration(self, node) -> Tuple[Statement, Dict[str, str]]:
         line: str = str(node.coord.line)
-        calc: Calculation = {
-            "explanation": c.M_ARR_DEC,
-            "code": "",
-            "result": None,
-            "result_show": self.parser.get_result_string(None),
-            "type": "",
-            "subcalculations": [],
-            "calculation_explanation": c.EXP_ARR_DECL,
-            "fb_label": ""
-        }
-        dic: Statement = {
-            "variables_before": self.parser.get_var_now(),
-            "memory_before": self.parser.get_mem_now(),
-            "current_line": line,
-            "calculation": calc,
-            "memory_after": [],
-            "variables_after": {},
-            "next_line": ""
-        }
+        calc: Calculation = Calculation(
+            explanation=c.M_ARR_DEC,
+            code="",
+            result=None,
+            result_show=self.parser.get_result_string(None),
+            type="",
+            subcalculations=[],
+            calculation_explanation=c.EXP_ARR_DECL,
+            fb_label=""
+        )
+        dic: Statement = Statement(
+            variables_before=self.parser.get_var_now(),
+            memory_before=self.parser.get_mem_now(),
+            current_line=line,
+            calculation=calc,
+            memory_after=[],
+            variables_after={},
+            next_line=""
+        )
         type_decl = self.visit(node.type)
         # print(type_decl)
         calc["subcalculations"].append(type_decl['size'])
@@ -73,27 +84,27 @@ class CTracer(c_ast.NodeVisitor):
     def create_variable_declaration_initialisation(self, node) -> Tuple[Statement, Dict[str, str]]:
         interim, type_decl = self.create_variable_declaration(node)
         line: str = str(node.coord.line)
-        calc: Calculation = {
-            "explanation": c.M_VAR_INIT,
-            "code": "",
-            "result": None,
-            "result_show": self.parser.get_result_string(None),
-            "type": "",
-            "subcalculations": [],
-            "calculation_explanation": c.EXP_VAR_INIT,
-            "fb_label": ""
-        }
-        dic: Statement = {
-            "variables_before": self.parser.get_var_now(),
-            "memory_before": self.parser.get_mem_now(),
-            "current_line": line,
-            "calculation": calc,
-            "memory_after": [],
-            "variables_after": {},
-            "next_line": ""
-        }
+        calc: Calculation = Calculation(
+            explanation=c.M_VAR_INIT,
+            code="",
+            result=None,
+            result_show=self.parser.get_result_string(None),
+            type="",
+            subcalculations=[],
+            calculation_explanation=c.EXP_VAR_INIT,
+            fb_label=""
+        )
+        dic: Statement = Statement(
+            variables_before=self.parser.get_var_now(),
+            memory_before=self.parser.get_mem_now(),
+            current_line=line,
+            calculation=calc,
+            memory_after=[],
+            variables_after={},
+            next_line=""
+        )
         # type_decl = self.visit(node.type)
-        value = self.visit(node.init)
+        value = self.evaluate(node.init)
         calc["result"] = value["result"]
         calc["result_show"] = value["result_show"]
         calc["code"] = type_decl["type"] + " " + type_decl["name"] + " = " + value["result_show"]
@@ -106,26 +117,26 @@ class CTracer(c_ast.NodeVisitor):
     def create_array_declaration_initialisation(self, node) -> Tuple[Statement, Dict[str, str], Calculation]:
         interim, type_decl = self.create_array_declaration(node)
         line: str = str(node.coord.line)
-        calc: Calculation = {
-            "explanation": c.M_ARR_INIT,
-            "code": "",
-            "result": None,
-            "result_show": self.parser.get_result_string(None),
-            "type": "",
-            "subcalculations": [],
-            "calculation_explanation": c.EXP_ARR_INIT,
-            "fb_label": ""
-        }
-        dic: Statement = {
-            "variables_before": self.parser.get_var_now(),
-            "memory_before": self.parser.get_mem_now(),
-            "current_line": line,
-            "calculation": calc,
-            "memory_after": [],
-            "variables_after": {},
-            "next_line": ""
-        }
-        calculation = self.visit(node.init)
+        calc: Calculation = Calculation(
+            explanation=c.M_ARR_INIT,
+            code="",
+            result=None,
+            result_show=self.parser.get_result_string(None),
+            type="",
+            subcalculations=[],
+            calculation_explanation=c.EXP_ARR_INIT,
+            fb_label=""
+        )
+        dic: Statement = Statement(
+            variables_before=self.parser.get_var_now(),
+            memory_before=self.parser.get_mem_now(),
+            current_line=line,
+            calculation=calc,
+            memory_after=[],
+            variables_after={},
+            next_line=""
+        )
+        calculation = self.evaluate(node.init)
         calc["result"] = calculation["result"]
         calc["result_show"] = calculation["result_show"]
         calc["code"] = type_decl["type"] + " " + type_decl["name"] + "[" + type_decl["size"]["result_show"] + "]" + " = " + calculation["code"]
@@ -135,19 +146,19 @@ class CTracer(c_ast.NodeVisitor):
 
     def visit_InitList(self, node: c_ast.InitList) -> Calculation:
         line: str = str(node.coord.line)
-        calc: Calculation = {
-            "explanation": c.M_ARR_CONST,
-            "code": "",
-            "result": None,
-            "result_show": self.parser.get_result_string(None),
-            "type": "",
-            "subcalculations": [],
-            "calculation_explanation": c.EXP_ARR_CONST,
-            "fb_label": ""
-        }
+        calc: Calculation = Calculation(
+            explanation=c.M_ARR_CONST,
+            code="",
+            result=None,
+            result_show=self.parser.get_result_string(None),
+            type="",
+            subcalculations=[],
+            calculation_explanation=c.EXP_ARR_CONST,
+            fb_label=""
+        )
         calcs: List[Calculation] = []
         for e in node.exprs:
-            calcs.append(self.visit(e))
+            calcs.append(self.evaluate(e))
 
         calc["code"] = "{ " + ", ".join([e['result_show'] for e in calcs]) + " }"
         # print(calc["code"])
@@ -160,25 +171,14 @@ class CTracer(c_ast.NodeVisitor):
         print("Generic Visitor, someone needs to implement specific visiting functions for", type(node).__name__, node)
         c_ast.NodeVisitor.generic_visit(self, node)
 
-    def visit_FileAST(self, node: c_ast.FileAST) -> List[Statement]:
-        # print(node)
-        execution_steps: List[Statement] = []
+    def trace_FileAST(self, node: c_ast.FileAST) -> Iterator[Statement]:
         for n in node.ext:
-            t = self.visit(n)
-            if isinstance(t, List):
-                l = Parser.flatten(t)
-                execution_steps.extend(l)
-            else:
-                execution_steps.append(t)
-        return execution_steps
+            yield from self.trace(n)
 
-    def visit_FuncDef(self, node: c_ast.FuncDef) -> List[Statement]:
-        l: List[Statement] = self.visit(node.body)
-        return l
+    def trace_FuncDef(self, node: c_ast.FuncDef) -> Iterator[Statement]:
+        yield from self.trace(node.body)
 
     def visit_Decl(self, node: c_ast.Decl) -> Statement:
-        global top_level
-        top_level = False
         dic: Statement
         if node.init is None:
             if isinstance(node.type, c_ast.TypeDecl):
@@ -213,7 +213,7 @@ class CTracer(c_ast.NodeVisitor):
     def visit_ArrayDecl(self, node: c_ast.ArrayDecl):
         tp: str = self.visit(node.type)
         # print(node.dim)
-        size = self.visit(node.dim)
+        size = self.evaluate(node.dim)
         tp["size"] = size
         return tp
 
@@ -224,81 +224,31 @@ class CTracer(c_ast.NodeVisitor):
         self.ignore()
         return node.names[0]
 
-    def visit_Compound(self, node: c_ast.Compound) -> List[Statement]:
-        execution_steps: List[Statement] = []
+    def trace_block(self, node: Optional[c_ast.Node]) -> Iterator[Statement]:
+        """ Traces each of the children of node, if there is one """
+        if node is not None:
+            for n in node:
+                yield from self.trace(n)
+
+    def trace_Compound(self, node: c_ast.Compound) -> Iterator[Statement]:
         for n in node.block_items:
-            global top_level
-            top_level = True
-            t = self.visit(n)
-            if isinstance(t, List):
-                l = Parser.flatten(t)
-                execution_steps.extend(l)
-            else:
-                execution_steps.append(t)
-        return execution_steps
+            yield from self.trace(n)
 
-    def visit_Assignment(self, node: c_ast.Assignment) -> Statement:
-        global top_level
-        top_level = False
-        line: str = str(node.coord.line)
-        calc: Calculation = {
-            "explanation": "Assignment",
-            "code": "",
-            "result": "",
-            "result_show": "",
-            "type": "",
-            "subcalculations": [],
-            "calculation_explanation": c.EXP_ASSIGN,
-            "fb_label": ""
-        }
-        dic: Statement = {
-            "variables_before": self.parser.get_var_now(),
-            "memory_before": self.parser.get_mem_now(),
-            "current_line": str(line),
-            "calculation": calc,
-            "memory_after": [],
-            "variables_after": {},
-            "next_line": ""
-        }
-        name: Calculation = self.visit(node.lvalue)
-        expression: Calculation = self.visit(node.rvalue)
-        if expression['type'] == "string":
+    def compile_Assignment(self, node: c_ast.Assignment) -> Callable[[], Statement]:
+        return self.assignment(str(node.coord.line), self.compile(node.lvalue), self.compile(node.rvalue), self.store)
+
+    def store(self, name: Calculation, expression: Calculation) -> None:
+        if expression.type == "string":
             raise ValueError("tried to assign a string")
-        if '[' in name["code"]:
-            pass
-            dic["calculation"]["code"] = name["code"] + " = " + self.parser.get_result_string(expression["result"])
-            dic["calculation"]["result"] = expression["result"]
-            dic["calculation"]["result_show"] = self.parser.get_result_string(expression["result"])
-            dic["calculation"]["type"] = expression["type"]
-            dic["calculation"]["subcalculations"].append(expression)
-            self.parser.assign_value_array(name["code"][:name["code"].index('[')], expression["result"], name["subcalculations"][0]["result"])
+        if '[' in name.code:
+            self.parser.assign_value_array(name.code[:name.code.index('[')], expression.result, name.subcalculations[0].result)
         else:
-            dic["calculation"]["code"] = name["code"] + " = " + self.parser.get_result_string(expression["result"])
-            dic["calculation"]["result"] = expression["result"]
-            dic["calculation"]["result_show"] = self.parser.get_result_string(expression["result"])
-            dic["calculation"]["type"] = expression["type"]
-            dic["calculation"]["subcalculations"].append(expression)
-            self.parser.assign_value(name["code"], expression["result"])
+            self.parser.assign_value(name.code, expression.result)
 
-        dic["variables_after"] = self.parser.get_var_now()
-        dic["memory_after"] = self.parser.get_mem_now()
-        return dic
+    def compile_ID(self, node: c_ast.ID) -> Evaluate:
+        return self.load(node.name)
 
-    def visit_ID(self, node: c_ast.ID) -> Calculation:
-        self.ignore()
-        t: Memory = self.parser.load_value(node.name)
-        return {
-            "explanation": c.M_VAR,
-            "code": node.name,
-            "result": t["value"],
-            "result_show": t["value_show"],
-            "type": t["type"],
-            "subcalculations": [],
-            "calculation_explanation": c.EXP_LOAD,
-            "fb_label": ""
-        }
-
-    def visit_Constant(self, node: c_ast.Constant) -> Calculation:
+    def compile_Constant(self, node: c_ast.Constant) -> Evaluate:
         value: Any
         if node.type in ("int", "short", "long"):
             value = int(node.value)
@@ -306,287 +256,150 @@ class CTracer(c_ast.NodeVisitor):
             value = float(node.value)
         elif node.type == 'string':
             value = node.value[1:-1]
-
-        self.ignore()
-        return {
-            "explanation": c.M_CONST,
-            "code": self.parser.get_result_string(value),
-            "result": value,
-            "result_show": self.parser.get_result_string(value),
-            "type": node.type,
-            "subcalculations": [],
-            "calculation_explanation": c.EXP_CON,
-            "fb_label": ""
-        }
-
-    def visit_BinaryOp(self, node: c_ast.BinaryOp):
-        dic: Calculation = {
-            "explanation": "",
-            "code": "",
-            "result": "",
-            "result_show": "",
-            "type": "",
-            "subcalculations": [],
-            "calculation_explanation": "",
-            "fb_label": ""
-        }
-        l: Calculation = self.visit(node.left)
-        dic["subcalculations"].append(l)
-        r: Calculation = self.visit(node.right)
-        dic["subcalculations"].append(r)
-
-        op: str = self.parser.get_operation(dic, l, r, node.op)
-        dic["result_show"] = self.parser.get_result_string(dic["result"])
-        dic["code"] = self.parser.get_result_string(l["result"]) + op + self.parser.get_result_string(r["result"])
-        return dic
+        else:
+            return self.unsupported(node)
+        return self.constant(value, self.parser.get_result_string(value), node.type)
+
+    def compile_BinaryOp(self, node: c_ast.BinaryOp) -> Evaluate:
+        if node.op not in o.BINARY_OPERATORS:
+            def fail() -> Calculation:
+                raise ValueError("unsuported operation " + node.op)
+            return fail
+        pad_op, apply = o.BINARY_OPERATORS[node.op]
+        show = self.parser.get_result_string
+        return self.binary(self.compile(node.left), self.compile(node.right), apply, lambda l, r: show(l.result) + pad_op + show(r.result))
 
     def visit_UnaryOp(self, node: c_ast.UnaryOp):
         # print(node)
-        dic: Calculation = {
-            "explanation": "",
-            "code": "",
-            "result": "",
-            "result_show": "",
-            "type": "",
-            "subcalculations": [],
-            "calculation_explanation": "",
-            "fb_label": ""
-        }
-        operand: Calculation = self.visit(node.expr)
+        dic: Calculation = Calculation(
+            explanation="",
+            code="",
+            result="",
+            result_show="",
+            type="",
+            subcalculations=[],
+            calculation_explanation="",
+            fb_label=""
+        )
+        operand: Calculation = self.evaluate(node.expr)
         op: str = self.parser.get_unary_operation(dic, operand, node.op)
-        # print(operand)
-        # print(dic)
-        # print(op)
-        # l: Calculation = self.visit(node.left)
-        # dic["subcalculations"].append(l)
-        # r: Calculation = self.visit(node.right)
-        # dic["subcalculations"].append(r)
-
-        # op: str = get_operation(dic, l, r, node.op)
-        # dic["result_show"] = get_result_string(dic["result"])
-        # dic["code"] = get_result_string(l["result"]) + op + get_result_string(r["result"])
         return dic
 
-    def visit_If(self, node: c_ast.If):
-        line: str = str(node.coord.line)
-        expressions: List[Statement] = []
-        calc: Calculation = {
-            "explanation": c.M_IF,
-            "code": "",
-            "result": "None",
-            "result_show": "None",
-            "type": "None",
-            "subcalculations": [],
-            "calculation_explanation": c.EXP_IF,
-            "fb_label": ""
-        }
-        dic: Statement = {
-            "calculation": calc,
-            "variables_before": self.parser.get_var_now(),
-            "memory_before": self.parser.get_mem_now(),
-            "current_line": line,
-            "next_line": "",
-            "variables_after": {},
-            "memory_after": []
-        }
-        test: Calculation = self.visit(node.cond)
-        dic["calculation"]["subcalculations"].append(test)
-        dic["calculation"]["code"] = "if (" + self.parser.get_result_string(test["result"]) + ")"
-        dic["variables_after"] = self.parser.get_var_now()
-        dic["memory_after"] = self.parser.get_mem_now()
-
-        expressions.append(dic)
-        if test["result"] == 1:
-            for b in node.iftrue:
-                expressions.append(self.visit(b))
-        if test["result"] == 0 and node.iffalse:
-            for b in node.iffalse:
-                expressions.append(self.visit(b))
-        return expressions
-
-    def visit_FuncCall(self, node: c_ast.FuncCall):
-        id: c_ast.ID = node.name
-        function_name: str = id.name
-        if top_level:
-            func_calc: Calculation = {"explanation": c.M_FUN, "code": "", "result": "", "result_show": "", "type": "", "subcalculations": self.visit(node.args), "calculation_explanation": c.EXP_FUNC, "fb_label": ""}
-            arg_results = [self.parser.get_result_string(a["result"]) for a in func_calc["subcalculations"]]
-            if "scanf" == function_name:
-                cde = function_name + "(" + ", ".join(arg_results) + ")"
-                func_calc["code"] = cde
-                cde = function_name + "( p_a_r, " + ", ".join(arg_results) + ")"
-            else:
-                cde = function_name + "(" + ", ".join(arg_results) + ")"
-                func_calc["code"] = cde
-
-            dic: Statement = {
-                "variables_before": self.parser.get_var_now(),
-                "memory_before": self.parser.get_mem_now(),
-                "current_line": str(node.coord.line),
-                "calculation": func_calc,
-                "variables_after": self.parser.get_var_now(),
-                "memory_after": self.parser.get_mem_now(),
-                "next_line": ""
-            }
-            run_me = "temp, typ = p.prepared_" + cde
-            loc: Mapping[str, Any] = {"p_a_r": self.parser}
-            # print(run_me)
-            exec(run_me, globals(), loc)
-            func_calc["result"] = loc['temp']
-            dic["variables_after"] = self.parser.get_var_now()
-            dic["memory_after"] = self.parser.get_mem_now()
-
-            func_calc["result_show"] = self.parser.get_result_string(func_calc["result"])
-            func_calc["type"] = loc['typ']
-            # print(get_var_now())
-            return dic
-        else:
-            func_calc: Calculation = {"explanation": c.M_FUN, "code": "", "result": "", "result_show": "", "type": "",
-                                      "subcalculations": self.visit(node.args), "calculation_explanation": c.EXP_FUNC,
-                                      "fb_label": ""}
-            arg_results = [self.parser.get_result_string(a["result"]) for a in func_calc["subcalculations"]]
-            cde = function_name + "(" + ", ".join(arg_results) + ")"
-            func_calc["code"] = cde
-            run_me = "temp, typ = p.prepared_" + cde
-            loc: Mapping[str, Any] = {}
-            exec(run_me, globals(), loc)
-            func_calc["result"] = loc['temp']
-            func_calc["result_show"] = self.parser.get_result_string(func_calc["result"])
-            func_calc["type"] = loc['typ']
-
-            return func_calc
-
-    def visit_ExprList(self, node: c_ast.ExprList) -> List[Calculation]:
-        global top_level
-        top_level = False
-        argument_list: List[Calculation] = []
-        for a in node.exprs:
-            argument_list.append(self.visit(a))
-        return argument_list
-    
-    def get_while_condition(self, condition: Any) -> Tuple[Statement, Calculation]:
-        line: str = str(condition.coord.line)
-        calc : Calculation = {
-            "explanation"    : c.M_WHILE,
-            "code"      : "",
-            "result"     : "None",
-            "result_show": "None",
-            "type"       : "None",
-            "subcalculations"   : [],
-            "calculation_explanation" : c.EXP_WHILE,
-            "fb_label" : ""
-        }
-        dic : Statement = {
-            "calculation" : calc,
-            "variables_before" : self.parser.get_var_now(),
-            "memory_before" : self.parser.get_mem_now(),
-            "current_line" : line,
-            "variables_after" : {},
-            "memory_after" : [],
-            "next_line" : ""
-        }
-        test : Calculation = self.visit(condition)
-        dic["calculation"]["subcalculations"].append(test)
-        dic["calculation"]["code"] = "while ("+ self.parser.get_result_string(test["result"]) + ")"
-        dic["variables_after"] = self.parser.get_var_now()
-        dic["memory_after"] = self.parser.get_mem_now()
-        return dic, test
-
-    def visit_While(self, n : c_ast.While) -> List[Statement]:
-        expressions : List[Statement] = []
-        test_state, test_cond = self.get_while_condition(n.cond)
-        expressions.append(test_state)
-        while test_cond["result"] == 1:
-            t = self.visit(n.stmt)
-            if isinstance(t, List):
-                l = Parser.flatten(t)
-                expressions.extend(l)
-            else:
-                expressions.append(t)
-            test_state, test_cond = self.get_while_condition(n.cond)
-            expressions.append(test_state)
-        return expressions
-
-    def visit_ArrayRef(self, n : c_ast.ArrayRef) -> Calculation:
+    def trace_If(self, node: c_ast.If) -> Iterator[Statement]:
+        condition = self.condition(str(node.coord.line), self.compile(node.cond), c.M_IF, c.EXP_IF, "if (", ")")
+        return self.trace_branch(condition, lambda: self.trace_block(node.iftrue), lambda: self.trace_block(node.iffalse), holds, fails)
+
+    def trace_FuncCall(self, node: c_ast.FuncCall) -> Iterator[Statement]:
+        """ A call on its own is a statement, anywhere else it is part of an expression """
+        yield self.expression(str(node.coord.line), self.compile(node))()
+
+    def compile_FuncCall(self, node: c_ast.FuncCall) -> Evaluate:
+        function_name: str = node.name.name
+        arguments = [self.compile(a) for a in node.args.exprs] if node.args is not None else []
+        return self.call(function_name, arguments, lambda values: self.call_function(function_name, values))
+
+    def call_function(self, function_name: str, values: List[Any]) -> Tuple[Any, str]:
+        """ Runs the prepared version of a library function on the results of its arguments, returning the result
+            and its type. Functions that use the input, output or memory of the trace, like scanf, are also given the
+        parser. """
+        function = p.get_function(function_name)
+        if function_name in p.parser_functions:
+            return function(self.parser, *values)
+        return function(*values)
+
+    def trace_While(self, n : c_ast.While) -> Iterator[Statement]:
+        condition = self.condition(str(n.cond.coord.line), self.compile(n.cond), c.M_WHILE, c.EXP_WHILE, "while (", ")")
+        return self.trace_loop(n, str(n.coord.line), condition, lambda: self.trace(n.stmt), holds)
+
+    def compile_ArrayRef(self, n : c_ast.ArrayRef) -> Evaluate:
         array_name = n.name.name
-        num: Calculation = self.visit(n.subscript)
-        # print(array_name, num["result"])
-        t: Memory = self.parser.load_value_from_array(array_name, num["result"])
-        # print(t)
-        ans =  {
-            "explanation": c.M_LOAD_ARRAY,
-            "code": array_name+"[" + num["result_show"] + "]",
-            "result": t["value"],
-            "result_show": t["value_show"],
-            "type": t["type"],
-            "subcalculations": [ num ],
-            "calculation_explanation": c.EXP_LOAD_ARRAY,
-            "fb_label": ""
-        }
-        # print(array_name, num, ans, n)
-        return ans
-        
+        subscript = self.compile(n.subscript)
+        load_value_from_array = self.parser.load_value_from_array
+
+        def load_item() -> Calculation:
+            num: Calculation = subscript()
+            t: Memory = load_value_from_array(array_name, num.result)
+            return Calculation.of(c.M_LOAD_ARRAY, array_name + "[" + num.result_show + "]", t["value"], t.get("value_show"), t["type"], [num], c.EXP_LOAD_ARRAY)
+        return load_item
 
 
 class CParser(Parser):
+    language = "c"
+
     def __init__(self):
         super().__init__(t, p)
 
-    def parse_source(self, source_code: str) -> Tuple[List[Statement], List[str]]:
-        f = open("temp/t.c", "w")
-        f.write(source_code)
-        f.close()
-        return self.parse_file("temp/t.c")
+    def parse_tree(self, source_code: str) -> c_ast.FileAST:
+        return parse_c(source_code)
 
-    def parse_file(self, file_name: str) -> Tuple[List[Statement], List[str]]:
-        root = parse_file(file_name)
+    def trace_tree(self, root: c_ast.FileAST) -> Iterator[Statement]:
         # print(root)
-        visitor = CTracer(CParser())
-        execution_steps: List[Statement] = visitor.visit(root)
-        self.memory.clear()
-        self.variables.clear()
-        execution_steps[0]["why_line"] ="This is the start of the program"
-        for i, e in enumerate(execution_steps):
-            if i < len(execution_steps) - 1:
-                e["next_line"] = execution_steps[i + 1]["current_line"]
-                if e["calculation"]["explanation"] in (c.M_WHILE, c.M_IF):
-                    res = e["calculation"]["subcalculations"][0]["result"]
-                    if res == 1:
-                        res = True
-                    elif res == 0:
-                        res = False
-                    execution_steps[i + 1]["why_line"] = "This line is executed because the condition of the previous statement was "+ str(res)
-                else:
-                    execution_steps[i + 1]["why_line"] = "This line was executed because it was next in the sequence"
-        execution_steps[-1]["next_line"] = "Finished"
-        # print(json.dumps([e for e in execution_steps if e["calculation"]["explanation"] in (c.M_WHILE, c.M_IF)], indent=2))
-        line_numbers = ['0'] + [e["current_line"] for e in execution_steps] + ['-1']
-        return execution_steps, line_numbers
+        visitor = CTracer(self)
+        return visitor.trace(root)
+
+    def find_placeholders(self, tree: c_ast.FileAST, names: List[str]) -> Optional[List[List[Site]]]:
+        positions = {name: i for i, name in enumerate(names)}
+        sites: List[List[Site]] = [[] for _ in names]
+        found = 0
+        uses = 0
+        nodes: List[c_ast.Node] = [tree]
+        for node in nodes:
+            for attr in node.attr_names:
+                uses += sum(str(getattr(node, attr)).count(name) for name in names)
+            for child_name, child in node.children():
+                nodes.append(child)
+                if isinstance(child, c_ast.ID) and child.name in positions:
+                    field, _, index = child_name.rstrip("]").partition("[")
+                    sites[positions[child.name]].append((node, field, int(index) if index else None, child))
+                    found += 1
+        if uses != found:
+            return None
+        return sites
+
+    def parameter_node(self, text: str, site: Site) -> Optional[c_ast.Node]:
+        """ Only the kinds of constant the tracer understands are used, with the same types pycparser would give them """
+        parent, field, _, placeholder = site
+        text = text.strip()
+        node: c_ast.Node
+        if re.fullmatch(r"\d+", text):
+            node = c_ast.Constant("int", text, coord=placeholder.coord)
+        elif re.fullmatch(r"(\d+\.\d*|\.\d+)([eE][-+]?\d+)?", text):
+            node = c_ast.Constant("double", text, coord=placeholder.coord)
+        elif re.fullmatch(r'"([^"\\]|\\.)*"', text):
+            node = c_ast.Constant("string", text, coord=placeholder.coord)
+        elif re.fullmatch(r"[A-Za-z_]\w*", text):
+            node = c_ast.ID(text, coord=placeholder.coord)
+        elif re.fullmatch(r"-\d+", text):
+            if isinstance(parent, (c_ast.ArrayRef, c_ast.FuncCall, c_ast.StructRef)) and field == "name":
+                return None
+            node = c_ast.UnaryOp("-", c_ast.Constant("int", text[1:], coord=placeholder.coord), coord=placeholder.coord)
+        else:
+            return None
+        return node
+
+    def new_journal(self) -> TypedMemoryJournal:
+        return TypedMemoryJournal(t.array_typecodes)
 
     def add_variable(self, name: str, var_type: str) -> int:
         add = len(self.memory)
-        self.memory.append({
-            "address": add,
-            "type": var_type,
-            "value": "?",
-            "value_show": "?"
-        })
-        self.variables[name] = (var_type, add, 1)
+        self.declare_memory(add, var_type, 1, "?", "?")
+        self.set_variable(name, (var_type, add, 1))
 
     def add_array_variable(self, name: str, var_type: str, size: int) -> int:
         add = len(self.memory)
-        for i in range(size):
-            self.memory.append({
-                "address": add + i,
-                "type": var_type,
-                "value": 0,
-                "value_show": self.get_result_string(0)
-            })
-        self.variables[name] = (var_type + "[]", add, size)
+        self.declare_memory(add, var_type, size, 0, None)
+        self.set_variable(name, (var_type + "[]", add, size))
+
+    def declare_memory(self, start: int, var_type: str, size: int, value: Any, value_show: Optional[str]) -> None:
+        self.journal.declare(start, var_type, size, value, value_show)
+        self.budget.count_bytes(sys.getsizeof(self.memory.buffers[-1]))
+        for address in range(start, start + size):
+            self.budget.hash_cell(address, var_type, value)
 
     def update_memory(self, address: int, value: Any) -> None:
-        val = self.memory[address]
-        val["value"] = value
-        val["value_show"] = self.get_result_string(value)
+        self.journal.store(address, value)
+        self.budget.count_bytes(sys.getsizeof(self.journal.writes[-1]) + sys.getsizeof(value))
+        self.budget.hash_cell(address, self.memory.type_at(address), value)
 
     def assign_value(self, name: str, value: Any) -> None:
         # print("Assigning value", value, "to name", name)
@@ -604,51 +417,6 @@ class CParser(Parser):
         else:
             raise ValueError("Variable does not exist in memory")
 
-    @staticmethod
-    def get_operation(dic: Calculation, left: Calculation, right: Calculation, op: str) -> str:
-        pad_op: str
-        if op == "+":
-            pad_op = " + "
-            dic["explanation"] = c.M_ADD
-            dic['calculation_explanation'] = c.EXP_ADD
-            dic['type'] = t.get_largest_type(left["type"], right["type"])
-            dic["result"] = left["result"] + right["result"]
-        elif op == '-':
-            pad_op = " - "
-            dic["explanation"] = c.M_SUB
-            dic["result"] = left["result"] - right["result"]
-            dic['calculation_explanation'] = c.EXP_SUB
-            dic['type'] = t.get_largest_type(left["type"], right["type"])
-        elif op == '*':
-            pad_op = " * "
-            dic["explanation"] = c.M_MUL
-            dic['calculation_explanation'] = c.EXP_MULT
-            dic["result"] = left["result"] * right["result"]
-            dic['type'] = t.get_largest_type(left["type"], right["type"])
-        elif op == '%':
-            pad_op = " % "
-            dic["explanation"] = c.M_MOD
-            dic['calculation_explanation'] = c.EXP_MOD
-            dic["result"] = left["result"] % right["result"]
-            dic['type'] = t.get_largest_type(left["type"], right["type"])
-        elif op == '/':
-            pad_op = " / "
-            dic["explanation"] = c.M_DIV
-            dic['calculation_explanation'] = c.EXP_DIV
-            if t.is_integer(left['type']) and t.is_integer(right['type']):
-                dic["result"] = left["result"] // right["result"]
-            else:
-                dic["result"] = left["result"] / right["result"]
-            dic['type'] = t.get_largest_type(left["type"], right["type"])
-        else:
-            if op in ("<", ">", "!=", "==", ">=", "<="):
-                return CParser.get_comparision(dic, left, right, op)
-            if op in ("||", "&&"):
-                return CParser.get_boolean_operation(dic, left, right, op)
-
-            raise ValueError("unsuported operation " + op)
-        return pad_op
-
     def get_unary_operation(self, dic: Calculation, operand: Calculation, op: str) -> str:
         opp: str
         if op == "&":
@@ -670,76 +438,6 @@ class CParser(Parser):
             dic['calculation_explanation'] = c.EXP_NOT
         return opp
 
-    @staticmethod
-    def get_comparision(dic: Calculation, l: Calculation, r: Calculation, op: str) -> str:
-        pad_op: str
-        if op == "==":
-            pad_op = " == "
-            dic["explanation"] = c.M_EQC
-            dic['calculation_explanation'] = c.EXP_EQ
-            dic['type'] = t.INT
-            dic["result"] = 1 if l["result"] == r["result"] else 0
-        elif op == '!=':
-            pad_op = " != "
-            dic["explanation"] = c.M_NEC
-            dic["result"] = 1 if l["result"] != r["result"] else 0
-            dic['type'] = t.INT
-            dic['calculation_explanation'] = c.EXP_NEQ
-        elif op == '<':
-            pad_op = " < "
-            dic["explanation"] = c.M_LTC
-            if not (t.is_number(l["type"]) and t.is_number(r["type"])):
-                raise Exception()
-            dic["result"] = 1 if l["result"] < r["result"] else 0
-            dic['type'] = t.INT
-            dic['calculation_explanation'] = c.EXP_LT
-        elif op == '<=':
-            pad_op = " <= "
-            dic["explanation"] = c.M_LTE
-            if not (t.is_number(l["type"]) and t.is_number(r["type"])):
-                raise Exception()
-            dic["result"] = 1 if l["result"] <= r["result"] else 0
-            dic['type'] = t.INT
-            dic['calculation_explanation'] = c.EXP_LTE
-        elif op == '>':
-            pad_op = " > "
-            dic["explanation"] = c.M_GTC
-            if not (t.is_number(l["type"]) and t.is_number(r["type"])):
-                raise Exception()
-            dic["result"] = 1 if l["result"] > r["result"] else 0
-            dic['type'] = t.INT
-            dic['calculation_explanation'] = c.EXP_GT
-        elif op == '>=':
-            pad_op = " >= "
-            dic["explanation"] = c.M_GTE
-            if not (t.is_number(l["type"]) and t.is_number(r["type"])):
-                raise Exception()
-            dic["result"] = 1 if l["result"] >= r["result"] else 0
-            dic['type'] = t.INT
-            dic['calculation_explanation'] = c.EXP_GTE
-        else:
-            raise Exception
-        return pad_op
-
-    @staticmethod
-    def get_boolean_operation(dic: Calculation, l: Calculation, r: Calculation, op: str) -> str:
-        pad_op: str
-        if op == "&&":
-            pad_op = " && "
-            dic["explanation"] = c.M_AND
-            dic["result"] = 1 if l["result"] != 0 and r["result"] != 0 else 0
-            dic["code"] = l["result_show"] + " && " + r["result_show"]
-            dic['type'] = t.INT
-            dic['calculation_explanation'] = c.EXP_AND
-        elif op == "||":
-            pad_op = " || "
-            dic["explanation"] = c.M_OR
-            dic["result"] = 1 if l["result"] != 0 or r["result"] != 0 else 0
-            dic["code"] = l["result_show"] + " !! " + r["result_show"]
-            dic['type'] = t.INT
-            dic['calculation_explanation'] = c.EXP_OR
-        return pad_op
-
 
 if __name__ == "__main__":
     cp = CParser()
@@ -748,4 +446,4 @@ if __name__ == "__main__":
     print(code)
     cp.set_input([])
     x = cp.parse_source(code)
-    print(json.dumps(x[0][2]["calculation"], indent=2))
+    print(json.dumps(x[0][2]["calculation"], indent=2, default=dict))
@@ -1,35 +1,45 @@
-from typing import Any, List
+from typing import Any, List, Dict, Callable, Set
 from parser.parser_types import Variables, Memory
 from parser.generic_parser import Parser
 import parser.c.scanf as scanf
 from icecream import ic
 
-current_input: str
 
+def unescape(value: Any) -> Any:
+    """ String constants keep the escape sequences written in the code, e.g. \\n, these are turned into the characters
+        they stand for before the string is used """
+    if isinstance(value, str):
+        return value.encode("latin-1", "backslashreplace").decode("unicode_escape")
+    return value
 
-def set_input(strs: List[str])-> None: 
-    global current_input
-    current_input = "\n".join(strs)
-
-f = open("temp_output.txt", "w")
-
-def prepared_printf(fs: str, *argv) -> int:
-    s = fs % (argv)
+def prepared_printf(parser: Parser, fs: str, *argv) -> int:
+    s = unescape(fs) % tuple(unescape(a) for a in argv)
+    parser.io.write(s)
     return len(s), "int"
 
 def prepared_scanf(parser: Parser,fs:str, *argv) -> int:
-    global current_input
-    ans = scanf.scanf(fs, current_input)
-    current_input = ans[-1]
+    ans = scanf.scanf_at(unescape(fs), parser.io.text, parser.io.position)
+    parser.io.advance(ans[-1])
     ans = ans[:-1]
     num = len(ans)
     if len(ans) == len(argv):
         for i in range(len(ans)):
             if isinstance (ans[i], List):
                 for a in range(argv[i], argv[i]+len(ans[i])):
-                    parser.memory[a]["value"] = ans[i][a]
-                    parser.memory[a]["value_show"] = parser.get_result_string(ans[i][a])
+                    parser.update_memory(a, ans[i][a - argv[i]])
             else:
-                parser.memory[argv[i]]["value"] = ans[i]
-                parser.memory[argv[i]]["value_show"] = parser.get_result_string(ans[i])
+                parser.update_memory(argv[i], ans[i])
     return num, "int"
+
+functions: Dict[str, Callable[..., Any]] = {
+    "printf": prepared_printf,
+    "scanf": prepared_scanf
+}
+
+""" These functions use the input, output or memory of the trace, so they are given the parser before their arguments """
+parser_functions: Set[str] = {"printf", "scanf"}
+
+def get_function(name: str) -> Callable[..., Any]:
+    if name not in functions:
+        raise Exception("This function is not supported " + name)
+    return functions[name]
@@ -25,7 +25,7 @@ from functools import lru_cache
 
 __version__ = '1.5.2'
 
-__all__ = ["scanf", 'extractdata', 'scanf_translate', 'scanf_compile']
+__all__ = ["scanf", "scanf_at", 'extractdata', 'scanf_translate', 'scanf_compile']
 
 
 DEBUG = False
@@ -105,6 +105,18 @@ def scanf(format, s=None, collapseWhitespace=True):
         return tuple([casts[i](groups[i]) for i in range(len(groups))]) + (s[found.span()[1]:],)
 
 
+def scanf_at(format, s, pos=0, collapseWhitespace=True):
+    """
+    The same as scanf, but starts reading s at pos and ends with the position after the match instead of the rest
+    of s, so reading a long input a piece at a time does not copy it each time.
+    """
+    format_re, casts = scanf_compile(format, collapseWhitespace)
+    found = format_re.search(s, pos)
+    if found:
+        groups = found.groups()
+        return tuple([casts[i](groups[i]) for i in range(len(groups))]) + (found.end(),)
+
+
 def extractdata(pattern, text=None, filepath=None):
     """
     Read through an entire file or body of text one line at a time. Parse each line that matches the supplied
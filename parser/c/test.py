@@ -1,6 +1,7 @@
 from parser.c.flowchart import CFlowCreator
 from imagecreator.c_generator import CImageGenerator
 from parser.c.parser import CParser
+from parser.compilation import CompilationUnit
 import json
 
 if __name__ == "__main__":
@@ -23,5 +24,5 @@ if __name__ == "__main__":
     img4 = gen.get_ast_animation(code_list[1])
     print(img4)
     #
-    img5 = gen.get_all_animation(code_list, source)
+    img5 = gen.get_all_animation(code_list, CompilationUnit(cp, source))
     print(img5)
\ No newline at end of file
@@ -15,6 +15,9 @@ BOOLEAN = "int"
 
 types: Set[str] = {INT, CHAR, SHORT, LONG, FLOAT, STRING}
 
+""" The array type codes the memory of each type is stored in, doubles use an array only once every value is a float """
+array_typecodes = {CHAR: "B", SHORT: "q", INT: "q", LONG: "q", FLOAT: "d"}
+
 
 def getWrongTypes(ans: str) -> Set[str]:
     return types - set((ans,))
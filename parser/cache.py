@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, List, Tuple, Optional
+from parser.parser_types import Statement
+from parser.trace_file import TracedProgram, TraceFileError, TraceReader, TraceWriter
+
+Trace = Tuple[List[Statement], List[str]]
+
+
+class TraceCache(object):
+    """ Remembers the traces of programs that have already been run, so that building a quiz again with different
+        options does not trace the program again. Traces are kept in the trace file format, which means every hit
+        hands out a fresh copy that the builders are free to change, and a file someone else put in the directory can
+        at worst give a wrong trace, it can never run code the way loading a pickle can. Recently used traces are
+        kept in memory, and all of them are written to a directory that can be shared by several processes. Both
+        tiers throw away the least recently used traces once they grow past their size limit. The cache can be shared by the threads of a web server. """
+
+    def __init__(self, directory: Optional[str] = None, memory_bytes: int = 64 * 1024 * 1024, disk_bytes: int = 512 * 1024 * 1024) -> None:
+        super().__init__()
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.traces: "OrderedDict[str, bytes]" = OrderedDict()
+        self.size: int = 0
+        self.lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(language: str, version: int, source_code: str, input_lines: List[str], options: Optional[List[Any]] = None) -> str:
+        """ options are the settings of the parser that change the trace or whether it can be made at all, such as its
+            limits """
+        return hashlib.sha256(json.dumps([language, version, source_code, input_lines, options]).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Trace]:
+        with self.lock:
+            data = self.traces.get(key)
+            if data is not None:
+                self.traces.move_to_end(key)
+        if data is None:
+            data = self.read(key)
+            if data is None:
+                return None
+            self.remember(key, data)
+        try:
+            program = next(TraceReader(BytesIO(data)).read_programs())
+        except (TraceFileError, StopIteration, ValueError, KeyError, TypeError):
+            self.discard(key)
+            return None
+        return program.code_list, program.line_numbers
+
+    def put(self, key: str, trace: Trace) -> None:
+        buffer = BytesIO()
+        TraceWriter(buffer).write_program(TracedProgram("", "", "", [], trace[0], trace[1]))
+        data = buffer.getvalue()
+        self.remember(key, data)
+        self.write(key, data)
+
+    def remember(self, key: str, data: bytes) -> None:
+        with self.lock:
+            if key in self.traces:
+                self.size -= len(self.traces.pop(key))
+            self.traces[key] = data
+            self.size += len(data)
+            while self.size > self.memory_bytes and len(self.traces) > 0:
+                _, old = self.traces.popitem(last=False)
+                self.size -= len(old)
+
+    def discard(self, key: str) -> None:
+        """ Used for traces that can not be read, such as those written by an older version of the cache """
+        with self.lock:
+            if key in self.traces:
+                self.size -= len(self.traces.pop(key))
+        if self.directory is not None:
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".trace")
+
+    def read(self, key: str) -> Optional[bytes]:
+        if self.directory is None:
+            return None
+        try:
+            with open(self.path(key), "rb") as f:
+                data = f.read()
+            os.utime(self.path(key))
+        except OSError:
+            return None
+        return data
+
+    def write(self, key: str, data: bytes) -> None:
+        """ The trace is written to a temporary file and then renamed, so other processes never see half a trace """
+        if self.directory is None:
+            return
+        try:
+            with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as f:
+                f.write(data)
+            os.replace(f.name, self.path(key))
+            self.evict()
+        except OSError:
+            pass
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".trace"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, file_name in entries:
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(file_name)
+            except OSError:
+                pass
+            total -= size
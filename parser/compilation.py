@@ -0,0 +1,46 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from parser.generic_parser import Parser
+from parser.generic_flowchart import FlowchartCreator
+from parser.parser_types import Statement, Edge
+
+Token = Tuple[int, Any, str]
+
+
+class CompilationUnit(object):
+    """ The source code of one program, parsed at most once. The tracer, the flowchart creator and the code images
+        all work from the same syntax tree and tokens, and everything that does not depend on the trace is remembered
+        so that every question built from the program can share it. """
+
+    def __init__(self, parser: Parser, source_code: str, tree: Any = None) -> None:
+        super().__init__()
+        self.parser = parser
+        self.source_code = source_code
+        self._tree = tree
+        self._flowchart: Optional[Tuple[Dict[int, str], Dict[Edge, str]]] = None
+        self._tokens: Optional[List[Token]] = None
+        self.code_image: Optional[str] = None
+
+    @property
+    def tree(self) -> Any:
+        if self._tree is None:
+            self._tree = self.parser.parse_tree(self.source_code)
+        return self._tree
+
+    def trace(self) -> Tuple[List[Statement], List[str]]:
+        return self.parser.parse_source(self.source_code, self.tree)
+
+    def stream(self) -> Iterator[Statement]:
+        """ The trace one statement at a time, the program is traced again each time it is streamed """
+        return self.parser.stream_trace(self.source_code, self.tree)
+
+    def flowchart(self, flow: FlowchartCreator) -> Tuple[Dict[int, str], Dict[Edge, str]]:
+        """ The creator reuses its dictionaries for every program, so the unit keeps copies of them """
+        if self._flowchart is None:
+            nodes, edges = flow.parse_tree(self.tree)
+            self._flowchart = (dict(nodes), dict(edges))
+        return self._flowchart
+
+    def tokens(self, lex: Callable[[str], List[Token]]) -> List[Token]:
+        if self._tokens is None:
+            self._tokens = lex(self.source_code)
+        return self._tokens
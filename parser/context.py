@@ -0,0 +1,38 @@
+from typing import Any, Callable, Dict, List
+from parser.parser_types import Memory, Variables
+from parser.memory import MemoryJournal
+from parser.limits import TraceBudget
+from parser.trace_io import TraceIO
+
+
+class TraceContext(object):
+    """ Everything a parser changes while it traces a program. The parser and its types and prepared functions never
+        change, so one parser can trace any number of programs as long as its context is reset before each of them. """
+
+    def __init__(self, new_journal: Callable[[], MemoryJournal]) -> None:
+        super().__init__()
+        self.new_journal = new_journal
+        self.budget: TraceBudget = TraceBudget()
+        self.input_lines: List[str] = []
+        self.io: TraceIO = TraceIO(self.input_lines)
+        self.reset()
+
+    def reset(self) -> None:
+        """ Forgets the memory and variables of the last program traced. The old journal is left alone as the
+            statements of the last trace still hold snapshots of it. """
+        self.journal: MemoryJournal = self.new_journal()
+        self.memory: List[Memory] = self.journal.cells
+        self.variables: Variables = dict()
+        self.variables_shared: bool = False
+        self.addresses: Dict[Any, int] = dict()
+        self.budget.reset()
+
+    def start(self) -> None:
+        """ Gets ready to trace a program, which reads its input from the start """
+        self.reset()
+        self.io = TraceIO(self.input_lines)
+
+    def clear(self) -> None:
+        """ Forgets the input as well, only the limits of the budget are kept """
+        self.input_lines = []
+        self.start()
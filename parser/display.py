@@ -0,0 +1,51 @@
+from typing import Any, Callable, Mapping, Optional
+import constants as c
+
+
+def show(value: Any) -> str:
+    """ How a value is written in the code and results of a trace """
+    if isinstance(value, str):
+        return '"' + value + '"'
+    elif isinstance(value, list):
+        return '[' + ", ".join([show(x) for x in value]) + ']'
+    else:
+        return str(value)
+
+
+class Elision(object):
+    """ Shortens the values shown in the images and the questions and the values written in the code of calculations.
+        Values that are shortened are shown rather than asked for. Only the first max_items items of a list are written, followed by how many more there are, e.g. [1, 2, 3, … 97 more].
+        Lists inside lists are shortened the same way, so however large a value is, writing it takes a bounded amount
+        of time and text. Values are written in full when max_items is None. """
+
+    def __init__(self, max_items: Optional[int] = c.MAX_SHOWN_ITEMS) -> None:
+        super().__init__()
+        self.max_items = max_items
+
+    def fits(self, value: Any) -> bool:
+        """ The value is written the same way whether it is shortened or not """
+        if not isinstance(value, list) or self.max_items is None:
+            return True
+        return len(value) <= self.max_items and all(self.fits(x) for x in value)
+
+    def join(self, shown: Callable[[int], str], count: int) -> str:
+        """ Joins the first items of a sequence of count items, shown writes the item at an index """
+        if self.max_items is None or count <= self.max_items:
+            return ", ".join([shown(i) for i in range(count)])
+        return ", ".join([shown(i) for i in range(self.max_items)]) + ", … " + str(count - self.max_items) + " more"
+
+    def show(self, value: Any) -> str:
+        if isinstance(value, list):
+            return '[' + self.join(lambda i: self.show(value[i]), len(value)) + ']'
+        return show(value)
+
+    def show_cell(self, cell: Mapping[str, Any]) -> str:
+        """ The value_show of the cell is used when it does not need to be shortened, as it may already be known """
+        if self.fits(cell["value"]):
+            return cell["value_show"]
+        return self.show(cell["value"])
+
+    def show_result(self, calculation: Mapping[str, Any]) -> str:
+        if self.fits(calculation["result"]):
+            return calculation["result_show"]
+        return self.show(calculation["result"])
@@ -0,0 +1,214 @@
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+from parser.generic_parser import Parser
+from parser.parser_types import Statement, Calculation, Memory
+import constants as c
+
+Evaluate = Callable[[], Calculation]
+
+""" Works out the explanation, calculation explanation, result and type of an operation from its operands """
+Apply = Callable[..., Tuple[str, str, Any, str]]
+
+""" Writes the code of an operation once its operands are known """
+Write = Callable[..., str]
+
+""" Runs a function on the values of its arguments, returning its result and type """
+Invoke = Callable[[List[Any]], Tuple[Any, str]]
+
+
+def shareable(value: Any) -> bool:
+    """ Values that can change, like lists, are never shared as the program may go on to store them in memory """
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class Evaluator(object):
+    """ The part of tracing a program that is the same for every language, which lowers each node the first time it is
+        reached to a closure that only works out values when it runs again. Calculations are shared while their operands
+        are the same, except for calls and the calculations of statements. """
+
+    def __init__(self, parser: Parser) -> None:
+        super().__init__()
+        self.parser = parser
+        self.compiled: Dict[Any, Callable[[], Any]] = dict()
+
+    def compile(self, node: Any) -> Callable[[], Any]:
+        compiled = self.compiled.get(node)
+        if compiled is None:
+            compiler = getattr(self, "compile_" + type(node).__name__, None)
+            if compiler is not None:
+                compiled = compiler(node)
+            else:
+                compiled = lambda: self.visit(node)
+            self.compiled[node] = compiled
+        return compiled
+
+    def evaluate(self, node: Any) -> Any:
+        return self.compile(node)()
+
+    def trace(self, node: Any) -> Iterator[Statement]:
+        """ Executes node, yielding each statement of the trace as soon as it has been executed. Statements that
+            contain other statements have a trace_ method, everything else is compiled. """
+        tracer = getattr(self, "trace_" + type(node).__name__, None)
+        if tracer is not None:
+            yield from tracer(node)
+        else:
+            t = self.evaluate(node)
+            if isinstance(t, List):
+                yield from Parser.flatten(t)
+            else:
+                yield t
+
+    @staticmethod
+    def unsupported(node: Any) -> Evaluate:
+        def fail() -> Calculation:
+            raise Exception("This operation is not supported" + str(node))
+        return fail
+
+    def statement(self, line: str, calculate: Evaluate) -> Callable[[], Statement]:
+        parser = self.parser
+
+        def execute() -> Statement:
+            variables_before = parser.get_var_now()
+            memory_before = parser.get_mem_now()
+            calculation = calculate()
+            return Statement(
+                calculation=calculation,
+                variables_before=variables_before,
+                memory_before=memory_before,
+                current_line=line,
+                variables_after=parser.get_var_now(),
+                memory_after=parser.get_mem_now(),
+                next_line=""
+            )
+        return execute
+
+    def expression(self, line: str, value: Evaluate) -> Callable[[], Statement]:
+        """ An expression on its own is a statement. The calculation of the expression can be shared, so the statement
+            is given a copy of it that the builders are free to change. """
+        return self.statement(line, lambda: value().copy())
+
+    def assignment(self, line: str, target: Evaluate, value: Evaluate, store: Callable[[Calculation, Calculation], None]) -> Callable[[], Statement]:
+        """ store writes the value to the target, given the calculations of both """
+        code_string = self.parser.get_code_string
+
+        def assign() -> Calculation:
+            name = target()
+            expression = value()
+            calc = Calculation.of("Assignment", name.code + " = " + code_string(expression), expression.result, None, expression.type, [expression],
+                                  c.EXP_ASSIGN)
+            store(name, expression)
+            return calc
+        return self.statement(line, assign)
+
+    def condition(self, line: str, test: Evaluate, explanation: str, calculation_explanation: str, before: str, after: str) -> Callable[[], Statement]:
+        """ The statement that tests the condition of an if or a loop, its code is the result written between before
+            and after """
+        code_string = self.parser.get_code_string
+
+        def check() -> Calculation:
+            result = test()
+            return Calculation.of(explanation, before + code_string(result) + after, "None", "None", "None", [result], calculation_explanation)
+        return self.statement(line, check)
+
+    @staticmethod
+    def tested(statement: Statement) -> Any:
+        return statement.calculation.subcalculations[0].result
+
+    def trace_branch(self, condition: Callable[[], Statement], body: Callable[[], Iterator[Statement]], orelse: Callable[[], Iterator[Statement]],
+                     holds: Callable[[Any], bool], fails: Callable[[Any], bool]) -> Iterator[Statement]:
+        state = condition()
+        yield state
+        result = self.tested(state)
+        if holds(result):
+            yield from body()
+        if fails(result):
+            yield from orelse()
+
+    def trace_loop(self, loop: Any, line: str, condition: Callable[[], Statement], body: Callable[[], Iterator[Statement]],
+                   holds: Callable[[Any], bool]) -> Iterator[Statement]:
+        self.parser.check_loop(loop, line)
+        state = condition()
+        yield state
+        while holds(self.tested(state)):
+            yield from body()
+            self.parser.check_loop(loop, line)
+            state = condition()
+            yield state
+
+    @staticmethod
+    def constant(value: Any, code: str, typ: str) -> Evaluate:
+        calculation = Calculation.of(c.M_CONST, code, value, code, typ, [], c.EXP_CON)
+        return lambda: calculation
+
+    def load(self, name: str) -> Evaluate:
+        load_value = self.parser.load_value
+        last: List[Any] = [None, None]
+
+        def load() -> Calculation:
+            t: Memory = load_value(name)
+            value = t["value"]
+            calc = last[1]
+            if calc is not None and calc.result is value and calc.type == t["type"]:
+                return calc
+            calc = Calculation.of(c.M_VAR, name, value, t.get("value_show"), t["type"], [], c.EXP_LOAD)
+            if shareable(value):
+                last[1] = calc
+            return calc
+        return load
+
+    @staticmethod
+    def share(last: List[Any], operands: List[Calculation], calc: Calculation) -> Calculation:
+        """ last holds the operands and the calculation of the last evaluation that can be shared """
+        if shareable(calc.result):
+            last[0] = operands
+            last[1] = calc
+        return calc
+
+    def unary(self, operand: Evaluate, apply: Apply, write: Write) -> Evaluate:
+        last: List[Any] = [[None], None]
+
+        def unary_operation() -> Calculation:
+            value = operand()
+            if value is last[0][0]:
+                return last[1]
+            explanation, calculation_explanation, result, typ = apply(value)
+            return self.share(last, [value], Calculation.of(explanation, write(value), result, None, typ, [value], calculation_explanation))
+        return unary_operation
+
+    def binary(self, left: Evaluate, right: Evaluate, apply: Apply, write: Write) -> Evaluate:
+        last: List[Any] = [[None, None], None]
+
+        def binary_operation() -> Calculation:
+            l = left()
+            r = right()
+            operands = last[0]
+            if l is operands[0] and r is operands[1]:
+                return last[1]
+            explanation, calculation_explanation, result, typ = apply(l, r)
+            return self.share(last, [l, r], Calculation.of(explanation, write(l, r), result, None, typ, [l, r], calculation_explanation))
+        return binary_operation
+
+    def operation(self, operands: List[Evaluate], apply: Apply, write: Write) -> Evaluate:
+        """ An operation on any number of operands, every one of them is evaluated """
+        last: List[Any] = [[], None]
+
+        def operate() -> Calculation:
+            values = [o() for o in operands]
+            if last[1] is not None and all(v is s for v, s in zip(values, last[0])):
+                return last[1]
+            explanation, calculation_explanation, result, typ = apply(*values)
+            return self.share(last, values, Calculation.of(explanation, write(*values), result, None, typ, values, calculation_explanation))
+        return operate
+
+    def call(self, name: str, arguments: List[Evaluate], invoke: Invoke) -> Evaluate:
+        code_string = self.parser.get_code_string
+
+        def call() -> Calculation:
+            subcalculations = [a() for a in arguments]
+            code = name + "(" + ", ".join([code_string(a) for a in subcalculations]) + ")"
+            result, typ = invoke([a.result for a in subcalculations])
+            return Calculation.of(c.M_FUN, code, result, None, typ, subcalculations, c.EXP_FUNC)
+        return call
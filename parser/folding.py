@@ -0,0 +1,29 @@
+from typing import Optional
+from parser.parser_types import Calculation
+import constants as c
+
+""" The nodes whose value is known from the code alone, once the values of their subcalculations are """
+CONSTANT_NODES = frozenset((c.M_CONST, c.M_DEF_LIST, c.M_ARR_CONST))
+
+
+def fold(calculation: Calculation, above: Optional[int]) -> Calculation:
+    """ Folds every subtree of the calculation that is made up only of constants, and has more than above nodes, into
+        its root. A list literal of 50 numbers becomes one node with the code and value of the whole list, rather than
+        one node for the list and one for each number, so the questions, images and distractors built from the
+        calculation grow with the work the program does rather than the size of its literals. Nothing is folded when
+        above is None. """
+    if above is not None and fold_subtrees(calculation, above) > above:
+        calculation.subcalculations = []
+    return calculation
+
+
+def fold_subtrees(calculation: Calculation, above: int) -> int:
+    """ Returns the number of nodes in the calculation if it is made up only of constants, otherwise 0 after folding
+        those of its subtrees that are """
+    sizes = [fold_subtrees(sub, above) if sub is not None else 0 for sub in calculation.subcalculations]
+    if calculation.explanation in CONSTANT_NODES and all(sizes):
+        return 1 + sum(sizes)
+    for sub, size in zip(calculation.subcalculations, sizes):
+        if size > above:
+            sub.subcalculations = []
+    return 0
@@ -1,4 +1,4 @@
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Any
 from parser.parser_types import Edge
 
 class FlowchartCreator(object):
@@ -9,4 +9,8 @@ class FlowchartCreator(object):
         self.flow_edges : Dict[Edge, str] = {}
 
     def parse_source(self, SOURCE : str) -> Tuple[Dict[int, str], Dict[Edge, str]]:
+        pass
+
+    def parse_tree(self, tree : Any) -> Tuple[Dict[int, str], Dict[Edge, str]]:
+        """ Builds the flowchart from a tree that has already been parsed by the parser for the same language """
         pass
\ No newline at end of file
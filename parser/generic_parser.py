@@ -1,46 +1,237 @@
-from typing import List, Tuple, Any, Iterable
-from parser.parser_types import Statement, Variables, Calculation, Memory
+from typing import List, Tuple, Any, Iterable, Dict, Iterator, Optional
+from parser.parser_types import Statement, Variables, Calculation, Memory, StatementIndex
+from parser.memory import MemoryJournal, MemorySnapshot, Cell
+from parser.cache import TraceCache
+from parser.context import TraceContext
+from parser.display import Elision, show
+from parser.folding import fold
+import constants as c
+
+""" The node a placeholder was found in, the field of that node holding it, its position if the field is a list and
+    the placeholder itself """
+Site = Tuple[Any, str, Optional[int], Any]
 
 
 class Parser(object):
+    """ language and version are part of the key traces are cached under, version should be increased whenever a
+        change to the tracer changes the traces it produces """
+    language: str = ""
+    version: int = 1
+
     def __init__(self, types: Any, prepared_functions: Any):
-        self.memory: List[Memory] = []
-        self.variables: Variables = dict()
+        self.context: TraceContext = TraceContext(self.new_journal)
+        self.cache: Optional[TraceCache] = None
         self.types: Any = types
         self.prepared_functions = prepared_functions
+        self.elision: Elision = Elision()
+        self.fold_above: Optional[int] = c.FOLD_CONSTANTS_ABOVE
+
+    """ The state of the trace in progress is kept in the context, these give the tracers the names they have always
+        used for it """
+    journal = property(lambda self: self.context.journal)
+    memory = property(lambda self: self.context.memory)
+    addresses = property(lambda self: self.context.addresses)
+    budget = property(lambda self: self.context.budget)
+    io = property(lambda self: self.context.io)
+    input_lines = property(lambda self: self.context.input_lines)
+
+    @property
+    def variables(self) -> Variables:
+        return self.context.variables
+
+    @variables.setter
+    def variables(self, variables: Variables) -> None:
+        self.context.variables = variables
+
+    @property
+    def variables_shared(self) -> bool:
+        return self.context.variables_shared
+
+    @variables_shared.setter
+    def variables_shared(self, shared: bool) -> None:
+        self.context.variables_shared = shared
+
+    def reset(self) -> None:
+        self.context.reset()
+
+    def new_journal(self) -> MemoryJournal:
+        return MemoryJournal()
+
+    def set_limits(self, max_steps: int, max_snapshot_bytes: int) -> None:
+        self.budget.max_steps = max_steps
+        self.budget.max_snapshot_bytes = max_snapshot_bytes
+
+    def set_elision(self, max_items: Optional[int]) -> None:
+        """ The most items of a list written out in the values shown and in the code of the calculations """
+        self.elision = Elision(max_items)
+
+    def set_folding(self, above: Optional[int]) -> None:
+        """ Constant subtrees of more than above nodes are folded into one node, None keeps every node """
+        self.fold_above = above
 
     def set_input(self, strs: List[str]) -> None:
-        self.prepared_functions.set_input(strs)
+        """ Every trace reads this input from the start """
+        self.context.input_lines = list(strs)
+
+    def set_cache(self, cache: Optional[TraceCache]) -> None:
+        self.cache = cache
 
     def get_types(self):
         return self.types
 
-    def parse_source(self, source_code: str) -> Tuple[List[Statement], List[str]]:
+    def parse_tree(self, source_code: str) -> Any:
+        """ Parses the program into the syntax tree the tracer walks """
         pass
 
-    def parse_file(self, file_name: str) -> Tuple[List[Statement], List[str]]:
+    def trace_tree(self, tree: Any) -> Iterator[Statement]:
+        """ Yields the statements of the program as they are executed, before next_line and why_line are filled in """
+        pass
+
+    def find_placeholders(self, tree: Any, names: List[str]) -> Optional[List[List[Site]]]:
+        """ Finds where each of the placeholder names is used as an expression in a parsed template. Returns None if
+            a placeholder is used anywhere else, e.g. as part of a longer name or inside a string. """
         pass
 
+    def parameter_node(self, text: str, site: Site) -> Any:
+        """ Builds the node for a parameter value to take the place of a placeholder. Returns None if the node would
+            not be the same as the one parsed from the code with the value written in. """
+        pass
+
+    def trace_source(self, source_code: str, tree: Any = None) -> Iterator[Statement]:
+        """ tree can be given when the program has already been parsed, source_code must then be its code """
+        if tree is None:
+            tree = self.parse_tree(source_code)
+        return self.trace_tree(tree)
+
+    def stream_source(self, source_code: str, tree: Any = None) -> Iterator[Statement]:
+        """ Yields the statements of the program one at a time. A statement is only finished once the statement
+            executed after it is known, so the stream runs one statement behind the tracer. """
+        self.context.start()
+        previous: Optional[Statement] = None
+        for statement in self.trace_source(source_code, tree):
+            self.budget.count_step(statement["current_line"])
+            self.index_statement(statement)
+            statement["why_line"] = self.get_why_line(previous)
+            if previous is not None:
+                previous["next_line"] = statement["current_line"]
+                yield previous
+            previous = statement
+        self.reset()
+        if previous is not None:
+            previous["next_line"] = c.FINISHED
+            yield previous
+
+    def index_statement(self, statement: Statement) -> None:
+        statement.index = StatementIndex(fold(statement["calculation"], self.fold_above))
+
+    def cache_options(self) -> Optional[List[Any]]:
+        """ The settings a cached trace was made with, a trace is only reused when they are all the same. None means the
+            trace must not be cached at all. """
+        return [self.fold_above, self.budget.max_steps, self.budget.max_snapshot_bytes, self.elision.max_items]
+
+    def cache_key(self, source_code: str) -> Optional[str]:
+        """ The key the trace of the program is cached under, None if it is not cached """
+        options = self.cache_options() if self.cache is not None else None
+        if options is None:
+            return None
+        return self.cache.key(self.language, self.version, source_code, self.input_lines, options)
+
+    def parse_source(self, source_code: str, tree: Any = None) -> Tuple[List[Statement], List[str]]:
+        key = self.cache_key(source_code)
+        if key is not None:
+            trace = self.cache.get(key)
+            if trace is not None:
+                return trace
+        execution_steps: List[Statement] = list(self.stream_source(source_code, tree))
+        line_numbers = ['0'] + [e["current_line"] for e in execution_steps] + ['-1']
+        if key is not None:
+            self.cache.put(key, (execution_steps, line_numbers))
+        return execution_steps, line_numbers
+
+    def stream_trace(self, source_code: str, tree: Any = None) -> Iterator[Statement]:
+        """ The statements parse_source would return, one at a time. They are read from the cache if the program has
+            been cached, but a trace that is streamed is never cached as it is not kept. """
+        key = self.cache_key(source_code)
+        trace = self.cache.get(key) if key is not None else None
+        if trace is not None:
+            return iter(trace[0])
+        return self.stream_source(source_code, tree)
+
+    def parse_file(self, file_name: str) -> Tuple[List[Statement], List[str]]:
+        f = open(file_name, "r")
+        source_code = "".join(f.readlines())
+        f.close()
+        return self.parse_source(source_code)
+
+    @staticmethod
+    def get_why_line(previous: Optional[Statement]) -> str:
+        """ previous is the statement executed before, None for the first statement of the program """
+        if previous is None:
+            return "This is the start of the program"
+        if previous["calculation"]["explanation"] in (c.M_WHILE, c.M_IF):
+            res = previous["calculation"]["subcalculations"][0]["result"]
+            if res == True:
+                res = True
+            elif res == False:
+                res = False
+            return "This line is executed because the condition of the previous statement was " + str(res)
+        return "This line was executed because it was next in the sequence"
+
     def assign_value(self, name: str, value: Any, type: str) -> None:
-        in_mem = False
-        address = -1
-        for t in self.memory:
-            if value == t["value"]:
-                in_mem = True
-                address = t["address"]
+        address = self.find_in_memory(value)
+        in_mem = address != -1
 
         if name in self.variables:
             if in_mem:
-                self.variables[name] = (type, address)
+                self.set_variable(name, (type, address))
             else:
                 address = self.add_to_memory(value)
-                self.variables[name] = (type, address)
+                self.set_variable(name, (type, address))
         else:
             if in_mem:
-                self.variables[name] = (type, address)
+                self.set_variable(name, (type, address))
             else:
                 address = self.add_to_memory(value)
-                self.variables[name] = (type, address)
+                self.set_variable(name, (type, address))
+
+    def set_variable(self, name: str, info: Tuple[Any, ...]) -> None:
+        """ The variables dictionary is shared with every statement that took a snapshot of it since it last changed,
+            so it is copied before being written to. """
+        if self.variables_shared:
+            self.variables = dict(self.variables)
+            self.variables_shared = False
+            self.budget.count_variables(self.variables)
+        self.variables[name] = info
+
+    def write_memory(self, cell: Memory) -> None:
+        address = cell["address"]
+        if address < len(self.memory):
+            old_key = self.memory_key(self.memory[address]["value"])
+            if self.addresses.get(old_key) == address:
+                del self.addresses[old_key]
+        self.journal.write(cell)
+        self.budget.count_cell(cell)
+        self.addresses.setdefault(self.memory_key(cell["value"]), address)
+
+    def check_loop(self, loop: Any, line: str) -> None:
+        """ Called each time a loop is about to test its condition, raises InfiniteLoopError if the loop can never end """
+        self.budget.check_loop(loop, line, self.variables, self.journal, self.io.read())
+
+    def find_in_memory(self, value: Any) -> int:
+        """ Returns the address of the cell that holds value, or -1 if there is no such cell """
+        return self.addresses.get(self.memory_key(value), -1)
+
+    @staticmethod
+    def memory_key(value: Any) -> Any:
+        """ Lists can change after they are stored, so they are only matched by identity. Other values are matched by
+            type as well as value, so that 1, 1.0 and True are not stored in the same cell. """
+        if isinstance(value, list):
+            return (list, id(value))
+        try:
+            hash(value)
+        except TypeError:
+            return (type(value), id(value))
+        return (type(value), value)
 
     def load_value(self, name: str) -> Memory:
         if name in self.variables:
@@ -57,33 +248,16 @@ class Parser(object):
             return {"address": -1, "type": "?", "value": "?", "value_show": "?"}
 
 
-    def get_mem_now(self) -> List[Memory]:
-        mem_list: List[Memory] = []
-        for m in self.memory:
-            # print(m["type"])
-            if m["type"] == "list":
-                val = list(m["value"])
-            else:
-                val = m["value"]
-            d: Memory = {
-                "address": m["address"],
-                "type": m["type"],
-                "value": val,
-                "value_show": m["value_show"]
-            }
-            mem_list.append(d)
-        return mem_list
+    def get_mem_now(self) -> MemorySnapshot:
+        return self.journal.snapshot()
 
     def get_var_now(self) -> Variables:
-        return self.variables.copy()
+        self.variables_shared = True
+        return self.variables
 
     def add_to_memory(self, value: Any) -> int:
         add = len(self.memory)
-        self.memory.append({
-            "address": add,
-            "type": self.get_type_string(type(value)),
-            "value": value,
-            "value_show": Parser.get_result_string(value)})
+        self.write_memory(Cell(address=add, type=self.get_type_string(type(value)), value=value))
         return add
 
     @staticmethod
@@ -108,12 +282,11 @@ class Parser(object):
 
     @staticmethod
     def get_result_string(result: Any) -> str:
-        if isinstance(result, str):
-            return '"' + result + '"'
-        elif isinstance(result, list):
-            return '[' + ", ".join([Parser.get_result_string(x) for x in result]) + ']'
-        else:
-            return str(result)
+        return show(result)
+
+    def get_code_string(self, calculation: Calculation) -> str:
+        """ How the result of a calculation is written in the code of the calculations that use it """
+        return self.elision.show_result(calculation)
 
     @staticmethod
     def flatten(l: Iterable[Any]) -> List[Any]:
@@ -125,23 +298,34 @@ class Parser(object):
                 out.append(item)
         return out
 
+    @staticmethod
+    def get_index(st: Statement) -> StatementIndex:
+        """ Statements that were not made by a tracer, such as the empty statements used for drawing, are indexed the
+            first time they are asked for """
+        try:
+            return st.index
+        except AttributeError:
+            st.index = StatementIndex(st["calculation"])
+            return st.index
+
+    @staticmethod
+    def get_step(st: Statement, position: int) -> int:
+        """ The number of the statement in the trace, counting from 0. A statement that was rebuilt on its own knows its
+            step, any other statement is at its position in the trace. """
+        try:
+            return st.step
+        except AttributeError:
+            return position
+
     @staticmethod
     def get_all_code_statement(st: Statement) -> List[str]:
-        code_lines: List[str] = []
-        calc_queue: List[Calculation] = [st["calculation"]]
-
-        while len(calc_queue) > 0:
-            code_lines.append(calc_queue[0]["code"])
-            for sc in calc_queue[0]["subcalculations"]:
-                calc_queue.append(sc)
-            calc_queue = calc_queue[1:]
-        return code_lines
+        return list(Parser.get_index(st).code)
 
     @staticmethod
     def get_all_code(ls: List[Statement]) -> List[str]:
         code_lines = []
         for st in ls:
-            code_lines.extend(Parser.get_all_code_statement(st))
+            code_lines.extend(Parser.get_index(st).code)
         return code_lines
 
     @staticmethod
@@ -154,19 +338,18 @@ class Parser(object):
 
     @staticmethod
     def get_all_explanations_statement(st: Statement) -> List[str]:
-        explain_lines: List[str] = []
-        calc_queue: List[Calculation] = [st["calculation"]]
-
-        while len(calc_queue) > 0:
-            explain_lines.append(calc_queue[0]["explanation"])
-            for sc in calc_queue[0]["subcalculations"]:
-                calc_queue.append(sc)
-            calc_queue = calc_queue[1:]
-        return explain_lines
+        return list(Parser.get_index(st).explanations)
 
     @staticmethod
     def get_explanations_code(ls: List[Statement]) -> List[str]:
         explain_lines: List[str] = []
         for st in ls:
-            explain_lines.extend(Parser.get_all_explanations_statement(st))
+            explain_lines.extend(Parser.get_index(st).explanations)
         return explain_lines
+
+    @staticmethod
+    def get_tags_code(ls: Iterable[Statement]) -> List[str]:
+        tags: Dict[str, None] = dict()
+        for st in ls:
+            tags.update(dict.fromkeys(Parser.get_index(st).tags))
+        return list(tags)
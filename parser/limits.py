@@ -0,0 +1,102 @@
+import sys
+from typing import Any, Dict, Optional, Tuple, List
+from parser.parser_types import Memory, Variables
+from parser.memory import MemoryJournal
+import constants as c
+
+
+class TraceLimitError(Exception):
+    """ Raised when the program being traced does more work than the trace is allowed to record """
+
+    def __init__(self, message: str, line: Optional[str] = None) -> None:
+        if line is not None:
+            message = message + " (line " + line + ")"
+        super().__init__(message)
+        self.line = line
+
+
+class InfiniteLoopError(TraceLimitError):
+    """ Raised when a loop is about to test its condition in exactly the same state as it did before, the program
+        can never leave the loop as everything it does from then on will repeat. """
+    pass
+
+
+class TraceBudget(object):
+    """ Keeps count of the statements executed and the approximate number of bytes held by the snapshots of a trace,
+        and remembers the state of the program each time a loop tests its condition. """
+
+    def __init__(self, max_steps: int = c.MAX_TRACE_STEPS, max_snapshot_bytes: int = c.MAX_SNAPSHOT_BYTES) -> None:
+        super().__init__()
+        self.max_steps = max_steps
+        self.max_snapshot_bytes = max_snapshot_bytes
+        self.steps: int = 0
+        self.snapshot_bytes: int = 0
+        self.loop_states: Dict[Any, Dict[Tuple[Any, ...], int]] = dict()
+        self.cell_hashes: List[int] = []
+        self.memory_hash: int = 0
+
+    def reset(self) -> None:
+        self.steps = 0
+        self.snapshot_bytes = 0
+        self.loop_states = dict()
+        self.cell_hashes = []
+        self.memory_hash = 0
+
+    def count_step(self, line: str) -> None:
+        self.steps += 1
+        if self.steps > self.max_steps:
+            raise TraceLimitError("The program executed more than " + str(self.max_steps) + " statements", line)
+
+    def count_cell(self, cell: Memory) -> None:
+        """ Called for every cell written to memory. value_show is left out, it is only written out if it is read. """
+        self.count_bytes(sys.getsizeof(cell) + sys.getsizeof(cell["value"]))
+        self.hash_cell(cell["address"], cell["type"], cell["value"])
+
+    def hash_cell(self, address: int, typ: str, value: Any) -> None:
+        """ Keeps the hash of the whole memory up to date by swapping the hash of the cell that was at the address
+            for the hash of the new one """
+        cell_hash = hash((address, (typ, self.freeze(value))))
+        if address == len(self.cell_hashes):
+            self.cell_hashes.append(cell_hash)
+        else:
+            self.memory_hash ^= self.cell_hashes[address]
+            self.cell_hashes[address] = cell_hash
+        self.memory_hash ^= cell_hash
+
+    def count_variables(self, variables: Variables) -> None:
+        self.count_bytes(sys.getsizeof(variables))
+
+    def count_bytes(self, size: int) -> None:
+        self.snapshot_bytes += size
+        if self.snapshot_bytes > self.max_snapshot_bytes:
+            raise TraceLimitError("The trace of the program needs more than " + str(self.max_snapshot_bytes) + " bytes of memory")
+
+    def check_loop(self, loop: Any, line: str, variables: Variables, journal: MemoryJournal, input_read: int) -> None:
+        """ Tracing is deterministic, so if a loop reaches its condition with the same variables, memory and unread
+            input as an earlier iteration, it will keep coming back to this state forever. Only the hash of the memory
+            is remembered for each iteration, when it matches the memory of that iteration is replayed from the
+            journal to make sure it really is the same. """
+        state = (input_read, tuple(variables.items()), len(journal.cells), self.memory_hash)
+        seen = self.loop_states.setdefault(loop, dict())
+        version = seen.get(state)
+        if version is not None and self.same_memory(journal.replay(version), journal.cells):
+            raise InfiniteLoopError("The program is stuck in an infinite loop", line)
+        seen[state] = len(journal.writes)
+
+    @staticmethod
+    def same_memory(before: List[Memory], after: List[Memory]) -> bool:
+        return [TraceBudget.freeze_cell(cell) for cell in before] == [TraceBudget.freeze_cell(cell) for cell in after]
+
+    @staticmethod
+    def freeze_cell(cell: Memory) -> Tuple[Any, ...]:
+        return (cell["type"], TraceBudget.freeze(cell["value"]))
+
+    @staticmethod
+    def freeze(value: Any) -> Any:
+        if isinstance(value, list):
+            return (list, tuple(TraceBudget.freeze(v) for v in value))
+        try:
+            hash(value)
+        except TypeError:
+            return (type(value), repr(value))
+        return (type(value), value)
@@ -0,0 +1,335 @@
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+from typing import List, Iterator, Any, Optional, Dict, Tuple
+from parser.parser_types import Memory
+from parser.display import show
+
+
+class Cell(dict):
+    """ A cell of memory whose value_show is only written out the first time it is read. Cells are never changed
+        once they are written, so the string is worked out at most once for each value a cell holds. """
+    __slots__ = ()
+
+    def __missing__(self, key: str) -> Any:
+        if key == "value_show":
+            shown = self["value_show"] = show(self["value"])
+            return shown
+        raise KeyError(key)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, dict):
+            return self.shown() == (other.shown() if isinstance(other, Cell) else other)
+        return NotImplemented
+
+    def __ne__(self, other: Any) -> bool:
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def shown(self) -> Dict[str, Any]:
+        """ The cell as a plain dictionary, with its value_show """
+        self["value_show"]
+        return dict(self)
+
+
+class MemoryJournal(object):
+    """ The memory of a program being traced, stored as an append only log of the cells written to it. Cells are never
+        modified once they have been written, a change to a value is recorded by writing a new cell to the same
+        address. This means that a snapshot of the memory only needs to remember how long the log was when it was
+        taken, the full list of cells is only rebuilt if something actually reads the snapshot. """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.cells: List[Memory] = []
+        self.writes: List[Memory] = []
+        self._replayed: List[Memory] = []
+        self._replayed_version: int = 0
+        self._last_snapshot: Optional[MemorySnapshot] = None
+
+    def write(self, cell: Memory) -> None:
+        address = cell["address"]
+        if address == len(self.cells):
+            self.cells.append(cell)
+        else:
+            self.cells[address] = cell
+        self.writes.append(cell)
+
+    def snapshot(self) -> "MemorySnapshot":
+        """ Statements that are traced without writing to memory share the same snapshot object """
+        version = len(self.writes)
+        if self._last_snapshot is None or self._last_snapshot.version != version:
+            self._last_snapshot = MemorySnapshot(self, version)
+        return self._last_snapshot
+
+    @staticmethod
+    def new_cells() -> List[Memory]:
+        return []
+
+    @staticmethod
+    def apply(cells: List[Memory], cell: Memory) -> None:
+        if cell["address"] == len(cells):
+            cells.append(cell)
+        else:
+            cells[cell["address"]] = cell
+
+    def replay(self, version: int) -> List[Memory]:
+        """ Rebuilds the list of cells as it was after the first version writes. Builders read the statements of a
+            trace in order, so replaying continues from the last version that was rebuilt where possible. """
+        if version < self._replayed_version:
+            self._replayed = []
+            self._replayed_version = 0
+        for cell in self.writes[self._replayed_version:version]:
+            self.apply(self._replayed, cell)
+        self._replayed_version = version
+        return list(self._replayed)
+
+    def written(self, start: int, stop: int) -> List[Memory]:
+        """ The cells written between two versions of the memory """
+        return self.writes[start:stop]
+
+
+class TypedMemoryJournal(MemoryJournal):
+    """ A journal for memory that is declared a block at a time, like the variables and arrays of a C program. The
+        values of each block are kept in one buffer and the dictionary for a cell is only built when something reads
+        it. Each entry in the log is either a declaration, (start, type, size, value, value_show), or a write,
+        (address, value). """
+
+    def __init__(self, typecodes: Dict[str, str]) -> None:
+        super().__init__()
+        self.typecodes = typecodes
+        self.cells: BlockCells = BlockCells()
+        self._replayed: BlockCells = BlockCells()
+
+    def declare(self, start: int, typ: str, size: int, value: Any, value_show: Optional[str]) -> None:
+        """ value_show is only given when it is not the way the value is usually written, e.g. for a variable that
+            has not been given a value yet """
+        self.cells.declare(start, typ, size, value, value_show, self.typecodes.get(typ))
+        self.writes.append((start, typ, size, value, value_show))
+
+    def store(self, address: int, value: Any) -> None:
+        self.cells.store(address, value)
+        self.writes.append((address, value))
+
+    @staticmethod
+    def new_cells() -> "BlockCells":
+        return BlockCells()
+
+    def write(self, cell: Memory) -> None:
+        if cell["address"] == len(self.cells):
+            self.declare(cell["address"], cell["type"], 1, cell["value"], cell.get("value_show"))
+        else:
+            self.store(cell["address"], cell["value"])
+
+    def apply(self, cells: "BlockCells", entry: Tuple[Any, ...]) -> None:
+        if len(entry) == 2:
+            cells.store(*entry)
+        else:
+            start, typ, size, value, value_show = entry
+            cells.declare(start, typ, size, value, value_show, self.typecodes.get(typ))
+
+    def replay(self, version: int) -> "BlockCells":
+        if version < self._replayed_version:
+            self._replayed = BlockCells()
+            self._replayed_version = 0
+        for entry in self.writes[self._replayed_version:version]:
+            self.apply(self._replayed, entry)
+        self._replayed_version = version
+        return self._replayed.copy()
+
+    def written(self, start: int, stop: int) -> List[Memory]:
+        """ A declaration is written as one cell for each address it declares """
+        cells: List[Memory] = []
+        for entry in self.writes[start:stop]:
+            if len(entry) == 2:
+                address, value = entry
+                cells.append(Cell(address=address, type=self.cells.type_at(address), value=value))
+            else:
+                first, typ, size, value, value_show = entry
+                cells.extend(BlockCells.new_cell(first + i, typ, value, value_show) for i in range(size))
+        return cells
+
+
+class BlockCells(Sequence):
+    """ The cells of a TypedMemoryJournal. A block is stored in an array while every value written to it fits the
+        array exactly, e.g. an int array that only ever holds Python ints. Anything else turns the block into a list of
+        (value, value_show) pairs, where value_show is None unless the value is written in an unusual way. """
+    LIMITS = {"B": (0, 255), "q": (-2 ** 63, 2 ** 63 - 1)}
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.starts: List[int] = []
+        self.types: List[str] = []
+        self.buffers: List[Any] = []
+        self.size: int = 0
+
+    @staticmethod
+    def fits(typecode: str, value: Any) -> bool:
+        if typecode == "d":
+            return type(value) is float
+        low, high = BlockCells.LIMITS[typecode]
+        return type(value) is int and low <= value <= high
+
+    def declare(self, start: int, typ: str, size: int, value: Any, value_show: Optional[str], typecode: Optional[str]) -> None:
+        if typecode is not None and self.fits(typecode, value):
+            buffer: Any = array(typecode, [value]) * size
+        else:
+            buffer = [(value, value_show)] * size
+        self.starts.append(start)
+        self.types.append(typ)
+        self.buffers.append(buffer)
+        self.size = start + size
+
+    def block(self, address: int) -> int:
+        if address < 0:
+            address += self.size
+        if address < 0 or address >= self.size:
+            raise IndexError("memory address out of range")
+        return bisect_right(self.starts, address) - 1
+
+    def store(self, address: int, value: Any) -> None:
+        b = self.block(address)
+        buffer = self.buffers[b]
+        if isinstance(buffer, array):
+            if self.fits(buffer.typecode, value):
+                buffer[address - self.starts[b]] = value
+                return
+            buffer = [(v, None) for v in buffer]
+            self.buffers[b] = buffer
+        buffer[address - self.starts[b]] = (value, None)
+
+    def type_at(self, address: int) -> str:
+        return self.types[self.block(address)]
+
+    def cell(self, address: int) -> Memory:
+        if address < 0:
+            address += self.size
+        b = self.block(address)
+        buffer = self.buffers[b]
+        if isinstance(buffer, array):
+            return Cell(address=address, type=self.types[b], value=buffer[address - self.starts[b]])
+        value, value_show = buffer[address - self.starts[b]]
+        return self.new_cell(address, self.types[b], value, value_show)
+
+    @staticmethod
+    def new_cell(address: int, typ: str, value: Any, value_show: Optional[str]) -> Memory:
+        if value_show is None:
+            return Cell(address=address, type=typ, value=value)
+        return Cell(address=address, type=typ, value=value, value_show=value_show)
+
+    def values(self, start: int, stop: int) -> List[Any]:
+        """ The values from start up to stop, read straight from the buffers without building any cells """
+        stop = min(stop, self.size)
+        out: List[Any] = []
+        if start >= stop:
+            return out
+        for b in range(self.block(start), len(self.buffers)):
+            first = self.starts[b]
+            if first >= stop:
+                break
+            part = self.buffers[b][max(start - first, 0):stop - first]
+            if isinstance(part, array):
+                out.extend(part.tolist())
+            else:
+                out.extend(value for value, _ in part)
+        return out
+
+    def copy(self) -> "BlockCells":
+        cells = BlockCells()
+        cells.starts = list(self.starts)
+        cells.types = list(self.types)
+        cells.buffers = [buffer[:] for buffer in self.buffers]
+        cells.size = self.size
+        return cells
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self.cell(i) for i in range(*index.indices(self.size))]
+        return self.cell(index)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[Memory]:
+        for b, buffer in enumerate(self.buffers):
+            for i in range(len(buffer)):
+                yield self.cell(self.starts[b] + i)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Sequence):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class MemorySnapshot(Sequence):
+    """ A read only view of the memory of the program at one point in the trace, it is used in place of a list of
+        memory cells in the memory_before and memory_after entries of a statement. """
+
+    def __init__(self, journal: MemoryJournal, version: int) -> None:
+        super().__init__()
+        self.journal = journal
+        self.version = version
+        self._cells: Optional[Sequence] = None
+
+    def cells(self) -> Sequence:
+        if self._cells is None:
+            self._cells = self.journal.replay(self.version)
+        return self._cells
+
+    def values(self, start: int, stop: int) -> List[Any]:
+        cells = self.cells()
+        if isinstance(cells, BlockCells):
+            return cells.values(start, stop)
+        return [cell["value"] for cell in cells[start:stop]]
+
+    def __getitem__(self, index: Any) -> Any:
+        return self.cells()[index]
+
+    def __len__(self) -> int:
+        return len(self.cells())
+
+    def __iter__(self) -> Iterator[Memory]:
+        return iter(self.cells())
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, MemorySnapshot):
+            return self.cells() == other.cells()
+        return self.cells() == other
+
+    def __copy__(self) -> "MemorySnapshot":
+        return self
+
+    def __deepcopy__(self, memo: Any) -> "MemorySnapshot":
+        """ Snapshots never change, so there is no need to copy the journal they were taken from """
+        return self
+
+    def __repr__(self) -> str:
+        return repr(self.cells())
+
+
+class MemoryCursor(object):
+    """ Reads the memory of a trace one snapshot after another in the order they were taken. The writes between two
+        snapshots are applied to a single set of cells, so reading every statement of a trace is one pass over its
+        writes rather than a copy of the whole memory for each snapshot. The cells returned are only good until the
+        cursor is moved on. """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.journal: Optional[MemoryJournal] = None
+        self.cells: Sequence = []
+        self.version: int = 0
+
+    def at(self, memory: Sequence[Memory]) -> Sequence[Memory]:
+        if not isinstance(memory, MemorySnapshot):
+            return memory
+        journal = memory.journal
+        if journal is not self.journal or memory.version < self.version:
+            self.journal = journal
+            self.cells = journal.new_cells()
+            self.version = 0
+        for entry in journal.writes[self.version:memory.version]:
+            journal.apply(self.cells, entry)
+        self.version = memory.version
+        return self.cells
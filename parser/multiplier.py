@@ -1,15 +1,90 @@
 import shlex
-from typing import List, Tuple
+import string
+from typing import List, Tuple, Any, Iterator, Optional
+from parser.generic_parser import Parser, Site
 
-def generate_from_template(code_file : str, param_file : str, question_name : str) -> List[Tuple[str,str]]:
+PLACEHOLDER = "__template_parameter_{}__"
+
+def template_parameters(param_file : str, question_name : str) -> List[Tuple[str, List[str]]]:
     lines = param_file.split('\n')
-    source_codes : List[Tuple[str,str]] = []
+    parameters : List[Tuple[str, List[str]]] = []
     for i, l in enumerate(lines):
         params = shlex.split(l, posix=False)
-        b = code_file.format(*params)
         gn = generated_name(i, len(lines))
-        source_codes.append(( question_name + "-" + gn, b) )
-    return source_codes
+        parameters.append(( question_name + "-" + gn, params) )
+    return parameters
+
+def generate_from_template(code_file : str, param_file : str, question_name : str) -> List[Tuple[str,str]]:
+    return [ (name, code_file.format(*params)) for name, params in template_parameters(param_file, question_name) ]
+
+def generate_trees_from_template(parser : Parser, code_file : str, param_file : str, question_name : str) -> Iterator[Tuple[str, str, Any]]:
+    """ The same as generate_from_template, but the template is only parsed once. Each variant also comes with its
+        syntax tree, or None when it has to be parsed from its code. The tree is shared between the variants, so a
+        variant must be traced before the next one is asked for. """
+    template = ParsedTemplate(parser, code_file)
+    for name, params in template_parameters(param_file, question_name):
+        source_code = code_file.format(*params)
+        yield name, source_code, template.bind(params)
+
+class ParsedTemplate(object):
+    """ A template parsed with a placeholder name written in for each of its fields. Binding a set of parameters
+        replaces every placeholder with a node for its value. """
+    def __init__(self, parser : Parser, code : str) -> None:
+        super().__init__()
+        self.parser = parser
+        self.tree : Any = None
+        self.sites : List[List[Site]] = []
+        count = self.count_fields(code)
+        if count is None:
+            return
+        names = [ PLACEHOLDER.format(i) for i in range(count) ]
+        try:
+            tree = parser.parse_tree(code.format(*names))
+        except Exception:                                   # The fields are somewhere a name can not go, e.g. operators
+            return
+        sites = parser.find_placeholders(tree, names)
+        if sites is not None:
+            self.tree = tree
+            self.sites = sites
+
+    @staticmethod
+    def count_fields(code : str) -> Optional[int]:
+        """ Only plain positional fields, {} or {0}, can be bound. Returns None if there are any other fields. """
+        count = 0
+        auto = 0
+        try:
+            for _, field, spec, conversion in string.Formatter().parse(code):
+                if field is None:
+                    continue
+                if spec or conversion:
+                    return None
+                if field == "":
+                    auto += 1
+                    count = max(count, auto)
+                elif field.isdigit():
+                    count = max(count, int(field) + 1)
+                else:
+                    return None
+        except ValueError:
+            return None
+        return count
+
+    def bind(self, params : List[str]) -> Any:
+        if self.tree is None or len(params) < len(self.sites):
+            return None
+        bindings : List[Tuple[Site, Any]] = []
+        for i, sites in enumerate(self.sites):
+            for site in sites:
+                node = self.parser.parameter_node(params[i], site)
+                if node is None:
+                    return None
+                bindings.append((site, node))
+        for (parent, field, index, _), node in bindings:
+            if index is None:
+                setattr(parent, field, node)
+            else:
+                getattr(parent, field)[index] = node
+        return self.tree
 
 def generated_name(number : int, max_num : int) -> str:
     generated_name = ""
@@ -17,4 +92,4 @@ def generated_name(number : int, max_num : int) -> str:
         generated_name = chr(ord('a') + number % 26) + generated_name
         number = number // 26
         max_num = max_num // 26
-    return generated_name
\ No newline at end of file
+    return generated_name
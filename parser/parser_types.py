@@ -1,8 +1,62 @@
 from __future__ import annotations
-from typing import TypedDict, List, Dict, Any, Tuple
+import sys
+from collections.abc import MutableMapping
+from typing import TypedDict, List, Dict, Any, Tuple, Sequence, Iterator, FrozenSet, Optional
+from parser.display import show
+import constants as c
 
 
-class Calculation(TypedDict):
+class Record(MutableMapping):
+    """ Base class for the nodes of a trace. The fields of a record are kept in slots instead of a dictionary per
+        node, but a record can still be used as a dictionary with the field names as keys. Strings stored in the
+        fields named in interned are interned, so the explanations repeated on every node of a trace are shared. """
+    __slots__ = ()
+    fields: FrozenSet[str] = frozenset()
+    interned: FrozenSet[str] = frozenset()
+
+    def __init__(self, **values: Any) -> None:
+        super().__init__()
+        for key, value in values.items():
+            self[key] = value
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.fields:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self.fields:
+            raise KeyError(key)
+        if key in self.interned and type(value) is str:
+            value = sys.intern(value)
+        setattr(self, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        try:
+            delattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.fields and hasattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key in self.__slots__ if key in self.fields and hasattr(self, key))
+
+    def __len__(self) -> int:
+        return sum(1 for key in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class Calculation(Record):
+    __slots__ = ("explanation", "code", "result", "result_show", "type", "subcalculations", "calculation_explanation", "fb_label", "why_line")
+    fields = frozenset(__slots__)
+    interned = frozenset(("explanation", "type", "calculation_explanation"))
     code: str
     explanation: str
     result: Any
@@ -13,6 +67,43 @@ class Calculation(TypedDict):
     fb_label: str
     why_line: str
 
+    def __getattr__(self, key: str) -> Any:
+        """ result_show is only written out from the result the first time it is read, as most are never shown """
+        if key == "result_show":
+            self.result_show = show(self.result)
+            return self.result_show
+        raise AttributeError(key)
+
+    @classmethod
+    def of(cls, explanation: str, code: str, result: Any, result_show: Optional[str], type: str, subcalculations: List[Any], calculation_explanation: str,
+           fb_label: str = "") -> Calculation:
+        """ Builds a calculation with every field but why_line, without going through the dictionary interface. The
+            explanations and type should be the constants they always are, so they are not interned again. result_show
+            is left to be worked out when it is read if it is None. """
+        calc = cls.__new__(cls)
+        calc.explanation = explanation
+        calc.code = code
+        calc.result = result
+        if result_show is not None:
+            calc.result_show = result_show
+        calc.type = type
+        calc.subcalculations = subcalculations
+        calc.calculation_explanation = calculation_explanation
+        calc.fb_label = fb_label
+        return calc
+
+    def copy(self) -> Calculation:
+        """ A calculation of its own with the same fields and a new list of the same subcalculations. result_show is
+            only copied if it has already been worked out. """
+        calc = Calculation.__new__(Calculation)
+        for key in self.__slots__:
+            try:
+                setattr(calc, key, object.__getattribute__(self, key))
+            except AttributeError:
+                pass
+        calc.subcalculations = list(self.subcalculations)
+        return calc
+
 
 class Memory(TypedDict):
     address: int
@@ -24,14 +115,39 @@ class Memory(TypedDict):
 Variables = Dict[str, Tuple[str, int, int]]
 
 
-class Statement(TypedDict):
+class StatementIndex(object):
+    """ The code, explanations and tags of every node in the calculation tree of a statement, listed in breadth first
+        order. It is built once the statement has been traced so the builders do not have to walk the tree again. """
+    __slots__ = ("code", "explanations", "tags", "nodes")
+
+    def __init__(self, calculation: Calculation) -> None:
+        super().__init__()
+        calc_queue: List[Calculation] = [calculation]
+        for calc in calc_queue:
+            calc_queue.extend(calc["subcalculations"])
+        self.code: Tuple[str, ...] = tuple(calc["code"] for calc in calc_queue)
+        self.explanations: Tuple[str, ...] = tuple(calc["explanation"] for calc in calc_queue)
+        self.tags: Tuple[str, ...] = tuple(dict.fromkeys(c.tags[x] for x in self.explanations if x in c.tags))
+        self.nodes: int = len(calc_queue)
+
+
+class Statement(Record):
+    """ The index, and the step of a statement that was rebuilt on its own, are kept in slots of their own rather than
+        fields, so they are not part of the statement as a dictionary """
+    __slots__ = ("calculation", "variables_before", "memory_before", "current_line", "variables_after", "memory_after", "next_line", "why_line", "index",
+                 "step")
+    fields = frozenset(__slots__) - {"index", "step"}
+    interned = frozenset(("current_line", "next_line", "why_line"))
     calculation: Calculation
     current_line: str
-    memory_after: List[Memory]
-    memory_before: List[Memory]
+    memory_after: Sequence[Memory]
+    memory_before: Sequence[Memory]
     next_line: str
     variables_after: Variables
     variables_before: Variables
+    why_line: str
+    index: StatementIndex
+    step: int
 
 
 EdgeReason = Tuple[int, str]
@@ -44,23 +160,23 @@ class LineNumber(TypedDict):
 
 
 def empty_statement(line: int) -> Statement:
-    calc: Calculation = {
-        "explanation": "",
-        "code": "",
-        "result": "None",
-        "result_show": "None",
-        "type": "None",
-        "subcalculations": [],
-        "calculation_explanation": "",
-        "fb_label": ""
-    }
-    empty: Statement = {
-        "calculation": calc,
-        "variables_before": {},
-        "memory_before": [],
-        "current_line": str(line),
-        "variables_after": {},
-        "memory_after": [],
-        "next_line": ""
-    }
+    calc: Calculation = Calculation(
+        explanation="",
+        code="",
+        result="None",
+        result_show="None",
+        type="None",
+        subcalculations=[],
+        calculation_explanation="",
+        fb_label=""
+    )
+    empty: Statement = Statement(
+        calculation=calc,
+        variables_before={},
+        memory_before=[],
+        current_line=str(line),
+        variables_after={},
+        memory_after=[],
+        next_line=""
+    )
     return empty
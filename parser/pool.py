@@ -0,0 +1,37 @@
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List
+from parser.generic_parser import Parser
+
+
+class ParserPool(object):
+    """ Parsers for one language, shared by every request a long running worker handles. A parser is only used by one
+        request at a time and its context is cleared whenever it is taken from the pool, so no request sees the input
+        or memory of another. """
+
+    def __init__(self, new_parser: Callable[[], Parser]) -> None:
+        super().__init__()
+        self.new_parser = new_parser
+        self.free: List[Parser] = []
+        self.lock = threading.Lock()
+
+    def acquire(self) -> Parser:
+        with self.lock:
+            parser = self.free.pop() if self.free else None
+        if parser is None:
+            parser = self.new_parser()
+        parser.context.clear()
+        return parser
+
+    def release(self, parser: Parser) -> None:
+        parser.context.clear()
+        with self.lock:
+            self.free.append(parser)
+
+    @contextmanager
+    def parser(self) -> Iterator[Parser]:
+        parser = self.acquire()
+        try:
+            yield parser
+        finally:
+            self.release(parser)
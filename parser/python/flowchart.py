@@ -9,10 +9,12 @@ class PythonFlowCreator(FlowchartCreator):
         super().__init__()
 
     def parse_source(self, source_code: str) -> Tuple[Dict[int, str], Dict[Edge, str]]:
+        return self.parse_tree(ast.parse(source_code))
+
+    def parse_tree(self, root: ast.Module) -> Tuple[Dict[int, str], Dict[Edge, str]]:
         self.flow_edges.clear()
         self.flow_nodes.clear()
         self.flow_nodes[0] = "Start"
-        root = ast.parse(source_code)
         visitor = Tracer(self)
         visitor.visit(root)
         self.flow_nodes[-1] = "End"
@@ -0,0 +1,417 @@
+import ast
+import copy
+import sys
+from types import FrameType
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple
+from parser.limits import TraceLimitError
+from parser.parser_types import Statement
+from parser.trace_io import TraceIO
+import parser.python.prepared_functions as p
+import parser.python.operations as o
+import constants as c
+
+""" The program is only run natively in modes other than OFF. ON is for when questions are only asked about some lines:
+    the program is run natively and only the statements on those lines are traced, see Rebuilder. Programs it cannot be
+    used for are traced as usual. VALIDATE traces the whole program and checks that the trace took the same lines,
+    printed the same output and ended with the same variables as the program run natively, and that the statements ON
+    would rebuild are the same as those traced. """
+OFF = "off"
+ON = "on"
+VALIDATE = "validate"
+MODES = (OFF, ON, VALIDATE)
+
+""" The nodes of the programs the tracer understands, only these programs are run natively """
+SUPPORTED = (ast.Module, ast.Assign, ast.Expr, ast.If, ast.While, ast.Name, ast.Constant, ast.BinOp, ast.UnaryOp,
+             ast.Compare, ast.BoolOp, ast.Call, ast.Subscript, ast.List, ast.Load, ast.Store, ast.operator,
+             ast.unaryop, ast.cmpop, ast.boolop)
+
+""" The function a condition is rewritten to call, the functions operators are rewritten to call are named after them """
+TEST = "__test__"
+
+
+class NativeMismatchError(Exception):
+    """ Raised when validating and the trace does not match the program run natively """
+    pass
+
+
+class Unmirrored(Exception):
+    """ Raised while rebuilding when the program does something the memory of the parser cannot follow """
+    pass
+
+
+class Sandbox(object):
+    """ Stands in for the parser in the prepared functions, which only use its input and output """
+
+    def __init__(self, input_lines: List[str]) -> None:
+        super().__init__()
+        self.io = TraceIO(input_lines)
+
+
+class NativeRun(object):
+    """ The lines a program ran, in order, what it printed and its variables when it finished. error is the exception
+        the program raised, if it raised one. """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.lines: List[int] = []
+        self.output: str = ""
+        self.variables: Dict[str, Any] = dict()
+        self.error: Optional[Exception] = None
+
+
+def supported(tree: ast.Module) -> bool:
+    """ Every node is one the tracer understands, and only the prepared functions are called """
+    for node in ast.walk(tree):
+        if not isinstance(node, SUPPORTED):
+            return False
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in p.functions and not node.keywords):
+            return False
+    return True
+
+
+def selectable(tree: ast.Module) -> bool:
+    """ The program can be run by a Rebuilder. Each statement has a line to itself, so every line the program runs is
+        one statement of the trace, and is stored to the way the tracer stores to it. Every operator is one the tracer
+        works out, as the program is run with the tracer's operators. """
+    if not supported(tree):
+        return False
+    lines = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id.startswith("__"):
+            return False
+        if isinstance(node, ast.stmt):
+            header = node.test if isinstance(node, (ast.If, ast.While)) else node
+            if header.lineno != node.lineno or header.end_lineno != node.lineno or node.lineno in lines:
+                return False
+            lines.add(node.lineno)
+        if isinstance(node, ast.Assign) and not (len(node.targets) == 1 and stored_to(node.targets[0])):
+            return False
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant):
+            return False
+        if isinstance(node, ast.BinOp) and type(node.op) not in o.BINARY_OPERATORS:
+            return False
+        if isinstance(node, ast.Compare) and (len(node.ops) != 1 or type(node.ops[0]) not in o.COMPARISONS):
+            return False
+        if isinstance(node, ast.UnaryOp) and type(node.op) not in o.UNARY_OPERATORS:
+            return False
+        if isinstance(node, ast.BoolOp) and type(node.op) not in o.BOOLEAN_OPERATORS:
+            return False
+    return True
+
+
+def stored_to(target: ast.expr) -> bool:
+    """ The tracer works out the index of a target before the value, so an index must not call anything """
+    if isinstance(target, ast.Name):
+        return True
+    return isinstance(target, ast.Subscript) and isinstance(target.value, ast.Name) and \
+        not any(isinstance(n, ast.Call) for n in ast.walk(target.slice))
+
+
+def builtins(sandbox: Any) -> Dict[str, Callable[..., Any]]:
+    """ The only names the program can use besides its own variables, sandbox is given to the functions that use the
+        input and output """
+    names: Dict[str, Callable[..., Any]] = dict()
+    for name, function in p.functions.items():
+        if name in p.parser_functions:
+            names[name] = (lambda f: lambda *args: f(sandbox, *args))(function)
+        else:
+            names[name] = function
+    return names
+
+
+def operator_name(op: type) -> str:
+    return "__" + op.__name__ + "__"
+
+
+def operators(type_string: Callable[[type], str], holds: Callable[[Any], bool], fails: Callable[[Any], bool]) -> Dict[str, Callable[..., Any]]:
+    """ The functions Interpreted rewrites a program to call, which work out operators and conditions the way the
+        tracer does. An operator the tracer does not support raises, and so does a condition that neither holds nor
+        fails, as the tracer would then run neither branch. """
+    def applied(function: Callable[[Any, Any], Any], explain: o.Explain) -> Callable[[Any, Any], Any]:
+        def apply(left: Any, right: Any) -> Any:
+            explain(type_string(type(left)), type_string(type(right)))
+            return function(left, right)
+        return apply
+
+    def combined(combine: Callable[[Any, Any], Any]) -> Callable[..., Any]:
+        def combine_all(*values: Any) -> Any:
+            result = True
+            for v in values:
+                result = combine(v, result)
+            return result
+        return combine_all
+
+    def test(value: Any) -> bool:
+        if holds(value):
+            return True
+        if fails(value):
+            return False
+        raise Unmirrored("The condition was neither true nor false")
+
+    names: Dict[str, Callable[..., Any]] = {TEST: test}
+    for table in (o.BINARY_OPERATORS, o.COMPARISONS):
+        for op, (_, function, explain) in table.items():
+            names[operator_name(op)] = applied(function, explain)
+    for op, (_, _, _, function, _, _) in o.UNARY_OPERATORS.items():
+        names[operator_name(op)] = function
+    for op, (_, combine, _, _) in o.BOOLEAN_OPERATORS.items():
+        names[operator_name(op)] = combined(combine)
+    return names
+
+
+class Interpreted(ast.NodeTransformer):
+    """ Rewrites every operator and condition of a program into a call of the function the tracer works it out with,
+        see operators. Every operand of and and or is then evaluated, as the tracer does. """
+
+    @staticmethod
+    def call(name: str, node: ast.expr, args: List[ast.expr]) -> ast.Call:
+        return ast.copy_location(ast.Call(ast.copy_location(ast.Name(name, ast.Load()), node), args, []), node)
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.Call:
+        self.generic_visit(node)
+        return self.call(operator_name(type(node.op)), node, [node.left, node.right])
+
+    def visit_Compare(self, node: ast.Compare) -> ast.Call:
+        self.generic_visit(node)
+        return self.call(operator_name(type(node.ops[0])), node, [node.left, node.comparators[0]])
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> ast.Call:
+        self.generic_visit(node)
+        return self.call(operator_name(type(node.op)), node, [node.operand])
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> ast.Call:
+        self.generic_visit(node)
+        return self.call(operator_name(type(node.op)), node, node.values)
+
+    def visit_If(self, node: ast.If) -> ast.If:
+        self.generic_visit(node)
+        node.test = self.call(TEST, node.test, [node.test])
+        return node
+
+    def visit_While(self, node: ast.While) -> ast.While:
+        self.generic_visit(node)
+        node.test = self.call(TEST, node.test, [node.test])
+        return node
+
+
+def run(tree: ast.Module, input_lines: List[str], max_steps: int) -> NativeRun:
+    """ Runs the program under a line tracer, raising TraceLimitError once it runs more lines than max_steps """
+    result = NativeRun()
+    sandbox = Sandbox(input_lines)
+    code = compile(tree, "<trace>", "exec")
+    namespace: Dict[str, Any] = {"__builtins__": builtins(sandbox)}
+    lines = result.lines
+
+    def line_tracer(frame: FrameType, event: str, arg: Any) -> Any:
+        if event == "line":
+            lines.append(frame.f_lineno)
+            if len(lines) > max_steps:
+                raise TraceLimitError("The program executed more than " + str(max_steps) + " statements", str(frame.f_lineno))
+        return line_tracer
+
+    def call_tracer(frame: FrameType, event: str, arg: Any) -> Any:
+        if frame.f_code is code:
+            return line_tracer
+        return None
+
+    previous = sys.gettrace()
+    sys.settrace(call_tracer)
+    try:
+        exec(code, namespace)
+    except TraceLimitError:
+        raise
+    except Exception as e:
+        result.error = e
+    finally:
+        sys.settrace(previous)
+    result.output = sandbox.io.printed()
+    result.variables = {name: value for name, value in namespace.items() if name != "__builtins__"}
+    return result
+
+
+class Rebuilder(object):
+    """ Runs a selectable program natively, tracing only the statements on lines and the statement run just before
+        each of them, which says why the line was run. Statements are traced once the program has run them, after
+        rewinding the input and output, and only the statements on lines are kept. The assignment of every statement
+        that is not traced is repeated in the memory of the parser with the values the program worked out, so every
+        statement traced starts from the same memory as in a full trace. Lists are matched to the cells that hold them
+        by identity, so the program must never put a list inside a list. The program is run with the operators of the
+        tracer, see Interpreted, so it works out the same values the tracer would. """
+
+    def __init__(self, parser: Any, compile: Callable[[ast.stmt], Callable[[], Statement]], lines: FrozenSet[int],
+                 holds: Callable[[Any], bool], fails: Callable[[Any], bool]) -> None:
+        super().__init__()
+        self.parser = parser
+        self.compile = compile
+        self.lines = lines
+        self.holds = holds
+        self.fails = fails
+        self.namespace: Dict[str, Any] = dict()
+        # The lists of the program stored in memory by their id, with their addresses. The lists are kept so their ids
+        # are not reused.
+        self.mirror: Dict[int, Tuple[List[Any], int]] = dict()
+        self.statements: Dict[int, ast.stmt] = dict()
+        self.rebuilt: List[Statement] = []
+        self.step = -1
+        # The statement the program is running, its line and where the input and output were when it started
+        self.current: Optional[Tuple[ast.stmt, int, Tuple[int, int, int]]] = None
+        self.previous: Optional[Statement] = None
+
+    def run(self, tree: ast.Module) -> Optional[List[Statement]]:
+        """ The statements on lines, each knowing its step. None if the program raised, ran past the step limit or did
+            something the memory of the parser could not follow, the program must then be traced in full. """
+        self.statements = {node.lineno: node for node in ast.walk(tree) if isinstance(node, ast.stmt)}
+        code = compile(ast.fix_missing_locations(Interpreted().visit(copy.deepcopy(tree))), "<trace>", "exec")
+        names = builtins(self.parser)
+        names.update(operators(self.parser.get_type_string, self.holds, self.fails))
+        self.namespace = {"__builtins__": names}
+        max_steps = self.parser.budget.max_steps
+
+        def line_tracer(frame: FrameType, event: str, arg: Any) -> Any:
+            if event == "line":
+                self.finish(frame.f_lineno)
+                self.step += 1
+                if self.step >= max_steps:
+                    raise Unmirrored("The program ran past the step limit")
+                self.current = (self.statements[frame.f_lineno], frame.f_lineno, self.parser.io.mark())
+            return line_tracer
+
+        def call_tracer(frame: FrameType, event: str, arg: Any) -> Any:
+            if frame.f_code is code:
+                return line_tracer
+            return None
+
+        self.parser.context.start()
+        try:
+            previous = sys.gettrace()
+            sys.settrace(call_tracer)
+            try:
+                exec(code, self.namespace)
+            finally:
+                sys.settrace(previous)
+            self.finish(None)
+        except Exception:
+            return None
+        finally:
+            self.parser.reset()
+        return self.rebuilt
+
+    def finish(self, next_line: Optional[int]) -> None:
+        """ Called once the program has run the current statement, next_line is the line it runs next, None if it
+            finished """
+        if self.current is None:
+            return
+        node, line, mark = self.current
+        needed = line in self.lines
+        if needed or next_line in self.lines:
+            self.parser.io.rewind(mark)
+            statement = self.compile(node)()
+            self.follow(node)
+            if needed:
+                # The statement before was traced as well, unless this is the first statement
+                statement["next_line"] = str(next_line) if next_line is not None else c.FINISHED
+                statement["why_line"] = self.parser.get_why_line(self.previous)
+                self.parser.index_statement(statement)
+                statement.step = self.step
+                self.rebuilt.append(statement)
+            self.previous = statement
+        else:
+            self.repeat(node)
+            self.previous = None
+
+    def repeat(self, node: ast.stmt) -> None:
+        """ Repeats the assignment of a statement that was not traced """
+        if not isinstance(node, ast.Assign):
+            return
+        target = node.targets[0]
+        if isinstance(target, ast.Name):
+            self.store(target.id, self.namespace[target.id])
+        else:
+            name = target.value.id
+            self.parser.update_memory(self.parser.variables[name][1], -1, list(self.flat(self.namespace[name])))
+
+    def store(self, name: str, value: Any) -> None:
+        typ = self.parser.get_type_string(type(value))
+        if not isinstance(value, list):
+            self.parser.assign_value(name, value, typ)
+            return
+        known = self.mirror.get(id(self.flat(value)))
+        if known is not None:
+            self.parser.assign_value(name, self.parser.memory[known[1]]["value"], typ)
+        else:
+            self.parser.assign_value(name, list(value), typ)
+            self.mirror[id(value)] = (value, self.parser.variables[name][1])
+
+    def follow(self, node: ast.stmt) -> None:
+        """ Matches the list a traced statement assigned to the cell the tracer stored it in """
+        if not isinstance(node, ast.Assign):
+            return
+        target = node.targets[0]
+        if isinstance(target, ast.Name):
+            value = self.namespace[target.id]
+            if isinstance(value, list):
+                self.mirror[id(value)] = (self.flat(value), self.parser.variables[target.id][1])
+        else:
+            self.flat(self.namespace[target.value.id])
+
+    @staticmethod
+    def flat(values: List[Any]) -> List[Any]:
+        if any(isinstance(v, list) for v in values):
+            raise Unmirrored("A list was put inside a list")
+        return values
+
+
+def validated(statements: Iterator[Statement], native: NativeRun, printed: Callable[[], str]) -> Iterator[Statement]:
+    """ Passes the statements of a trace on, checking them against the native run once the trace is finished """
+    lines: List[int] = []
+    last: Optional[Statement] = None
+    for statement in statements:
+        lines.append(int(statement["current_line"]))
+        last = statement
+        yield statement
+    if native.error is not None:
+        raise NativeMismatchError("The trace finished but the program raised " + repr(native.error))
+    if lines != native.lines:
+        at = next((i for i, (a, b) in enumerate(zip(lines, native.lines)) if a != b), min(len(lines), len(native.lines)))
+        raise NativeMismatchError("The trace ran line " + str(lines[at:at + 1]) + " where the program ran line " + str(native.lines[at:at + 1]) + " at step " + str(at))
+    if printed() != native.output:
+        raise NativeMismatchError("The trace printed " + repr(printed()) + " but the program printed " + repr(native.output))
+    if last is not None:
+        memory = last["memory_after"]
+        for name, info in last["variables_after"].items():
+            value = memory[info[1]]["value"]
+            expected = native.variables.get(name)
+            if type(value) is not type(expected) or value != expected:
+                raise NativeMismatchError("The trace ended with " + name + " = " + repr(value) + " but the program ended with " + repr(expected))
+
+
+def variable_values(statement: Statement) -> Dict[str, Tuple[type, Any]]:
+    memory = statement["memory_after"]
+    return {name: (type(memory[info[1]]["value"]), memory[info[1]]["value"]) for name, info in statement["variables_after"].items()}
+
+
+def matched(statements: Iterator[Statement], rebuilt: List[Statement], lines: FrozenSet[int]) -> Iterator[Statement]:
+    """ Passes the finished statements of a full trace on, checking that the statements on lines are the ones that
+        were rebuilt """
+    pending = iter(rebuilt)
+    expected = next(pending, None)
+    for step, statement in enumerate(statements):
+        if int(statement["current_line"]) in lines:
+            if expected is None or expected.step != step:
+                raise NativeMismatchError("The statement at step " + str(step) + " was not rebuilt")
+            differences = [field for field, a, b in (
+                ("current line", expected["current_line"], statement["current_line"]),
+                ("next line", expected["next_line"], statement["next_line"]),
+                ("reason", expected["why_line"], statement["why_line"]),
+                ("code", expected.index.code, statement.index.code),
+                ("explanations", expected.index.explanations, statement.index.explanations),
+                ("variables before", expected["variables_before"], statement["variables_before"]),
+                ("variables after", expected["variables_after"], statement["variables_after"]),
+                ("values", variable_values(expected), variable_values(statement))
+            ) if a != b]
+            if differences:
+                raise NativeMismatchError("The statement rebuilt at step " + str(step) + " has a different " + ", ".join(differences))
+            expected = next(pending, None)
+        yield statement
+    if expected is not None:
+        raise NativeMismatchError("The statement rebuilt at step " + str(expected.step) + " was never traced")
@@ -0,0 +1,75 @@
+import ast
+import operator
+from typing import Any, Callable, Dict, Tuple
+import constants as c
+import parser.python.types as t
+
+""" The operators the tracer understands. The explanations of an operation are returned by its explain function, given
+    the types of its operands, as + and * are explained differently for numbers and strings. An explain function raises
+    Exception for operands the tracer does not support. """
+Explain = Callable[[str, str], Tuple[str, str]]
+
+NUMBERS = (t.INT, t.FLOAT)
+
+
+def explained(explanation: str, calculation_explanation: str) -> Explain:
+    explanations = (explanation, calculation_explanation)
+    return lambda left, right: explanations
+
+
+def explain_add(left: str, right: str) -> Tuple[str, str]:
+    if left in NUMBERS and right in NUMBERS:
+        return c.M_ADD, c.EXP_ADD
+    elif left == t.STRING and right == t.STRING:
+        return c.M_CON, c.EXP_CAT
+    raise Exception()
+
+
+def explain_mult(left: str, right: str) -> Tuple[str, str]:
+    if left in NUMBERS and right in NUMBERS:
+        return c.M_MUL, c.EXP_MULT
+    elif left == t.STRING and right == t.INT:
+        return c.M_REP, c.EXP_REP
+    raise Exception()
+
+
+def explain_less(left: str, right: str) -> Tuple[str, str]:
+    if left in NUMBERS and right in NUMBERS:
+        return c.M_LTC, c.EXP_LT
+    raise Exception()
+
+
+""" The text written between the operands, the function that applies the operator and how it is explained """
+BINARY_OPERATORS: Dict[type, Tuple[str, Callable[[Any, Any], Any], Explain]] = {
+    ast.Add: (" + ", operator.add, explain_add),
+    ast.Sub: (" - ", operator.sub, explained(c.M_SUB, c.EXP_SUB)),
+    ast.Mult: (" * ", operator.mul, explain_mult),
+    ast.Div: (" / ", operator.truediv, explained(c.M_DIV, c.EXP_DIV)),
+    ast.FloorDiv: (" // ", operator.floordiv, explained(c.M_IDIV, c.EXP_IDIV)),
+    ast.Mod: (" % ", operator.mod, explained(c.M_MOD, c.EXP_MOD)),
+    ast.Pow: (" ** ", operator.pow, explained(c.M_EXP, c.EXP_POW))
+}
+
+COMPARISONS: Dict[type, Tuple[str, Callable[[Any, Any], Any], Explain]] = {
+    ast.Eq: (" == ", operator.eq, explained(c.M_EQC, c.EXP_EQ)),
+    ast.NotEq: (" != ", operator.ne, explained(c.M_NEC, c.EXP_NEQ)),
+    ast.Lt: (" < ", operator.lt, explain_less),
+    ast.LtE: (" <= ", operator.le, explained(c.M_LTE, c.EXP_LTE)),
+    ast.Gt: (" > ", operator.gt, explained(c.M_GTC, c.EXP_GT)),
+    ast.GtE: (" >= ", operator.ge, explained(c.M_GTE, c.EXP_GTE))
+}
+
+""" The operator, the text written before and after the operand, the function that applies it and its explanations """
+UNARY_OPERATORS: Dict[type, Tuple[str, str, str, Callable[[Any], Any], str, str]] = {
+    ast.UAdd: ("+", "+", "", lambda operand: operand, c.M_UADD, c.EXP_UADD),
+    ast.USub: ("-", "-", "", operator.neg, c.M_USUB, c.EXP_USUB),
+    ast.Not: ("not", "not(", ")", operator.not_, c.M_NOT, c.EXP_NOT),
+    ast.Invert: ("~", "~(", ")", operator.invert, c.M_BNOT, c.EXP_BNOT)
+}
+
+""" The text written between the operands, how each operand is combined with the result so far and the explanations.
+    The result starts out as True for both operators. """
+BOOLEAN_OPERATORS: Dict[type, Tuple[str, Callable[[Any, Any], Any], str, str]] = {
+    ast.And: (" and ", lambda value, result: value and result, c.M_AND, c.EXP_AND),
+    ast.Or: (" or ", lambda value, result: value or result, c.M_OR, c.EXP_OR)
+}
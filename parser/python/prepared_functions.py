@@ -1,11 +1,6 @@
-from typing import Any, List
+from typing import Any, List, Dict, Callable, Set
 from collections.abc import Sized
-
-current_input: List[str]
-
-def set_input(strs: List[str])-> None:
-    global current_input
-    current_input = strs
+from parser.generic_parser import Parser
 
 def preped_abs(num : float) -> float:
     return abs(num)
@@ -31,13 +26,30 @@ def preped_min(*argv: float) -> float:
 def preped_sum(*argv: float) -> float:
     return sum(argv)
 
-f = open("temp_output.txt", "w")
-def preped_print(*args : Any , **kwargs : Any) -> None:
-    kwargs["file"] = f
+def preped_print(parser: Parser, *args : Any , **kwargs : Any) -> None:
+    kwargs["file"] = parser.io.output
     return print(*args, **kwargs)
 
-def preped_input(mess:str)->str:
-    global current_input
-    line = current_input[0]
-    current_input = current_input[1:]
-    return line.replace("\n","")
\ No newline at end of file
+def preped_input(parser: Parser, mess:str)->str:
+    return parser.io.read_line()
+
+functions: Dict[str, Callable[..., Any]] = {
+    "abs": preped_abs,
+    "float": preped_float,
+    "int": preped_int,
+    "str": preped_str,
+    "len": preped_len,
+    "max": preped_max,
+    "min": preped_min,
+    "sum": preped_sum,
+    "print": preped_print,
+    "input": preped_input
+}
+
+""" These functions use the input and output of the trace, so they are given the parser before their arguments """
+parser_functions: Set[str] = {"print", "input"}
+
+def get_function(name: str) -> Callable[..., Any]:
+    if name not in functions:
+        raise Exception("This function is not supported " + name)
+    return functions[name]
@@ -0,0 +1,197 @@
+import json
+import os
+import struct
+from collections import namedtuple
+from typing import Any, BinaryIO, Iterable, Iterator, List, Optional, Sequence
+from parser.parser_types import Statement, Calculation, Memory, Variables
+from parser.memory import MemoryJournal, MemorySnapshot
+
+""" A trace file starts with MAGIC and the format version, followed by a series of records. Each record is a 4 byte
+    big endian length followed by that many bytes of compact JSON. Every program in the file has a header record,
+    followed by one record per statement of its trace. A statement record only holds the memory cells and variables
+    that changed since the record before it. """
+MAGIC = b"MTRACE"
+FORMAT_VERSION = 1
+
+""" unit is the CompilationUnit the program was traced from, it is not written to the file. code_list and line_numbers
+    are None for a program whose trace is streamed from its unit instead of being kept. """
+TracedProgram = namedtuple('TracedProgram', 'name language source_code input_lines code_list line_numbers unit', defaults=(None,))
+
+CALCULATION_FIELDS = ("explanation", "code", "result", "result_show", "type", "calculation_explanation", "fb_label", "why_line")
+
+
+class TraceFileError(Exception):
+    pass
+
+
+class TraceWriter(object):
+    def __init__(self, file: BinaryIO) -> None:
+        super().__init__()
+        self.file = file
+        self.file.write(MAGIC + struct.pack(">H", FORMAT_VERSION))
+
+    def write_record(self, record: Any) -> None:
+        payload = json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        self.file.write(struct.pack(">I", len(payload)))
+        self.file.write(payload)
+
+    def write_program(self, program: TracedProgram) -> None:
+        self.write_record({
+            "name": program.name,
+            "language": program.language,
+            "source": program.source_code,
+            "input": program.input_lines,
+            "statements": len(program.code_list)
+        })
+        memory: Sequence[Memory] = []
+        variables: Optional[Variables] = None
+        for st in program.code_list:
+            variables_before = self.encode_variables(variables, st["variables_before"])
+            variables_after = self.encode_variables(st["variables_before"], st["variables_after"])
+            memory_before = self.encode_memory(memory, st["memory_before"])
+            memory_after = self.encode_memory(st["memory_before"], st["memory_after"])
+            self.write_record([st["current_line"], st.get("next_line"), st.get("why_line"), self.encode_calculation(st["calculation"]),
+                               variables_before, memory_before, variables_after, memory_after])
+            variables = st["variables_after"]
+            memory = st["memory_after"]
+
+    def encode_calculation(self, calc: Calculation) -> List[Any]:
+        """ A calculation is a bit mask of the fields it has, their values in the order of CALCULATION_FIELDS and then
+            the list of its subcalculations """
+        mask = 0
+        record: List[Any] = [mask]
+        for i, field in enumerate(CALCULATION_FIELDS):
+            if field in calc:
+                mask |= 1 << i
+                record.append(calc[field])
+        record[0] = mask
+        record.append([self.encode_calculation(sc) for sc in calc["subcalculations"]])
+        return record
+
+    @staticmethod
+    def encode_variables(before: Optional[Variables], after: Variables) -> Optional[List[Any]]:
+        """ None means the variables are the same dictionary as before, otherwise the entries that were added or changed
+            and the names that were removed """
+        if before is after:
+            return None
+        if before is None:
+            before = {}
+        changed = {name: list(info) for name, info in after.items() if before.get(name) != info}
+        removed = [name for name in before if name not in after]
+        return [changed, removed]
+
+    @staticmethod
+    def encode_memory(before: Sequence[Memory], after: Sequence[Memory]) -> List[List[Any]]:
+        """ Snapshots taken from the same journal already know which cells were written between them """
+        if isinstance(before, MemorySnapshot) and isinstance(after, MemorySnapshot) and before.journal is after.journal and before.version <= after.version:
+            writes: Sequence[Memory] = after.journal.written(before.version, after.version)
+        else:
+            if len(after) < len(before):
+                raise TraceFileError("The memory of a trace can not get smaller")
+            writes = [cell for i, cell in enumerate(after) if i >= len(before) or before[i] != cell]
+        return [[cell["address"], cell["type"], cell["value"], cell["value_show"]] for cell in writes]
+
+
+class TraceReader(object):
+    def __init__(self, file: BinaryIO) -> None:
+        super().__init__()
+        self.file = file
+        header = self.file.read(len(MAGIC) + 2)
+        if len(header) != len(MAGIC) + 2 or header[:len(MAGIC)] != MAGIC:
+            raise TraceFileError("This is not a trace file")
+        version = struct.unpack(">H", header[len(MAGIC):])[0]
+        if version != FORMAT_VERSION:
+            raise TraceFileError("Trace files of version " + str(version) + " are not supported")
+
+    def read_record(self) -> Any:
+        length = self.file.read(4)
+        if len(length) == 0:
+            return None
+        if len(length) != 4:
+            raise TraceFileError("The trace file ends part way through a record")
+        size = struct.unpack(">I", length)[0]
+        payload = self.file.read(size)
+        if len(payload) != size:
+            raise TraceFileError("The trace file ends part way through a record")
+        return json.loads(payload.decode("utf-8"))
+
+    def read_programs(self) -> Iterator[TracedProgram]:
+        header = self.read_record()
+        while header is not None:
+            yield self.read_program(header)
+            header = self.read_record()
+
+    def read_program(self, header: Any) -> TracedProgram:
+        journal = MemoryJournal()
+        variables: Variables = {}
+        code_list: List[Statement] = []
+        for i in range(header["statements"]):
+            record = self.read_record()
+            if record is None:
+                raise TraceFileError("The trace of " + header["name"] + " is missing statements")
+            current_line, next_line, why_line, calc, variables_before, memory_before, variables_after, memory_after = record
+            variables = self.decode_variables(variables, variables_before)
+            self.decode_memory(journal, memory_before)
+            st = Statement(calculation=self.decode_calculation(calc), current_line=current_line, variables_before=variables, memory_before=journal.snapshot())
+            variables = self.decode_variables(variables, variables_after)
+            self.decode_memory(journal, memory_after)
+            st["variables_after"] = variables
+            st["memory_after"] = journal.snapshot()
+            if next_line is not None:
+                st["next_line"] = next_line
+            if why_line is not None:
+                st["why_line"] = why_line
+            code_list.append(st)
+        line_numbers = ['0'] + [e["current_line"] for e in code_list] + ['-1']
+        return TracedProgram(header["name"], header["language"], header["source"], header["input"], code_list, line_numbers)
+
+    def decode_calculation(self, record: List[Any]) -> Calculation:
+        calc = Calculation()
+        mask = record[0]
+        values = iter(record[1:-1])
+        for i, field in enumerate(CALCULATION_FIELDS):
+            if mask & (1 << i):
+                calc[field] = next(values)
+        calc["subcalculations"] = [self.decode_calculation(sc) for sc in record[-1]]
+        return calc
+
+    @staticmethod
+    def decode_variables(before: Variables, delta: Optional[List[Any]]) -> Variables:
+        if delta is None:
+            return before
+        changed, removed = delta
+        after = dict(before)
+        for name in removed:
+            del after[name]
+        for name, info in changed.items():
+            after[name] = tuple(info)
+        return after
+
+    @staticmethod
+    def decode_memory(journal: MemoryJournal, delta: List[List[Any]]) -> None:
+        for address, typ, value, value_show in delta:
+            journal.write({"address": address, "type": typ, "value": value, "value_show": value_show})
+
+
+def write_trace_file(file_name: str, programs: Iterable[TracedProgram]) -> None:
+    """ The programs may still be traced as they are written, so they are written to a temporary file that is only
+        renamed to file_name once all of them have been written. A trace that fails part way leaves no file behind. """
+    temporary = file_name + ".tmp"
+    try:
+        with open(temporary, "wb") as f:
+            writer = TraceWriter(f)
+            for program in programs:
+                writer.write_program(program)
+        os.replace(temporary, file_name)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def read_trace_file(file_name: str) -> List[TracedProgram]:
+    with open(file_name, "rb") as f:
+        programs = list(TraceReader(f).read_programs())
+    if len(programs) == 0:
+        raise TraceFileError("The trace file does not contain any programs")
+    return programs
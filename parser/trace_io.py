@@ -0,0 +1,43 @@
+import io
+from typing import List, Tuple
+
+
+class TraceIO(object):
+    """ The standard input and output of one trace. Input is never copied as it is read, Python reads it a line at a
+        time and C reads it as one string, so each keeps a cursor into the input instead. Everything the program
+        prints is kept in memory. """
+
+    def __init__(self, input_lines: List[str]) -> None:
+        super().__init__()
+        self.lines = input_lines
+        self.line: int = 0
+        self.text = "\n".join(input_lines)
+        self.position: int = 0
+        self.output = io.StringIO()
+
+    def read_line(self) -> str:
+        line = self.lines[self.line]
+        self.line += 1
+        return line.replace("\n", "")
+
+    def advance(self, position: int) -> None:
+        self.position = position
+
+    def read(self) -> int:
+        """ How much of the input has been read, only ever one of the two cursors moves """
+        return self.line + self.position
+
+    def write(self, text: str) -> None:
+        self.output.write(text)
+
+    def printed(self) -> str:
+        return self.output.getvalue()
+
+    def mark(self) -> Tuple[int, int, int]:
+        """ Where the cursors and the output are, so that reading and printing can be rewound and done again """
+        return self.line, self.position, self.output.tell()
+
+    def rewind(self, mark: Tuple[int, int, int]) -> None:
+        self.line, self.position, end = mark
+        self.output.seek(end)
+        self.output.truncate()